@@ -1,14 +1,39 @@
 import os
-import time
-import json
+import sys
+import shutil
+import asyncio
+import argparse
 import psycopg2
-import pandas as pd
-from collections import Counter
-from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
 import openai
 from datetime import datetime
 
+# Raiz do projeto no path para importar o pacote compartilhado "comum"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from comum.extracao import extrair_para_jsonl, extrair_paralelo, extrair_via_copy, montar_consulta, contar_leads, ITERSIZE_PADRAO
+from comum.espelho import extrair_com_espelho
+from comum.requisicoes import EscritorRequisicoes, caminho_sidecar, SUFIXOS_LOCAIS, TOKENS_POR_PACOTE_PADRAO
+from comum.processamento import processar_resultados
+from comum.clientes import arquivos_do_input
+from comum.batches import (criar_jobs, aguardar_batches, baixar_linhas, tem_saida, concluidos, finalizados,
+                           MAX_REQUISICOES_LOTE_PADRAO, MAX_MB_LOTE_PADRAO)
+from comum.jobs import RegistroJobs
+from comum.falhas import preparar_retentativa, juntar_retentativa, relatar_falhas
+from comum.tempo_real import (executar_tempo_real, LimitadorTaxa, MAX_LEADS_TEMPO_REAL_PADRAO, CONCORRENCIA_PADRAO,
+                              RPM_PADRAO, TPM_PADRAO)
+from comum.openai_falso import OpenAIFalso, AsyncOpenAIFalso, servidor_do_ambiente
+from comum.cache import abrir_cache
+from comum.regras import montar_classificador
+from comum.taxonomia import Taxonomia
+from comum.relatorio import MAX_CARACTERES_CELULA
+from comum.historico import PASTA_HISTORICO_PADRAO
+from comum.checkpoint import (ultima_mensagem_processada, descartar_pendente, registrar_pendente,
+                              confirmar_checkpoint)
+from comum.unidades import montar_localizador
+
+from config import (NOME, CLIENT_ID, LIMITE, SYSTEM_PROMPT, EXTRAIR_UNIDADE, AGRUPAR_APELIDOS, REGRAS,
+                    REGRAS_MAX_PALAVRAS, UNIDADES)
+
 # -----------------------------
 # CONFIGURAÇÕES
 # -----------------------------
@@ -16,12 +41,53 @@ load_dotenv()
 
 openai.api_key = os.getenv("OPENAI_API_KEY")
 DATA_INICIO = os.getenv("DATA_INICIO")
-CLIENT_ID = os.getenv("CLIENT_ID_IATE")
 
 DB_HOST = os.getenv("DB_HOST")
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_NAME = os.getenv("DB_NAME")
+DB_CONFIG = dict(host=DB_HOST, user=DB_USER, password=DB_PASSWORD, dbname=DB_NAME)
+
+# Linhas por ida ao banco no cursor server-side da extração
+ITERSIZE = int(os.getenv("ITERSIZE", ITERSIZE_PADRAO))
+# Com mais de 1, os leads são divididos em buckets extraídos em paralelo por um pool de conexões
+PARTICOES_EXTRACAO = int(os.getenv("PARTICOES_EXTRACAO", "1"))
+# "cursor" (cursor nomeado) ou "copy" (COPY ... TO STDOUT, mais leve por linha)
+BACKEND_EXTRACAO = os.getenv("BACKEND_EXTRACAO", "cursor")
+# Lê as conversas de uma cópia local em data/ sincronizada incrementalmente com o Postgres
+USAR_ESPELHO = os.getenv("USAR_ESPELHO", "0") == "1"
+# Envia uma vez só cada conversa idêntica e replica a resposta para os demais leads
+DEDUPLICAR = os.getenv("DEDUPLICAR", "1") == "1"
+# Reaproveita classificações de execuções anteriores (data/cache_classificacoes.sqlite)
+USAR_CACHE = os.getenv("USAR_CACHE", "1") == "1"
+# Classifica localmente as conversas curtas e óbvias com as REGRAS do config.py (ligar com USAR_REGRAS=1)
+USAR_REGRAS = os.getenv("USAR_REGRAS", "0") == "1"
+# Com mais de 1, junta até essa quantidade de conversas por requisição (resposta em JSON),
+# pagando o SYSTEM_PROMPT uma vez por pacote; EMPACOTAR_TOKENS limita o tamanho estimado
+EMPACOTAR_LEADS = int(os.getenv("EMPACOTAR_LEADS", "1"))
+EMPACOTAR_TOKENS = int(os.getenv("EMPACOTAR_TOKENS", TOKENS_POR_PACOTE_PADRAO))
+# Tamanho máximo de cada lote enviado ao Batch API; inputs maiores viram vários jobs simultâneos
+MAX_REQUISICOES_LOTE = int(os.getenv("MAX_REQUISICOES_LOTE", MAX_REQUISICOES_LOTE_PADRAO))
+MAX_MB_LOTE = float(os.getenv("MAX_MB_LOTE", MAX_MB_LOTE_PADRAO))
+# Inputs com até TEMPO_REAL_MAX_LEADS requisições vão direto ao chat completions em vez do Batch API
+TEMPO_REAL_MAX_LEADS = int(os.getenv("TEMPO_REAL_MAX_LEADS", MAX_LEADS_TEMPO_REAL_PADRAO))
+TEMPO_REAL_CONCORRENCIA = int(os.getenv("TEMPO_REAL_CONCORRENCIA", CONCORRENCIA_PADRAO))
+TEMPO_REAL_RPM = int(os.getenv("TEMPO_REAL_RPM", RPM_PADRAO))
+TEMPO_REAL_TPM = int(os.getenv("TEMPO_REAL_TPM", TPM_PADRAO))
+# Rodadas de reenvio só das requisições que falharam ou voltaram sem assunto
+RETENTATIVAS_FALHAS = int(os.getenv("RETENTATIVAS_FALHAS", "1"))
+# Grava a saída baixada do batch comprimida com gzip (resultado_batch_*.jsonl.gz)
+COMPRIMIR_RESULTADO = os.getenv("COMPRIMIR_RESULTADO", "0") == "1"
+# Usa o substituto local da API (comum/openai_falso.py, configurado pelas OPENAI_FALSO_*):
+# o pipeline inteiro roda sem rede, para testes de carga e CI
+OPENAI_FALSO = os.getenv("OPENAI_FALSO", "0") == "1"
+# Corta as mensagens longas no Excel (o máximo, e o padrão, é o limite de uma célula)
+MAX_CARACTERES_MENSAGEM = int(os.getenv("MAX_CARACTERES_MENSAGEM", MAX_CARACTERES_CELULA))
+# Grava também as classificações em Parquet (analise_mensagens_*.parquet), para outras ferramentas
+GRAVAR_PARQUET = os.getenv("GRAVAR_PARQUET", "1") == "1"
+# Acrescenta cada execução ao histórico particionado por cliente e data (consultar_historico.py)
+GRAVAR_HISTORICO = os.getenv("GRAVAR_HISTORICO", "1") == "1"
+PASTA_HISTORICO = os.getenv("PASTA_HISTORICO", PASTA_HISTORICO_PADRAO)
 
 
 
@@ -31,242 +97,263 @@ DATA_DIR = os.path.join(BASE_DIR, "data")
 # Sufixo com a data de hoje
 DATA_HOJE = datetime.now().strftime("%Y%m%d")
 
+SERVIDOR_FALSO = servidor_do_ambiente() if OPENAI_FALSO else None
+CLIENTE_OPENAI = OpenAIFalso(SERVIDOR_FALSO) if OPENAI_FALSO else None
+
 ARQUIVO_INPUT = os.path.join(DATA_DIR, f"batch_input_{DATA_HOJE}.jsonl")
-ARQUIVO_RESULTADO_JSONL = os.path.join(DATA_DIR, f"analise_mensagens_Iate_{DATA_HOJE}.jsonl")
-ARQUIVO_EXCEL = os.path.join(DATA_DIR, f"analise_mensagens_Iate_{DATA_HOJE}.xlsx")
+# Mesmo formato do cliente em comum/clientes.py, para os nomes de arquivo serem os mesmos do processar_todos.py
+CLIENTE = {"nome": NOME, "data_dir": DATA_DIR}
+ARQUIVOS = arquivos_do_input(CLIENTE, ARQUIVO_INPUT, DATA_HOJE, comprimido=COMPRIMIR_RESULTADO)
 
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
-SQL = """
-SELECT 
-    "leadId",
-    STRING_AGG(message, ' || ') AS mensagens
-FROM ideia_message_db
-WHERE "clientId" = %s
-AND "createdAt" >= %s
-GROUP BY "leadId"
-limit 3
-;
-
-"""
-
-SYSTEM_PROMPT = """
-Você é uma IA que atua como classificadora de assuntos de mensagens.
-
-Você receberá uma sequência de mensagens concatenadas do mesmo cliente (leadId), representando toda a conversa desse cliente.
-
-Sua tarefa é identificar **todos os assuntos** que aparecem nas mensagens dessa conversa, e listá-los.
-
-Os assuntos possíveis são:
-
-- contato
-- endereço
-- locais do clube: (centro esportivo,centro de força kyra gracie, quadra poliesportiva, quadra de areia, pavilhão japonês, quiosque praia nova, campo Society, náutica, piscina social, quadra de tênis) 
-- associação e planos (valores, dependentes)
-- regras
-- serviços
-- eventos
-- atividades
-- reclamações 
-- assuntos gerais
-
-⚠️ IMPORTANTE:
-- Responda **apenas** com a linha:  
-  Assuntos: [assunto1], [assunto2], [assunto3], ...  
-- Liste todos os assuntos que aparecem na conversa, separados por vírgula.
-- Não repita assuntos iguais.
-- Não explique nada além disso.
-- Não escreva mais nada que não essa linha.
-"""
+# Só reclassifica leads com mensagens novas desde a última execução bem-sucedida
+MODO_INCREMENTAL = os.getenv("MODO_INCREMENTAL", "1") == "1"
+
 
 # -----------------------------
 # 1. GERA O ARQUIVO DE INPUT
 # -----------------------------
-def gerar_input():
+def gerar_input(offline=False):
     print("📝 Gerando arquivo de entrada...")
-    conn = psycopg2.connect(
-        host=DB_HOST, user=DB_USER, password=DB_PASSWORD, dbname=DB_NAME
-    )
-    with conn.cursor(cursor_factory=RealDictCursor) as cursor, open(ARQUIVO_INPUT, "w", encoding="utf-8") as f:
-         cursor.execute(SQL, (CLIENT_ID, DATA_INICIO))
-        for row in cursor.fetchall():
-            mensagens = str(row.get("mensagens", "")).strip()
-            user_prompt = f"Mensagem do cliente:\n{mensagens}"
-            entrada = {
-                "custom_id": f"id-{row['leadId']}",
-                "method": "POST",
-                "url": "/v1/chat/completions",
-                "body": {
-                    "model": "gpt-4o-mini",
-                    "messages": [
-                        {"role": "system", "content": SYSTEM_PROMPT},
-                        {"role": "user", "content": user_prompt},
-                    ],
-                    "temperature": 0.0,
-                },
-            }
-            f.write(json.dumps(entrada, ensure_ascii=False) + "\n")
-    conn.close()
+    # O input vai ser regravado: um pendente que sobrou de outra extração não vale mais
+    descartar_pendente(DATA_DIR)
+    desde = ultima_mensagem_processada(DATA_DIR, CLIENT_ID) if MODO_INCREMENTAL else None
+    if desde:
+        print(f"🔖 Modo incremental: leads com mensagens após {desde}")
+
+    cache = abrir_cache(DATA_DIR) if USAR_CACHE else None
+    regras = montar_classificador(REGRAS, REGRAS_MAX_PALAVRAS) if USAR_REGRAS else None
+    try:
+        resumo = _extrair(desde, offline, cache, regras)
+    finally:
+        if cache is not None:
+            cache.fechar()
+    if regras is not None:
+        regras.relatar()
     print(f"✅ Arquivo '{ARQUIVO_INPUT}' gerado com sucesso.")
 
+    # Uma amostra com LIMITE não cobre todos os leads novos, então não avança o checkpoint
+    if MODO_INCREMENTAL and not LIMITE:
+        registrar_pendente(DATA_DIR, CLIENT_ID, resumo["ultima_mensagem"], resumo["leads"], ARQUIVO_INPUT)
+    return resumo
 
-# -----------------------------
-# 2. ENVIA ARQUIVO E CRIA JOB
-# -----------------------------
-def criar_job():
-    print("📤 Enviando arquivo...")
-    upload = openai.files.create(file=open(ARQUIVO_INPUT, "rb"), purpose="batch")
-    print("✅ Arquivo enviado. File ID:", upload.id)
 
-    print("🚀 Criando job...")
-    batch = openai.batches.create(
-        input_file_id=upload.id,
-        endpoint="/v1/chat/completions",
-        completion_window="24h",
-    )
-    print("✅ Job criado. Job ID:", batch.id)
-    return batch.id
+def _extrair(desde, offline, cache, regras):
+    if PARTICOES_EXTRACAO > 1 and not (USAR_ESPELHO or offline):
+        print(f"🧵 Extraindo em {PARTICOES_EXTRACAO} partições paralelas...")
+        return extrair_paralelo(DB_CONFIG, CLIENT_ID, DATA_INICIO, ARQUIVO_INPUT, SYSTEM_PROMPT, PARTICOES_EXTRACAO,
+                                desde=desde, limite=LIMITE, itersize=ITERSIZE,
+                                deduplicar=DEDUPLICAR, cache=cache, regras=regras,
+                                leads_por_pacote=EMPACOTAR_LEADS, tokens_por_pacote=EMPACOTAR_TOKENS)
+
+    with EscritorRequisicoes(ARQUIVO_INPUT, SYSTEM_PROMPT, deduplicar=DEDUPLICAR, cache=cache, regras=regras,
+                             leads_por_pacote=EMPACOTAR_LEADS, tokens_por_pacote=EMPACOTAR_TOKENS) as saida:
+        if USAR_ESPELHO or offline:
+            return extrair_com_espelho(DB_CONFIG, DATA_DIR, CLIENT_ID, DATA_INICIO, saida, desde=desde,
+                                       limite=LIMITE, sincronizar=not offline, itersize=ITERSIZE)
+
+        sql, params = montar_consulta(CLIENT_ID, DATA_INICIO, desde=desde, limite=LIMITE)
+        conn = psycopg2.connect(**DB_CONFIG)
+        try:
+            if BACKEND_EXTRACAO == "copy":
+                return extrair_via_copy(conn, sql, params, saida)
+            return extrair_para_jsonl(conn, sql, params, saida, itersize=ITERSIZE)
+        finally:
+            conn.close()
 
 
 # -----------------------------
-# 3. MONITORA O STATUS
+# 2. DIVIDE O INPUT EM LOTES E CRIA OS JOBS
 # -----------------------------
-def aguardar_job(job_id):
-    print("⏳ Monitorando job...")
-    while True:
-        batch = openai.batches.retrieve(job_id)
-        status = batch.status
-        print(f"   Status: {status}")
-        if status in ["completed", "failed", "expired", "cancelled"]:
-            return batch
-        time.sleep(10)
+def criar_job(registro):
+    return criar_jobs(ARQUIVO_INPUT, max_requisicoes=MAX_REQUISICOES_LOTE, max_mb=MAX_MB_LOTE, registro=registro,
+                      cliente_openai=CLIENTE_OPENAI)
 
 
 # -----------------------------
-# 4. BAIXA E PROCESSA RESULTADO
+# 3. MONITORA O STATUS E PROCESSA RESULTADOS
 # -----------------------------
-def aguardar_e_processar_batch(job_id, intervalo=10, max_tentativas=60):
-    from openai import APIError, APIConnectionError, APITimeoutError  
+def aguardar_e_processar_batch(job_ids, registro, arquivos=ARQUIVOS):
+    """Espera todos os jobs, junta as saídas e gera o relatório.
+
+    O relatório é montado enquanto as saídas são baixadas (baixar_linhas), e o
+    arquivo completo fica em arquivos["saida"] para as retentativas; se alguma
+    resposta for recuperada, o relatório é refeito com ela.
+
+    Retorna True só se todos os lotes foram concluídos e todas as requisições têm
+    resposta (depois das retentativas); senão o relatório sai parcial e o
+    checkpoint não avança. Os jobs que terminaram são
+    marcados como processados no registro, para não serem retomados de novo.
+    """
+    batches = aguardar_batches(job_ids, registro=registro, cliente_openai=CLIENTE_OPENAI)
+    if not tem_saida(batches):
+        registro.marcar_processados(finalizados(batches))
+        print("⛔ Nenhum resultado disponível para este batch.")
+        return False
+
+    gerar_relatorio(baixar_linhas(batches, arquivos["saida"], CLIENTE_OPENAI), arquivos)
+    registro.marcar_processados(finalizados(batches))
+    restantes, recuperadas = recuperar_falhas(arquivos["saida"], registro, arquivos)
+    if recuperadas:
+        gerar_relatorio(arquivos["saida"], arquivos)
+    completo = concluidos(batches)
+    if not completo:
+        print("⚠️ Relatório parcial: nem todos os lotes foram concluídos.")
+    return completo and not restantes
+
+
+def retomar_jobs(abertos, registro, arquivos=ARQUIVOS, saida_anterior=None):
+    """Retoma os jobs em aberto (linhas do registro) de um input.
+
+    Lotes originais seguem o fluxo completo de aguardar_e_processar_batch. Se só
+    restaram lotes de uma retentativa (o processo caiu no meio dela), as respostas
+    entram na saída já baixada do input (`saida_anterior`, por padrão
+    arquivos["saida"]), as rodadas que faltam são feitas e o relatório é refeito.
+    Retorna True nas mesmas condições de aguardar_e_processar_batch.
+    """
+    originais = [r["batch_id"] for r in abertos if not r["rodada"]]
+    if originais:
+        return aguardar_e_processar_batch(originais, registro, arquivos)
+
+    saida_anterior = saida_anterior or arquivos["saida"]
+    if not os.path.exists(saida_anterior):
+        print(f"⛔ {os.path.basename(saida_anterior)} não encontrado; não há onde juntar a retentativa.")
+        return False
+    if saida_anterior != arquivos["saida"]:
+        shutil.copyfile(saida_anterior, arquivos["saida"])
+    rodada = max(r["rodada"] for r in abertos)
+    batches = aguardar_batches([r["batch_id"] for r in abertos], registro=registro, cliente_openai=CLIENTE_OPENAI)
+    registro.marcar_processados(finalizados(batches))
+    if tem_saida(batches):
+        respostas = baixar_linhas(batches, arquivos["retentativa"].format(rodada=rodada), CLIENTE_OPENAI)
+        juntar_retentativa(arquivos["input"], arquivos["saida"], respostas)
+    restantes, _ = recuperar_falhas(arquivos["saida"], registro, arquivos, feitas=rodada)
+    gerar_relatorio(arquivos["saida"], arquivos)
+    return not restantes
 
-    tentativas = 0
-    arquivo_saida = None
 
-    while tentativas < max_tentativas:
-        try:
-            batch = openai.batches.retrieve(job_id)
-            print(f"Status do batch: {batch.status}")
-
-            if batch.status == "completed":
-                # ✅ pega o arquivo de saída
-                if batch.output_file_id:
-                    print("🔽 Baixando resultado final do batch...")
-                    response = openai.files.retrieve_content(batch.output_file_id)
-                    arquivo_saida = os.path.join(DATA_DIR, f"resultado_batch_{DATA_HOJE}.jsonl")
-                    with open(arquivo_saida, "w", encoding="utf-8") as f:
-                        f.write(response)
-                    print(f"✅ Resultado salvo em {arquivo_saida}")
-                break
-
-            elif batch.status in ["failed", "expired", "cancelled"]:
-                print(f"❌ Batch terminou com status: {batch.status}")
-                break
-
-        except (APITimeoutError, APIConnectionError) as e:
-            print(f"⚠️ Timeout ou erro de conexão. Tentando novamente em {intervalo}s... ({e})")
-        except APIError as e:
-            print(f"⚠️ Erro na API: {e}. Tentando novamente em {intervalo}s...")
-        except OpenAIError as e:
-            print(f"⚠️ Erro da OpenAI: {e}. Tentando novamente em {intervalo}s...")
-        except Exception as e:
-            print(f"⚠️ Erro inesperado: {e}. Tentando novamente em {intervalo}s...")
-
-        tentativas += 1
-        time.sleep(intervalo)
-
-    if not arquivo_saida:
-        print("⛔ Nenhum resultado disponível para este batch.")
-        return
-
-    # -----------------------------
-    # Processar resultados do JSONL
-    # -----------------------------
-    print("📊 Processando resultados e gerando Excel...")
-
-    mensagens_originais = {}
-    with open(ARQUIVO_INPUT, "r", encoding="utf-8") as f:
-        for linha in f:
-            try:
-                item = json.loads(linha)
-                mensagens_originais[item["custom_id"]] = " ".join(
-                    [m["content"] for m in item["body"]["messages"] if m["role"] == "user"]
-                )
-            except Exception:
-                continue
+# -----------------------------
+# 4. MODO TEMPO REAL (AMOSTRAS E RODADAS PEQUENAS)
+# -----------------------------
+def enviar_tempo_real(arquivo_input, arquivo_saida):
+    return asyncio.run(executar_tempo_real(
+        arquivo_input,
+        arquivo_saida,
+        cliente_openai=AsyncOpenAIFalso(SERVIDOR_FALSO) if OPENAI_FALSO else None,
+        limitador=LimitadorTaxa(TEMPO_REAL_RPM, TEMPO_REAL_TPM),
+        concorrencia=TEMPO_REAL_CONCORRENCIA,
+    ))
 
-    dados, temas = [], []
-    total_tokens = 0
-
-    with open(arquivo_saida, "r", encoding="utf-8") as f:
-        for linha in f:
-            try:
-                item = json.loads(linha)
-                custom_id = item.get("custom_id", "")
-                body = item.get("response", {}).get("body", {})
-                choices = body.get("choices", [])
-                usage = body.get("usage", {})
-                tokens = usage.get("total_tokens", 0)
-
-                resposta = ""
-                if choices:
-                    resposta = choices[0].get("message", {}).get("content", "")
-
-                assunto = ""
-                for l in resposta.splitlines():
-                    if l.lower().startswith("assunto:") or l.lower().startswith("assuntos:"):
-                        assunto = l.split(":", 1)[-1].strip()
-
-                mensagem_original = mensagens_originais.get(custom_id, "")
-                dados.append({
-                    "ID": custom_id,
-                    "Mensagem Original": mensagem_original,
-                    "Assunto": assunto,
-                    "Tokens": tokens
-                })
-
-                for a in assunto.split(","):
-                    a_limpo = a.strip()
-                    if a_limpo:
-                        temas.append(a_limpo)
-
-                total_tokens += tokens
-            except Exception:
-                continue
 
-    # Estatísticas
-    contagem = Counter(temas)
-    total_msgs = len(temas)
-    df_estatisticas = pd.DataFrame([
-        {"Assunto": a, "Quantidade": contagem[a], "Porcentagem (%)": round(contagem[a]/total_msgs*100, 2)}
-        for a in contagem
-    ])
-    df_estatisticas.loc[len(df_estatisticas)] = {"Assunto": "TOTAL", "Quantidade": total_msgs, "Porcentagem (%)": 100.0}
-    df_estatisticas.loc[len(df_estatisticas)] = {"Assunto": "TOTAL TOKENS", "Quantidade": total_tokens, "Porcentagem (%)": "-"}
+def processar_tempo_real(registro):
+    """Classifica o input com chamadas diretas (concorrentes e limitadas por RPM/TPM) e gera o relatório."""
+    print(f"⚡ Modo tempo real: {contar_leads(ARQUIVO_INPUT)} requisições")
+    arquivo_saida, _ = enviar_tempo_real(ARQUIVO_INPUT, ARQUIVOS["saida"])
+    restantes, _ = recuperar_falhas(arquivo_saida, registro)
+    gerar_relatorio(arquivo_saida)
+    return not restantes
 
-    # Exportar Excel
-    df_detalhado = pd.DataFrame(dados)
-    with pd.ExcelWriter(ARQUIVO_EXCEL, engine="openpyxl") as writer:
-        df_detalhado.to_excel(writer, sheet_name="Mensagens Classificadas", index=False)
-        df_estatisticas.to_excel(writer, sheet_name="Estatísticas", index=False)
 
-    print(f"📊 Análise concluída. Arquivo Excel gerado: {ARQUIVO_EXCEL}")
+# -----------------------------
+# 5. REENVIO DAS REQUISIÇÕES QUE FALHARAM
+# -----------------------------
+def recuperar_falhas(arquivo_saida, registro, arquivos=ARQUIVOS, feitas=0):
+    """Reenvia só as requisições sem resposta válida (tempo real se forem poucas) e junta as respostas.
+
+    Os lotes de retentativa ficam no registro sob o input original, marcados com a
+    rodada, para que uma retomada os junte à saída dele; `feitas` é o número de
+    rodadas já concluídas antes (retomada no meio das retentativas).
+    Retorna (custom_ids que continuaram sem resposta, quantas foram recuperadas); com
+    alguma sem resposta, o checkpoint não avança.
+    """
+    arquivo_input = arquivos["input"]
+    recuperadas = 0
+    for rodada in range(feitas + 1, RETENTATIVAS_FALHAS + 1):
+        retentativa = preparar_retentativa(arquivo_input, arquivo_saida, rodada)
+        if retentativa is None:
+            return [], recuperadas
+        saida_retentativa = arquivos["retentativa"].format(rodada=rodada)
+        if contar_leads(retentativa) <= TEMPO_REAL_MAX_LEADS:
+            enviar_tempo_real(retentativa, saida_retentativa)
+            respostas = saida_retentativa
+        else:
+            job_ids = criar_jobs(retentativa, max_requisicoes=MAX_REQUISICOES_LOTE, max_mb=MAX_MB_LOTE,
+                                 registro=registro, cliente_openai=CLIENTE_OPENAI, arquivo_input=arquivo_input,
+                                 rodada=rodada)
+            batches = aguardar_batches(job_ids, registro=registro, cliente_openai=CLIENTE_OPENAI)
+            registro.marcar_processados(finalizados(batches))
+            if not tem_saida(batches):
+                continue
+            respostas = baixar_linhas(batches, saida_retentativa, CLIENTE_OPENAI)
+        recuperadas += juntar_retentativa(arquivo_input, arquivo_saida, respostas)
+    return relatar_falhas(arquivo_input, arquivo_saida), recuperadas
+
+
+def gerar_relatorio(arquivo_saida, arquivos=ARQUIVOS):
+    """Excel, Parquet e histórico do input de `arquivos` a partir da saída (caminho, linhas ou None)."""
+    cache = abrir_cache(DATA_DIR) if USAR_CACHE else None
+    try:
+        processar_resultados(arquivos["input"], arquivo_saida, arquivos["excel"], com_unidade=EXTRAIR_UNIDADE,
+                             cache=cache, taxonomia=Taxonomia.do_prompt(SYSTEM_PROMPT, AGRUPAR_APELIDOS),
+                             max_caracteres=MAX_CARACTERES_MENSAGEM,
+                             arquivo_parquet=arquivos["parquet"] if GRAVAR_PARQUET else None, cliente=NOME,
+                             data=arquivos["data"], pasta_historico=PASTA_HISTORICO if GRAVAR_HISTORICO else None,
+                             localizador=montar_localizador(UNIDADES))
+    finally:
+        if cache is not None:
+            cache.fechar()
 
 
 # -----------------------------
 # MAIN
 # -----------------------------
 if __name__ == "__main__":
-    gerar_input()
-    job_id = criar_job()
-    batch = aguardar_job(job_id)
-    baixar_e_analisar(batch)
+    parser = argparse.ArgumentParser(description=f"Classifica as mensagens do cliente {NOME} via Batch API.")
+    parser.add_argument("--pular-extracao", action="store_true",
+                        help="usa o batch_input de hoje já gerado (ex.: por extrair_todos.py)")
+    parser.add_argument("--offline", action="store_true",
+                        help="gera o input só a partir do espelho local, sem consultar o Postgres")
+    modo = parser.add_mutually_exclusive_group()
+    modo.add_argument("--tempo-real", dest="modo", action="store_const", const="tempo_real",
+                      help="envia direto ao chat completions, sem o Batch API")
+    modo.add_argument("--batch", dest="modo", action="store_const", const="batch",
+                      help="usa o Batch API mesmo para inputs pequenos")
+    args = parser.parse_args()
+
+    with RegistroJobs(DATA_DIR, NOME) as registro:
+        abertos = registro.em_aberto(ARQUIVO_INPUT)
+        if abertos:
+            # Uma execução anterior de hoje já enviou este input: retoma os jobs em vez de extrair e reenviar
+            print(f"🔁 Retomando {len(abertos)} job(s) já enviados de {os.path.basename(ARQUIVO_INPUT)}")
+            if retomar_jobs(abertos, registro):
+                confirmar_checkpoint(DATA_DIR, ARQUIVO_INPUT)
+            sys.exit(0)
+        if registro.em_aberto():
+            print("⚠️ Há jobs de dias anteriores ainda não processados; rode verifica.py para recuperá-los.")
+
+        if args.pular_extracao:
+            if not os.path.exists(ARQUIVO_INPUT):
+                print(f"⛔ {os.path.basename(ARQUIVO_INPUT)} não encontrado; rode a extração antes.")
+                sys.exit(1)
+            leads = contar_leads(ARQUIVO_INPUT) + sum(contar_leads(caminho_sidecar(ARQUIVO_INPUT, s))
+                                                      for s in SUFIXOS_LOCAIS)
+        else:
+            leads = gerar_input(offline=args.offline)["leads"]
+        if not leads:
+            print("✅ Nenhuma mensagem nova desde a última execução.")
+            sys.exit(0)
+        if not contar_leads(ARQUIVO_INPUT):
+            print("🗃️ Todas as conversas foram resolvidas pelo cache ou pelas regras. Nada a enviar.")
+            gerar_relatorio(None)
+            confirmar_checkpoint(DATA_DIR, ARQUIVO_INPUT)
+            sys.exit(0)
+        modo = args.modo or ("tempo_real" if contar_leads(ARQUIVO_INPUT) <= TEMPO_REAL_MAX_LEADS else "batch")
+        if modo == "tempo_real":
+            if processar_tempo_real(registro):
+                confirmar_checkpoint(DATA_DIR, ARQUIVO_INPUT)
+            sys.exit(0)
+        job_ids = criar_job(registro)
+        if aguardar_e_processar_batch(job_ids, registro):
+            confirmar_checkpoint(DATA_DIR, ARQUIVO_INPUT)
@@ -1,150 +1,78 @@
-import openai
 import os
-import time
-import json
-import pandas as pd
-from collections import Counter
-from dotenv import load_dotenv
-from datetime import datetime
-
-# -----------------------------
-# Configurações
-# -----------------------------
-load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
-
-# -----------------------------
-# Pastas e arquivos
-# -----------------------------
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR = os.path.join(BASE_DIR, "data")
-DATA_HOJE = datetime.now().strftime("%Y%m%d")
-
-# Batch que você quer processar
-JOB_ID = "batch_68a5c2737b6881909d49f0ce362a6ae6"
-
-# Arquivos
-ARQUIVO_INPUT = os.path.join(DATA_DIR, f"batch_input_{DATA_HOJE}.jsonl")
-ARQUIVO_JSONL = os.path.join(DATA_DIR, f"resultado_batch_{DATA_HOJE}.jsonl")
-ARQUIVO_EXCEL = os.path.join(DATA_DIR, f"resultado_batch_{DATA_HOJE}.xlsx")
-
-# -----------------------------
-# 1. Aguardar batch terminar
-# -----------------------------
-print("⏳ Acompanhando status do batch...")
-while True:
-    batch = openai.batches.retrieve(JOB_ID)
-    status = batch.status
-    print(f"Status atual: {status}")
-    if status in ["completed", "failed", "expired", "cancelled"]:
-        break
-    time.sleep(10)
-
-if status != "completed":
-    print(f"❌ O batch terminou com status: {status}")
-    exit(1)
-
-print("✅ Batch finalizado com sucesso!")
-FILE_ID = batch.output_file_id
-print("📁 ID do arquivo de saída:", FILE_ID)
-
-# -----------------------------
-# 2. Ler mensagens originais do batch_input
-# -----------------------------
-mensagens_originais = {}
-with open(ARQUIVO_INPUT, "r", encoding="utf-8") as f:
-    for linha in f:
-        item = json.loads(linha)
-        custom_id = item.get("custom_id")
-        mensagens = [
-            m.get("content", "")
-            for m in item.get("body", {}).get("messages", [])
-            if m.get("role") == "user"
-        ]
-        mensagens_originais[custom_id] = " ".join(mensagens)
-
-# -----------------------------
-# 3. Baixar resultado do batch
-# -----------------------------
-print("🔽 Baixando conteúdo do arquivo batch...")
-response = openai.files.retrieve_content(FILE_ID)
-with open(ARQUIVO_JSONL, "w", encoding="utf-8") as f:
-    f.write(response)
-print(f"✅ Arquivo JSONL salvo: {ARQUIVO_JSONL}")
-
-# -----------------------------
-# 4. Processar resultados
-# -----------------------------
-dados = []
-temas = []
-total_tokens = 0
-
-with open(ARQUIVO_JSONL, "r", encoding="utf-8") as f:
-    for linha in f:
-        item = json.loads(linha)
-        custom_id = item.get("custom_id", "")
-        body = item.get("response", {}).get("body", {})
-        choices = body.get("choices", [])
-        usage = body.get("usage", {})
-        tokens = int(usage.get("total_tokens", 0))
-
-        resposta = ""
-        if choices:
-            resposta = choices[0].get("message", {}).get("content", "")
-
-        # Extrair assunto(s)
-        assuntos = []
-        for linha_resp in resposta.splitlines():
-            linha_resp_lower = linha_resp.lower()
-            if linha_resp_lower.startswith("assunto:") or linha_resp_lower.startswith("assuntos:"):
-                assuntos.append(linha_resp.split(":", 1)[-1].strip())
-        assunto = ", ".join(assuntos)
-
-        mensagem_original = mensagens_originais.get(custom_id, "")
-
-        dados.append({
-            "ID": custom_id,
-            "Mensagem Original": mensagem_original,
-            "Assunto": assunto,
-            "Tokens": tokens
-        })
-
-        for a in assunto.split(","):
-            a_limpo = a.strip()
-            if a_limpo:
-                temas.append(a_limpo)
-
-        total_tokens += tokens
-
-# -----------------------------
-# 5. Estatísticas
-# -----------------------------
-contagem = Counter(temas)
-total_msgs = len(temas)
-
-df_estatisticas = pd.DataFrame([
-    {"Assunto": assunto, "Quantidade": contagem[assunto], "Porcentagem (%)": round(contagem[assunto]/total_msgs*100, 2)}
-    for assunto in contagem
-])
-
-df_estatisticas.loc[len(df_estatisticas)] = {
-    "Assunto": "TOTAL",
-    "Quantidade": total_msgs,
-    "Porcentagem (%)": 100.0
-}
-df_estatisticas.loc[len(df_estatisticas)] = {
-    "Assunto": "TOTAL TOKENS",
-    "Quantidade": total_tokens,
-    "Porcentagem (%)": "-"
-}
-
-# -----------------------------
-# 6. Gerar Excel
-# -----------------------------
-df_detalhado = pd.DataFrame(dados)
-
-with pd.ExcelWriter(ARQUIVO_EXCEL, engine="openpyxl") as writer:
-    df_detalhado.to_excel(writer, sheet_name="Mensagens Classificadas", index=False)
-    df_estatisticas.to_excel(writer, sheet_name="Estatísticas", index=False)
-
-print(f"✅ Excel gerado: {ARQUIVO_EXCEL}")
+import re
+import sys
+
+# Mesmo caminho do main.py: as funções de lá geram o relatório (sidecars, pacotes,
+# cache, regras, taxonomia, Parquet e histórico) e reenviam as falhas; aqui só muda
+# de onde vêm os jobs
+from main import NOME, DATA_DIR, DATA_HOJE, CLIENTE, COMPRIMIR_RESULTADO, retomar_jobs
+from comum.clientes import arquivos_do_input
+from comum.jobs import RegistroJobs
+from comum.checkpoint import confirmar_checkpoint
+
+# Os arquivos gerados aqui levam este rótulo no nome, para não sobrescrever os do main.py
+ROTULO = "_verifica"
+
+
+# -----------------------------
+# Jobs a verificar
+# -----------------------------
+def jobs_a_verificar(registro, job_ids):
+    """(batch_input, lotes): as linhas do registro (data/registro_jobs.sqlite) dos jobs passados
+    na linha de comando ou, sem argumentos, de todos os lotes do input mais antigo ainda não processado.
+    Os lotes de retentativa ficam no registro sob o input original, com a rodada.
+
+    Sai com erro se algum job passado não estiver no registro (não há como saber o
+    input dele) ou se eles vierem de inputs diferentes (rode um input por vez).
+    """
+    if job_ids:
+        lotes = [registro.lote(j) for j in job_ids]
+        desconhecidos = [j for j, lote in zip(job_ids, lotes) if lote is None]
+        if desconhecidos:
+            print(f"⛔ Job(s) fora do registro, sem input conhecido: {', '.join(desconhecidos)}")
+            sys.exit(1)
+        inputs = list(dict.fromkeys(lote["arquivo_input"] for lote in lotes))
+        if len(inputs) > 1:
+            print(f"⛔ Os jobs vêm de {len(inputs)} inputs diferentes "
+                  f"({', '.join(map(os.path.basename, inputs))}); verifique um input por vez.")
+            sys.exit(1)
+        return inputs[0], lotes
+    abertos = registro.em_aberto()
+    if not abertos:
+        return None, []
+    arquivo_input = abertos[0]["arquivo_input"]
+    return arquivo_input, [r for r in abertos if r["arquivo_input"] == arquivo_input]
+
+
+def data_do_input(arquivo_input):
+    """YYYYMMDD do nome batch_input_YYYYMMDD.jsonl (hoje, se o nome não tiver data)."""
+    encontrado = re.search(r"(\d{8})", os.path.basename(arquivo_input))
+    return encontrado.group(1) if encontrado else DATA_HOJE
+
+
+# -----------------------------
+# MAIN
+# -----------------------------
+if __name__ == "__main__":
+    with RegistroJobs(DATA_DIR, NOME) as registro:
+        arquivo_input, lotes = jobs_a_verificar(registro, sys.argv[1:])
+        if not lotes:
+            print("✅ Nenhum job pendente no registro.")
+            sys.exit(0)
+        if not os.path.exists(arquivo_input):
+            print(f"⛔ {os.path.basename(arquivo_input)} não encontrado; não dá para montar o relatório.")
+            sys.exit(1)
+        print(f"🔁 Retomando {len(lotes)} job(s) de {os.path.basename(arquivo_input)}")
+        data = data_do_input(arquivo_input)
+        arquivos = arquivos_do_input(CLIENTE, arquivo_input, data, ROTULO, COMPRIMIR_RESULTADO)
+        # Retentativa interrompida: as respostas vão para a saída já baixada (a desta
+        # verificação, se houver, senão a do main.py)
+        saida_anterior = (arquivos["saida"] if os.path.exists(arquivos["saida"]) else
+                          arquivos_do_input(CLIENTE, arquivo_input, data, comprimido=COMPRIMIR_RESULTADO)["saida"])
+
+        print("⏳ Acompanhando status do batch...")
+        if not retomar_jobs(lotes, registro, arquivos, saida_anterior):
+            # Relatório parcial (ou nenhum): o checkpoint pendente continua esperando
+            sys.exit(1)
+        # Só avança se o pendente for da extração que gravou este input
+        confirmar_checkpoint(DATA_DIR, arquivo_input)
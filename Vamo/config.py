@@ -0,0 +1,74 @@
+import os
+from dotenv import load_dotenv
+
+# -----------------------------
+# CONFIGURAÇÃO DO CLIENTE
+# -----------------------------
+# Lida tanto pelo main.py desta pasta quanto pelos scripts que rodam todos os
+# clientes de uma vez (ver comum/clientes.py).
+load_dotenv()
+
+NOME = "Vamo"
+CLIENT_ID = os.getenv("CLIENT_ID_VAMO")
+
+# Lê também a linha "Unidade:" da resposta e separa as estatísticas por unidade
+EXTRAIR_UNIDADE = True
+
+# Conta os itens entre parênteses de um assunto do SYSTEM_PROMPT como o próprio
+# assunto (ex.: "piscina social" -> "locais do clube"). Desligado, cada item que o
+# modelo devolver fica com o nome dele no relatório.
+AGRUPAR_APELIDOS = False
+
+# Amostra de leads por execução (None para todos)
+LIMITE = 3
+
+# Regras locais: conversas curtas com estas palavras-chave são classificadas sem
+# passar pelo modelo (comparação sem acentos). Os assuntos devem ter a mesma
+# grafia da lista do SYSTEM_PROMPT.
+REGRAS = {
+    "Endereço": ["endereço", "onde fica", "localização", "como chegar"],
+    "Horário de Funcionamento": ["horário de funcionamento", "que horas abre", "que horas fecha", "horário"],
+    "Reserva": ["reserva", "reservar"],
+    "Aniversário": ["aniversário", "aniversariante"],
+    "Rooftop": ["rooftop"],
+}
+# Conversas com mais palavras que isso sempre vão para o modelo
+REGRAS_MAX_PALAVRAS = 25
+
+# Unidades procuradas no texto das conversas para a aba "Estatísticas por unidade"
+# do relatório: {unidade: [outras grafias]}. A comparação ignora acentos e caixa.
+UNIDADES = {
+    "Lagoa": [],
+    "Downtown": ["down town"],
+    "Bossa Nova": ["bossanova"],
+    "Abelardo Bueno": ["abelardo"],
+}
+
+SYSTEM_PROMPT = """
+Você é uma IA que atua como classificadora de assuntos de mensagens.
+
+Você receberá uma sequência de mensagens concatenadas do mesmo cliente (leadId), representando toda a conversa desse cliente.
+
+Sua tarefa é identificar **todos os assuntos** que aparecem nas mensagens dessa conversa, e listá-los.
+
+Os assuntos possíveis são:
+
+- Endereço
+- Reserva
+- Aniversário
+- Horário de Funcionamento
+- Reclamações
+- valores
+- Rooftop
+- Degustação de pizza
+- Unidades: Lagoa, Abelardo, Downtown, Bossa nova
+- Assuntos Gerais (caso o assunto não seja nenhum dos outros listados)
+
+⚠️ IMPORTANTE:
+- Responda **apenas** com a linha:  
+  Assuntos: [assunto1], [assunto2], [assunto3], ...  
+- Liste todos os assuntos que aparecem na conversa, separados por vírgula.
+- Não repita assuntos iguais.
+- Não explique nada além disso.
+- Não escreva mais nada que não essa linha.
+"""
@@ -0,0 +1,113 @@
+"""Compara o cálculo da aba "Estatísticas": Counter com laços em Python x groupby/explode do pandas.
+
+Não precisa de banco nem de API: gera leads classificados sintéticos, com as
+combinações de assuntos e unidades que o modelo costuma devolver.
+
+    python benchmarks/bench_estatisticas.py --leads 1000000 3000000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from comum.processamento import calcular_estatisticas
+from comum.taxonomia import Taxonomia
+
+ASSUNTOS = ["Endereço", "Reserva", "Aniversário", "Horário de Funcionamento", "Reclamações", "Valores",
+            "Rooftop", "Degustação de pizza", "Assuntos Gerais"]
+UNIDADES = ["Lagoa", "Abelardo", "Downtown", "Bossa nova", "Não Informada"]
+
+
+def gerar_dados(leads, semente=0):
+    sorteio = random.Random(semente)
+    combinacoes = [", ".join(sorteio.sample(ASSUNTOS, sorteio.choice((1, 1, 2, 3)))) for _ in range(200)] + [""]
+    return pd.DataFrame({
+        "ID": [f"id-{i}" for i in range(leads)],
+        "Assunto": [sorteio.choice(combinacoes) for _ in range(leads)],
+        "Unidade": [sorteio.choice(UNIDADES) for _ in range(leads)],
+        "Tokens": 150,
+    })
+
+
+def codificar(df):
+    """Resumo como o de processar_resultados: código da combinação de assuntos e da unidade."""
+    taxonomia = Taxonomia(ASSUNTOS, UNIDADES)
+    resumo = df.copy()
+    resumo["Assunto"] = np.array([taxonomia.combinacao(taxonomia.codigos_assuntos(a)) for a in df["Assunto"]])
+    resumo["Unidade"] = np.array([taxonomia.codigo_unidade(u) for u in df["Unidade"]])
+    return resumo, taxonomia
+
+
+def estatisticas_pandas(df, total_tokens, com_unidade=False):
+    """Codificação dos assuntos e unidades + calcular_estatisticas, medidas juntas.
+
+    O Counter lê os textos direto; o pandas precisa dos códigos antes, e esse custo
+    entra na conta dele.
+    """
+    resumo, taxonomia = codificar(df)
+    return calcular_estatisticas(resumo, total_tokens, taxonomia, com_unidade)
+
+
+def estatisticas_counter(dados, total_tokens, com_unidade=False):
+    """Implementação anterior: Counter sobre a lista de dicts e totais com df.loc."""
+    def assuntos(assunto):
+        for a in assunto.split(","):
+            if a.strip():
+                yield a.strip()
+
+    if com_unidade:
+        temas = [(item.get("Unidade", "Não Informada"), a) for item in dados for a in assuntos(item["Assunto"])]
+    else:
+        temas = [a for item in dados for a in assuntos(item["Assunto"])]
+    contagem = Counter(temas)
+    total_msgs = len(temas)
+    if com_unidade:
+        df = pd.DataFrame([{"Unidade": u, "Assunto": a, "Quantidade": contagem[(u, a)],
+                            "Porcentagem (%)": round(contagem[(u, a)] / total_msgs * 100, 2)} for (u, a) in contagem],
+                          columns=["Unidade", "Assunto", "Quantidade", "Porcentagem (%)"])
+        df.loc[len(df)] = {"Unidade": "TOTAL", "Assunto": "", "Quantidade": total_msgs, "Porcentagem (%)": 100.0}
+        df.loc[len(df)] = {"Unidade": "TOTAL TOKENS", "Assunto": "", "Quantidade": total_tokens, "Porcentagem (%)": "-"}
+    else:
+        df = pd.DataFrame([{"Assunto": a, "Quantidade": contagem[a],
+                            "Porcentagem (%)": round(contagem[a] / total_msgs * 100, 2)} for a in contagem],
+                          columns=["Assunto", "Quantidade", "Porcentagem (%)"])
+        df.loc[len(df)] = {"Assunto": "TOTAL", "Quantidade": total_msgs, "Porcentagem (%)": 100.0}
+        df.loc[len(df)] = {"Assunto": "TOTAL TOKENS", "Quantidade": total_tokens, "Porcentagem (%)": "-"}
+    return df
+
+
+def medir(funcao, *args):
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    return time.perf_counter() - inicio, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--leads", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print("pandas (s) inclui a codificação dos assuntos e unidades (codificar) antes de calcular_estatisticas")
+    print(f"{'leads':>9} {'unidade':>8} {'counter (s)':>12} {'pandas (s)':>11}")
+    for leads in args.leads:
+        df = gerar_dados(leads)
+        total_tokens = int(df["Tokens"].sum())
+        for com_unidade in (False, True):
+            # O Counter recebia a lista de dicts; a conversão não entra na medição de nenhum dos dois
+            dados = df.to_dict("records")
+            t_counter, esperado = medir(estatisticas_counter, dados, total_tokens, com_unidade)
+            del dados
+            t_pandas, obtido = medir(estatisticas_pandas, df, total_tokens, com_unidade)
+            # Mesmas linhas, na mesma ordem (porcentagens com a mesma precisão)
+            pd.testing.assert_frame_equal(obtido.astype(str), esperado.astype(str))
+            print(f"{leads:>9} {'sim' if com_unidade else 'não':>8} {t_counter:>12.2f} {t_pandas:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
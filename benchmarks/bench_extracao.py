@@ -0,0 +1,117 @@
+"""Compara os backends de extração (cursor nomeado x COPY) num Postgres local.
+
+Cria um ideia_message_db sintético no schema "bench_ideia" do banco indicado
+por BENCH_DSN (nunca aponte para produção) e roda cada backend num processo
+separado, para que o pico de memória de um não contamine o outro.
+
+    BENCH_DSN="dbname=bench user=postgres" python benchmarks/bench_extracao.py --leads 200000
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+import psycopg2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from comum.extracao import extrair_para_jsonl, extrair_via_copy, montar_consulta, pico_memoria_mb
+from comum.requisicoes import EscritorRequisicoes
+
+SCHEMA = "bench_ideia"
+CLIENT_ID = "bench-client"
+DATA_INICIO = "2025-01-01 00:00:00"
+SYSTEM_PROMPT = "Você é uma IA que atua como classificadora de assuntos de mensagens."
+
+FRASES = [
+    "Olá, qual o horário de funcionamento?",
+    "Quero fazer uma reserva para sábado",
+    "Qual o endereço da unidade Lagoa?",
+    "Vocês fazem festa de aniversário?",
+    "Quanto custa o rodízio?",
+]
+
+
+def conectar():
+    return psycopg2.connect(os.environ["BENCH_DSN"], options=f"-c search_path={SCHEMA}")
+
+
+def preparar_base(leads, mensagens_por_lead):
+    conn = conectar()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA}")
+            cursor.execute("DROP TABLE IF EXISTS ideia_message_db")
+            cursor.execute("""
+                CREATE TABLE ideia_message_db (
+                    "clientId" text, "leadId" text, message text, "createdAt" timestamp
+                )
+            """)
+            cursor.execute("""
+                INSERT INTO ideia_message_db
+                SELECT %s,
+                       'lead-' || (g %% %s),
+                       (%s::text[])[1 + g %% %s] || E'\\nmsg ' || g,
+                       timestamp '2025-02-01' + (g || ' seconds')::interval
+                FROM generate_series(1, %s) g
+            """, (CLIENT_ID, leads, FRASES, len(FRASES), leads * mensagens_por_lead))
+            cursor.execute('CREATE INDEX ON ideia_message_db ("clientId", "createdAt")')
+            cursor.execute("ANALYZE ideia_message_db")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def rodar_backend(backend):
+    """Executado no processo filho: extrai tudo e imprime 'leads segundos pico_mb'."""
+    sql, params = montar_consulta(CLIENT_ID, DATA_INICIO)
+    conn = conectar()
+    with tempfile.TemporaryDirectory() as pasta:
+        arquivo = os.path.join(pasta, "batch_input.jsonl")
+        inicio = time.perf_counter()
+        try:
+            with EscritorRequisicoes(arquivo, SYSTEM_PROMPT) as saida:
+                if backend == "copy":
+                    resumo = extrair_via_copy(conn, sql, params, saida, relatar=False)
+                else:
+                    resumo = extrair_para_jsonl(conn, sql, params, saida, relatar=False)
+        finally:
+            conn.close()
+        duracao = time.perf_counter() - inicio
+    print(resumo["leads"], duracao, pico_memoria_mb() or 0.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--leads", type=int, default=100000)
+    parser.add_argument("--mensagens-por-lead", type=int, default=5)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--sem-preparar", action="store_true", help="reaproveita a base sintética já criada")
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.backend:
+        rodar_backend(args.backend)
+        return
+
+    if not args.sem_preparar:
+        print(f"🧪 Criando base sintética: {args.leads} leads x {args.mensagens_por_lead} mensagens...")
+        preparar_base(args.leads, args.mensagens_por_lead)
+
+    print(f"{'backend':<8} {'leads':>9} {'melhor (s)':>11} {'linhas/s':>10} {'pico (MB)':>10}")
+    for backend in ["cursor", "copy"]:
+        medicoes = []
+        for _ in range(args.repeticoes):
+            saida = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--backend", backend],
+                check=True, capture_output=True, text=True,
+            ).stdout.split()
+            medicoes.append((int(saida[0]), float(saida[1]), float(saida[2])))
+        leads, melhor, _ = min(medicoes, key=lambda m: m[1])
+        pico = max(m[2] for m in medicoes)
+        print(f"{backend:<8} {leads:>9} {melhor:>11.2f} {leads / melhor:>10.0f} {pico:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Compara carregar um mês de resultados: os Excel diários (openpyxl) x os Parquet diários.
+
+Não precisa de banco nem de API: grava, para cada dia, o Excel do relatório
+(EscritorRelatorio) e o Parquet (comum.parquet) com as mesmas linhas sintéticas, e
+mede quanto leva para juntar todos os dias num DataFrame de cada forma.
+
+    python benchmarks/bench_parquet.py --dias 30 --leads 20000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from comum.relatorio import EscritorRelatorio
+from comum.parquet import gravar_parquet, ler_parquet
+from comum.taxonomia import Taxonomia
+
+COLUNAS = ["ID", "Mensagem Original", "Assunto", "Unidade", "Tokens"]
+FRASES = ["Olá, qual o horário de funcionamento?", "Quero fazer uma reserva para sábado",
+          "Qual o endereço da unidade Lagoa?", "Vocês fazem festa de aniversário?", "Quanto custa o rodízio?"]
+ASSUNTOS = ["Reserva", "Endereço", "Horário de Funcionamento", "Aniversário, Reserva", "Valores"]
+UNIDADES = ["Lagoa", "Downtown", "Bossa Nova", "Não Informada"]
+
+
+def gerar_dia(pasta, dia, leads, sorteio):
+    linhas = [{
+        "ID": f"id-{dia:%Y%m%d}-{i}",
+        "Mensagem Original": " || ".join(sorteio.choice(FRASES) for _ in range(sorteio.randint(1, 6))),
+        "Assunto": sorteio.choice(ASSUNTOS),
+        "Unidade": sorteio.choice(UNIDADES),
+        "Tokens": sorteio.randint(80, 400),
+    } for i in range(leads)]
+    excel = os.path.join(pasta, f"analise_mensagens_Bench_{dia:%Y%m%d}.xlsx")
+    parquet = os.path.join(pasta, f"analise_mensagens_Bench_{dia:%Y%m%d}.parquet")
+    with EscritorRelatorio(excel, COLUNAS) as relatorio:
+        for linha_dados in linhas:
+            relatorio.escrever(linha_dados)
+    # O resumo de processar_resultados guarda os códigos da taxonomia, não os nomes
+    taxonomia = Taxonomia(["Reserva", "Endereço", "Horário de Funcionamento", "Aniversário", "Valores"], UNIDADES[:-1])
+    df_resumo = pd.DataFrame(linhas).drop(columns="Mensagem Original")
+    df_resumo["Assunto"] = np.array([taxonomia.combinacao(taxonomia.codigos_assuntos(a)) for a in df_resumo["Assunto"]])
+    df_resumo["Unidade"] = np.array([-1 if u == UNIDADES[-1] else taxonomia.codigo_unidade(u)
+                                     for u in df_resumo["Unidade"]])
+    gravar_parquet(df_resumo, taxonomia, parquet, "Bench", dia)
+    return excel, parquet
+
+
+def medir(funcao, *args):
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    return time.perf_counter() - inicio, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dias", type=int, default=30)
+    parser.add_argument("--leads", type=int, default=20_000, help="leads por dia")
+    args = parser.parse_args()
+
+    sorteio = random.Random(0)
+    with tempfile.TemporaryDirectory() as pasta:
+        arquivos = [gerar_dia(pasta, date(2026, 1, 1) + timedelta(days=d), args.leads, sorteio)
+                    for d in range(args.dias)]
+        excels, parquets = zip(*arquivos)
+        t_excel, df_excel = medir(lambda: pd.concat([pd.read_excel(a) for a in excels], ignore_index=True))
+        t_parquet, df_parquet = medir(ler_parquet, parquets)
+        assert len(df_excel) == len(df_parquet) == args.dias * args.leads
+        tamanho_excel = sum(os.path.getsize(a) for a in excels) / 1024 / 1024
+        tamanho_parquet = sum(os.path.getsize(a) for a in parquets) / 1024 / 1024
+
+    print(f"{'formato':<8} {'arquivos (MB)':>14} {'carga (s)':>10}")
+    print(f"{'excel':<8} {tamanho_excel:>14.1f} {t_excel:>10.2f}")
+    print(f"{'parquet':<8} {tamanho_parquet:>14.1f} {t_parquet:>10.3f}")
+    print(f"{args.dias} dias x {args.leads} leads = {len(df_parquet)} linhas")
+
+
+if __name__ == "__main__":
+    main()
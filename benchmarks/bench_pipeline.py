@@ -0,0 +1,116 @@
+"""Roda o pipeline de ponta a ponta contra o substituto local da API (comum/openai_falso.py).
+
+Não precisa de banco nem de rede: gera leads sintéticos, grava o batch_input,
+divide em lotes, cria os jobs, acompanha, baixa e lê o resultado, e confere que
+cada requisição voltou classificada ou no arquivo de erros.
+
+    python benchmarks/bench_pipeline.py --leads 1000000 --taxa-falha 0.001
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from comum.requisicoes import EscritorRequisicoes
+from comum.batches import criar_jobs, aguardar_batches, baixar_linhas, caminho_erros
+from comum.processamento import ler_mensagens_originais, ler_resultados
+from comum.falhas import coletar_falhas
+from comum.openai_falso import OpenAIFalso, ServidorFalso
+from comum.taxonomia import Taxonomia
+
+# Mesmo formato dos SYSTEM_PROMPT dos clientes: o servidor falso tira os assuntos desta lista
+SYSTEM_PROMPT = """
+Você é uma IA que atua como classificadora de assuntos de mensagens.
+
+Os assuntos possíveis são:
+
+- Endereço
+- Reserva
+- Aniversário
+- Horário de Funcionamento
+- Reclamações
+- Valores
+- Unidades: Lagoa, Downtown, Bossa Nova
+- Assuntos Gerais (caso o assunto não seja nenhum dos outros listados)
+
+⚠️ IMPORTANTE:
+- Responda **apenas** com a linha:
+  Assuntos: [assunto1], [assunto2], ...
+"""
+
+FRASES = [
+    "Olá, qual o horário de funcionamento?",
+    "Quero fazer uma reserva para sábado",
+    "Qual o endereço da unidade Lagoa?",
+    "Vocês fazem festa de aniversário?",
+    "Quanto custa o rodízio?",
+]
+
+
+def conversas(leads):
+    for i in range(leads):
+        yield i, f"{FRASES[i % len(FRASES)]} || {FRASES[(i * 7) % len(FRASES)]} || msg {i}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--leads", type=int, default=100_000)
+    parser.add_argument("--lote", type=int, default=50_000, help="máximo de requisições por job")
+    parser.add_argument("--latencia", type=float, default=0.0, help="segundos por chamada à API falsa")
+    parser.add_argument("--duracao", type=float, default=1.0, help="segundos até cada job terminar")
+    parser.add_argument("--taxa-falha", type=float, default=0.0, help="fração das requisições que falham")
+    parser.add_argument("--taxa-erro-api", type=float, default=0.0, help="fração das chamadas com erro de conexão")
+    args = parser.parse_args()
+
+    etapas = []
+
+    def medir(nome, funcao, *params, **opcoes):
+        inicio = time.perf_counter()
+        resultado = funcao(*params, **opcoes)
+        etapas.append((nome, time.perf_counter() - inicio))
+        return resultado
+
+    with tempfile.TemporaryDirectory() as pasta:
+        servidor = ServidorFalso(os.path.join(pasta, "api"), latencia=args.latencia, duracao=args.duracao,
+                                 taxa_falha=args.taxa_falha, taxa_erro_api=args.taxa_erro_api)
+        cliente_openai = OpenAIFalso(servidor)
+        arquivo_input = os.path.join(pasta, "batch_input.jsonl")
+        arquivo_saida = os.path.join(pasta, "resultado_batch.jsonl")
+
+        def escrever():
+            saida = EscritorRequisicoes(arquivo_input, SYSTEM_PROMPT)
+            for lead_id, mensagens in conversas(args.leads):
+                saida.escrever(lead_id, mensagens)
+            saida.fechar()
+
+        def ler(batches):
+            with ler_mensagens_originais(arquivo_input) as mensagens_originais:
+                # Download e leitura ao mesmo tempo, como no verifica.py
+                return ler_resultados(baixar_linhas(batches, arquivo_saida, cliente_openai), mensagens_originais,
+                                      taxonomia=Taxonomia.do_prompt(SYSTEM_PROMPT))
+
+        medir("batch_input", escrever)
+        job_ids = medir("envio", criar_jobs, arquivo_input, max_requisicoes=args.lote, cliente_openai=cliente_openai)
+        batches = medir("espera", aguardar_batches, job_ids, intervalo=max(args.duracao / 10, 0.1),
+                        cliente_openai=cliente_openai)
+        dados, total_tokens = medir("download+leitura", ler, batches)
+        falhas = medir("falhas", coletar_falhas, arquivo_input, arquivo_saida)
+
+        erros = 0
+        if os.path.exists(caminho_erros(arquivo_saida)):
+            with open(caminho_erros(arquivo_saida), "r", encoding="utf-8") as f:
+                erros = sum(1 for _ in f)
+        # Cada lead volta classificado ou no arquivo de erros, nunca os dois nem nenhum
+        assert len(dados) + erros == args.leads, (len(dados), erros)
+        assert len(falhas) == erros, (len(falhas), erros)
+
+    print(f"{'etapa':<18} {'tempo (s)':>10} {'leads/s':>10}")
+    for nome, duracao in etapas:
+        print(f"{nome:<18} {duracao:>10.2f} {args.leads / duracao if duracao else 0:>10.0f}")
+    print(f"{len(job_ids)} job(s), {len(dados)} classificados, {erros} com erro, {total_tokens} tokens simulados")
+
+
+if __name__ == "__main__":
+    main()
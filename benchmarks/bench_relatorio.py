@@ -0,0 +1,79 @@
+"""Compara a gravação da aba "Mensagens Classificadas": DataFrame + openpyxl x EscritorRelatorio (xlsxwriter).
+
+Não precisa de banco nem de API: gera linhas sintéticas do relatório, com
+conversas de tamanho variado, e mede o tempo de cada forma, incluindo a montagem
+das linhas. Com --memoria, mede também o pico de memória (o tracemalloc deixa
+tudo bem mais lento, então os tempos dessa rodada não valem).
+
+    python benchmarks/bench_relatorio.py --leads 100000 300000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from comum.relatorio import EscritorRelatorio
+
+COLUNAS = ["ID", "Mensagem Original", "Assunto", "Tokens"]
+FRASES = ["Olá, qual o horário de funcionamento?", "Quero fazer uma reserva para sábado",
+          "Qual o endereço da unidade Lagoa?", "Vocês fazem festa de aniversário?", "Quanto custa o rodízio?"]
+ASSUNTOS = ["Reserva", "Endereço", "Horário de Funcionamento", "Aniversário, Reserva", "Valores"]
+
+
+def linhas(leads, semente=0):
+    sorteio = random.Random(semente)
+    for i in range(leads):
+        yield {
+            "ID": f"id-{i}",
+            "Mensagem Original": " || ".join(sorteio.choice(FRASES) for _ in range(sorteio.randint(1, 12))),
+            "Assunto": sorteio.choice(ASSUNTOS),
+            "Tokens": sorteio.randint(80, 400),
+        }
+
+
+def com_dataframe(leads, arquivo):
+    """Forma anterior: lista de dicts -> DataFrame -> pd.ExcelWriter(openpyxl)."""
+    df_detalhado = pd.DataFrame(list(linhas(leads)))
+    with pd.ExcelWriter(arquivo, engine="openpyxl") as writer:
+        df_detalhado.to_excel(writer, sheet_name="Mensagens Classificadas", index=False)
+
+
+def com_escritor(leads, arquivo):
+    with EscritorRelatorio(arquivo, COLUNAS) as relatorio:
+        for linha_dados in linhas(leads):
+            relatorio.escrever(linha_dados)
+
+
+def medir(funcao, *args, memoria=False):
+    if memoria:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    funcao(*args)
+    duracao = time.perf_counter() - inicio
+    pico = tracemalloc.get_traced_memory()[1] / 1024 / 1024 if memoria else float("nan")
+    tracemalloc.stop()
+    return duracao, pico
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--leads", type=int, nargs="+", default=[100_000])
+    parser.add_argument("--memoria", action="store_true", help="mede o pico de memória com tracemalloc")
+    args = parser.parse_args()
+
+    print(f"{'leads':>9} {'openpyxl (s)':>13} {'pico (MB)':>10} {'xlsxwriter (s)':>15} {'pico (MB)':>10}")
+    with tempfile.TemporaryDirectory() as pasta:
+        for leads in args.leads:
+            t_antes, m_antes = medir(com_dataframe, leads, os.path.join(pasta, "dataframe.xlsx"), memoria=args.memoria)
+            t_depois, m_depois = medir(com_escritor, leads, os.path.join(pasta, "escritor.xlsx"), memoria=args.memoria)
+            print(f"{leads:>9} {t_antes:>13.2f} {m_antes:>10.1f} {t_depois:>15.2f} {m_depois:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
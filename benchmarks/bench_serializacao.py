@@ -0,0 +1,86 @@
+"""Compara a serialização das linhas do batch_input: json.dumps por lead x gabarito pré-serializado.
+
+Não precisa de banco nem de API: gera conversas sintéticas em memória e grava
+num arquivo temporário, como o EscritorRequisicoes faz.
+
+    python benchmarks/bench_serializacao.py --leads 1000000
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from comum.requisicoes import linha_requisicao, SerializadorRequisicoes, BUFFER_ESCRITA
+
+# Do tamanho dos SYSTEM_PROMPT dos clientes, que é o que pesa em cada linha
+SYSTEM_PROMPT = """
+Você é uma IA que atua como classificadora de assuntos de mensagens enviadas por clientes.
+
+# Lista de assuntos
+- Endereço
+- Reserva
+- Aniversário
+- Horário de Funcionamento
+- Reclamações
+- Valores
+- Assuntos Gerais (caso o assunto não seja nenhum dos outros listados)
+
+# Formato da resposta
+- Responda **apenas** com a linha: "Assunto: <assuntos>"
+- Liste todos os assuntos que aparecem na conversa, separados por vírgula.
+- Não repita assuntos iguais e não explique nada além disso.
+"""
+
+FRASES = [
+    "Olá, qual o horário de funcionamento?",
+    "Quero fazer uma reserva para sábado",
+    "Qual o endereço da unidade Lagoa?",
+    "Vocês fazem festa de aniversário?",
+    "Quanto custa o rodízio?",
+]
+
+
+def conversas(leads):
+    for i in range(leads):
+        yield i, f"{FRASES[i % len(FRASES)]} || {FRASES[(i * 7) % len(FRASES)]} || msg {i}"
+
+
+def medir(nome, gerar_linha, leads, pasta, buffering=-1):
+    arquivo = os.path.join(pasta, f"{nome}.jsonl")
+    inicio = time.perf_counter()
+    with open(arquivo, "w", encoding="utf-8", buffering=buffering) as f:
+        for lead_id, mensagens in conversas(leads):
+            f.write(gerar_linha(lead_id, mensagens))
+    duracao = time.perf_counter() - inicio
+    tamanho = os.path.getsize(arquivo) / (1024 * 1024)
+    os.remove(arquivo)
+    return duracao, tamanho
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--leads", type=int, default=1_000_000)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    serializador = SerializadorRequisicoes(SYSTEM_PROMPT)
+    # As duas formas precisam gerar exatamente o mesmo arquivo
+    for lead_id, mensagens in conversas(1000):
+        assert serializador.linha(lead_id, mensagens) == linha_requisicao(lead_id, mensagens, SYSTEM_PROMPT)
+
+    variantes = [
+        ("json.dumps", lambda lead_id, mensagens: linha_requisicao(lead_id, mensagens, SYSTEM_PROMPT), -1),
+        ("gabarito", serializador.linha, BUFFER_ESCRITA),
+    ]
+    print(f"{'serializador':<12} {'leads':>9} {'melhor (s)':>11} {'linhas/s':>10} {'arquivo (MB)':>13}")
+    with tempfile.TemporaryDirectory() as pasta:
+        for nome, gerar_linha, buffering in variantes:
+            medicoes = [medir(nome, gerar_linha, args.leads, pasta, buffering) for _ in range(args.repeticoes)]
+            melhor = min(d for d, _ in medicoes)
+            print(f"{nome:<12} {args.leads:>9} {melhor:>11.2f} {args.leads / melhor:>10.0f} {medicoes[0][1]:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Compara a aba "Estatísticas por unidade": uma busca por unidade x uma regex só por conversa.
+
+Não precisa de banco nem de API: gera conversas sintéticas citando unidades (às
+vezes mais de uma) e confere que, nas grafias exatas, as duas versões dão a mesma aba.
+
+    python benchmarks/bench_unidades.py --leads 200000 1000000 --unidades 4 12
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from collections import Counter
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from comum.unidades import montar_localizador, estatisticas_por_unidade
+
+ASSUNTOS = ["Endereço", "Reserva", "Aniversário", "Horário de Funcionamento", "Valores", ""]
+UNIDADES = ["Lagoa", "Downtown", "Bossa Nova", "Abelardo Bueno", "Barra", "Leblon", "Tijuca", "Botafogo",
+            "Niterói", "Méier", "Recreio", "Ipanema"]
+
+
+def gerar_dados(leads, unidades, semente=0):
+    sorteio = random.Random(semente)
+    # Metade das frases não cita unidade nenhuma
+    citadas = unidades + ["mesa"] * len(unidades)
+    return pd.DataFrame({
+        "ID": [f"id-{i}" for i in range(leads)],
+        "Mensagem Original": [" || ".join(f"quero uma {sorteio.choice(citadas)} amanhã às 20h, vocês têm vaga?"
+                                          for _ in range(sorteio.randint(1, 3))) for _ in range(leads)],
+        "Assunto": [", ".join(sorteio.sample(ASSUNTOS, 2)) for _ in range(leads)],
+    })
+
+
+def estatisticas_por_busca(dados, unidades):
+    """Implementação anterior: para cada unidade, percorre todas as conversas com `in`."""
+    estat_unidades = []
+    for unidade in unidades:
+        dados_unidade = [d for d in dados if unidade.lower() in d["Mensagem Original"].lower()]
+        temas_unidade = [a.strip() for d in dados_unidade for a in d["Assunto"].split(",") if a.strip()]
+        contagem = Counter(temas_unidade)
+        estat_unidades.append({
+            "Unidade": unidade,
+            "Total de Assuntos": len(temas_unidade),
+            "Assunto Mais Buscado": contagem.most_common(1)[0][0] if contagem else "N/A",
+            "Detalhes": dict(contagem),
+        })
+    return pd.DataFrame(estat_unidades)
+
+
+def medir(funcao, *args):
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    return time.perf_counter() - inicio, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--leads", type=int, nargs="+", default=[200_000])
+    parser.add_argument("--unidades", type=int, nargs="+", default=[4, 12])
+    args = parser.parse_args()
+
+    print(f"{'leads':>9} {'unidades':>9} {'busca (s)':>10} {'regex (s)':>10}")
+    for leads in args.leads:
+        for quantidade in args.unidades:
+            unidades = UNIDADES[:quantidade]
+            df = gerar_dados(leads, unidades)
+            # A busca recebia a lista de dicts; a conversão não entra na medição de nenhum dos dois
+            dados = df.to_dict("records")
+            t_busca, esperado = medir(estatisticas_por_busca, dados, unidades)
+            del dados
+            t_regex, obtido = medir(estatisticas_por_unidade, df, montar_localizador({u: [] for u in unidades}))
+            pd.testing.assert_frame_equal(obtido.astype(str), esperado.astype(str))
+            print(f"{leads:>9} {quantidade:>9} {t_busca:>10.2f} {t_regex:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
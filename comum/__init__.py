@@ -0,0 +1 @@
+# Código compartilhado entre as pastas de cliente (Vamo, Iate, Fantástico).
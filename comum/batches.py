@@ -0,0 +1,427 @@
+import os
+import time
+import random
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+from openai import OpenAIError, APIError, APIConnectionError, APITimeoutError
+
+from comum.requisicoes import URL_CHAT, abrir_resultado
+from comum.jobs import hash_arquivo
+
+# Limites do Batch API por arquivo de entrada: 50.000 requisições e 200 MB.
+# O padrão de tamanho fica um pouco abaixo para sobrar folga.
+MAX_REQUISICOES_LOTE_PADRAO = 50_000
+MAX_MB_LOTE_PADRAO = 190
+
+STATUS_FINAIS = ("completed", "failed", "expired", "cancelled")
+
+# Os arquivos de saída são baixados em blocos de 1 MB direto para o disco
+TAMANHO_BLOCO = 1024 * 1024
+
+# Acompanhamento: começa consultando a cada INTERVALO_INICIAL segundos e vai
+# espaçando (até INTERVALO_MAXIMO) enquanto o job não anda. O prazo cobre a
+# janela de 24h do Batch API com folga.
+INTERVALO_INICIAL = 10
+INTERVALO_MAXIMO = 600
+PRAZO_HORAS = 25
+
+
+# -----------------------------
+# DIVISÃO DO INPUT EM LOTES
+# -----------------------------
+def caminho_lote(arquivo, k):
+    """batch_input_20250101.jsonl -> batch_input_20250101.lote03.jsonl"""
+    base, ext = os.path.splitext(arquivo)
+    return f"{base}.lote{k:02d}{ext}"
+
+
+def dividir_input(arquivo, max_requisicoes=MAX_REQUISICOES_LOTE_PADRAO, max_mb=MAX_MB_LOTE_PADRAO):
+    """Quebra o batch_input em arquivos com até `max_requisicoes` linhas e `max_mb` MB cada.
+
+    Se o arquivo inteiro já cabe num lote, ele mesmo é devolvido, sem cópia.
+    """
+    max_bytes = int(max_mb * 1024 * 1024)
+    if os.path.getsize(arquivo) <= max_bytes:
+        with open(arquivo, "rb") as f:
+            if sum(1 for _ in f) <= max_requisicoes:
+                return [arquivo]
+
+    lotes = []
+    saida = None
+    linhas = tamanho = 0
+    with open(arquivo, "rb") as f:
+        for linha in f:
+            if saida is None or linhas >= max_requisicoes or tamanho + len(linha) > max_bytes:
+                if saida is not None:
+                    saida.close()
+                lotes.append(caminho_lote(arquivo, len(lotes)))
+                saida = open(lotes[-1], "wb")
+                linhas = tamanho = 0
+            saida.write(linha)
+            linhas += 1
+            tamanho += len(linha)
+    if saida is not None:
+        saida.close()
+    return lotes
+
+
+# -----------------------------
+# ENVIO
+# -----------------------------
+def _envio_anterior(registro, lote):
+    """(hash do lote, registro de um envio aproveitável do mesmo conteúdo ou None)."""
+    if registro is None:
+        return None, None
+    hash_lote = hash_arquivo(lote)
+    return hash_lote, registro.reaproveitavel(hash_lote)
+
+
+def enviar_lote(arquivo, registro=None, arquivo_input=None, cliente_openai=None, rodada=0):
+    """Sobe um arquivo de requisições e cria o job dele. Retorna o id do batch.
+
+    Com `registro` (RegistroJobs), um lote de mesmo conteúdo já enviado e ainda não
+    processado é reaproveitado: devolve o batch existente ou cria o job a partir do
+    arquivo já subido, sem novo upload. O lote fica registrado sob `arquivo_input`
+    e, se for de uma retentativa, com a `rodada` dela. `cliente_openai` troca o
+    módulo openai (ex.: pelo comum.openai_falso.OpenAIFalso), como nas demais funções daqui.
+    """
+    cliente_openai = cliente_openai or openai
+    hash_lote, anterior = _envio_anterior(registro, arquivo)
+    if anterior is not None and anterior["batch_id"]:
+        print(f"🔁 {os.path.basename(arquivo)}: retomando job {anterior['batch_id']}")
+        return anterior["batch_id"]
+
+    if anterior is not None:
+        file_id, id_registro = anterior["file_id"], anterior["id"]
+    else:
+        with open(arquivo, "rb") as f:
+            file_id = cliente_openai.files.create(file=f, purpose="batch").id
+        id_registro = (registro.registrar_upload(arquivo_input or arquivo, hash_lote, file_id, rodada)
+                       if registro else None)
+    batch = cliente_openai.batches.create(
+        input_file_id=file_id,
+        endpoint=URL_CHAT,
+        completion_window="24h",
+    )
+    if registro is not None:
+        registro.registrar_batch(id_registro, batch)
+    print(f"✅ {os.path.basename(arquivo)}: arquivo {file_id} -> job {batch.id}")
+    return batch.id
+
+
+def criar_jobs(arquivo, max_requisicoes=MAX_REQUISICOES_LOTE_PADRAO, max_mb=MAX_MB_LOTE_PADRAO, max_simultaneos=4,
+               registro=None, cliente_openai=None, arquivo_input=None, rodada=0):
+    """Divide o batch_input em lotes e cria um job por lote, enviando vários ao mesmo tempo.
+
+    Nas retentativas, `arquivo` é só o pedaço reenviado: os lotes vão para o registro
+    sob o `arquivo_input` original, marcados com a `rodada`.
+    """
+    lotes = dividir_input(arquivo, max_requisicoes=max_requisicoes, max_mb=max_mb)
+    print(f"📤 Enviando {len(lotes)} lote(s)...")
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_simultaneos, len(lotes)))) as executor:
+            job_ids = list(executor.map(lambda lote: enviar_lote(lote, registro, arquivo_input or arquivo,
+                                                                   cliente_openai, rodada), lotes))
+    finally:
+        # O input completo continua em `arquivo`; os lotes só existem para o upload
+        for lote in lotes:
+            if lote != arquivo and os.path.exists(lote):
+                os.remove(lote)
+    print(f"🚀 {len(job_ids)} job(s) criados: {', '.join(job_ids)}")
+    return job_ids
+
+
+# -----------------------------
+# ACOMPANHAMENTO E DOWNLOAD
+# -----------------------------
+def _progresso(batch):
+    """O que muda quando o job anda: status e requisições concluídas."""
+    contagem = getattr(batch, "request_counts", None)
+    return batch.status, getattr(contagem, "completed", None)
+
+
+def proximo_intervalo(intervalo, andou, maximo=INTERVALO_MAXIMO):
+    """Próxima base de espera: mantém se o job andou, senão dobra (até `maximo`)."""
+    return intervalo if andou else min(maximo, intervalo * 2)
+
+
+def com_jitter(intervalo):
+    """Espera efetiva entre metade e o total da base, para as consultas não sincronizarem."""
+    return random.uniform(intervalo / 2, intervalo)
+
+
+def _registrar_estado(job_id, batch, batches, pendentes):
+    batches[job_id] = batch
+    if batch.status in STATUS_FINAIS:
+        pendentes.remove(job_id)
+        if batch.status != "completed":
+            print(f"❌ {job_id}: batch terminou com status {batch.status}")
+
+
+def aguardar_batches(job_ids, intervalo=INTERVALO_INICIAL, prazo_horas=PRAZO_HORAS, registro=None,
+                     cliente_openai=None):
+    """Consulta todos os jobs até terminarem ou o prazo acabar.
+
+    O intervalo entre as rodadas cresce exponencialmente (com jitter) enquanto
+    nenhum job anda. Retorna job_id -> batch (o último estado lido; None se nunca
+    foi lido). Erros de rede ou da API só adiam a próxima consulta daquele job.
+    Com `registro`, cada estado lido é gravado nele.
+    """
+    cliente_openai = cliente_openai or openai
+    batches = dict.fromkeys(job_ids)
+    pendentes = list(job_ids)
+    limite = time.monotonic() + prazo_horas * 3600
+
+    while pendentes:
+        antes = {j: _progresso(b) for j, b in batches.items() if b is not None}
+        for job_id in list(pendentes):
+            try:
+                batch = cliente_openai.batches.retrieve(job_id)
+            except (APITimeoutError, APIConnectionError) as e:
+                print(f"⚠️ {job_id}: timeout ou erro de conexão. Tentando novamente... ({e})")
+                continue
+            except APIError as e:
+                print(f"⚠️ {job_id}: erro na API: {e}. Tentando novamente...")
+                continue
+            except OpenAIError as e:
+                print(f"⚠️ {job_id}: erro da OpenAI: {e}. Tentando novamente...")
+                continue
+            if registro is not None:
+                registro.atualizar(batch)
+            _registrar_estado(job_id, batch, batches, pendentes)
+
+        if len(job_ids) > 1:
+            concluidos = sum(1 for b in batches.values() if b is not None and b.status == "completed")
+            print(f"Status dos batches: {concluidos}/{len(job_ids)} concluídos, {len(pendentes)} em andamento")
+        elif batches[job_ids[0]] is not None:
+            print(f"Status do batch: {batches[job_ids[0]].status}")
+
+        if not pendentes or time.monotonic() >= limite:
+            break
+        andou = any(antes.get(j) != _progresso(b) for j, b in batches.items() if b is not None)
+        intervalo = proximo_intervalo(intervalo, andou)
+        time.sleep(com_jitter(intervalo))
+
+    if pendentes:
+        print(f"⌛ {len(pendentes)} job(s) ainda não terminaram: {', '.join(pendentes)}")
+    return batches
+
+
+def caminho_erros(arquivo_saida):
+    """resultado_batch_20250101.jsonl[.gz] -> resultado_batch_20250101.erros.jsonl (sempre sem compressão)"""
+    base, ext = os.path.splitext(arquivo_saida)
+    if ext == ".gz":
+        base, ext = os.path.splitext(base)
+    return f"{base}.erros{ext}"
+
+
+def _arquivos(batches, campo):
+    """Ids de arquivo (`output_file_id` ou `error_file_id`) dos jobs terminados.
+
+    Jobs expirados ou cancelados também têm as respostas que chegaram a sair.
+    """
+    return [getattr(b, campo) for b in batches.values()
+            if b is not None and b.status in STATUS_FINAIS and getattr(b, campo, None)]
+
+
+def tem_saida(batches):
+    """True se algum job terminado gerou arquivo de saída (ou seja, há o que baixar)."""
+    return bool(_arquivos(batches, "output_file_id"))
+
+
+def concluidos(batches):
+    """True se todos os jobs terminaram com status "completed"."""
+    return all(b is not None and b.status == "completed" for b in batches.values())
+
+
+def _blocos(cliente_openai, file_id):
+    """Conteúdo de um arquivo da API em blocos, sem montar a resposta inteira na memória."""
+    with cliente_openai.files.with_streaming_response.content(file_id) as resposta:
+        yield from resposta.iter_bytes(TAMANHO_BLOCO)
+
+
+def _separar_linhas(resto, bloco):
+    """(linhas completas e não vazias de `resto + bloco`, pedaço da última linha ainda sem quebra)."""
+    linhas = (resto + bloco).split(b"\n")
+    resto = linhas.pop()
+    return [linha.decode("utf-8") for linha in linhas if linha.strip()], resto
+
+
+def _gravar_blocos(partes, destino):
+    """Grava os blocos de cada parte em `destino` e devolve cada linha completa assim que ela chega.
+
+    Cada parte termina com quebra de linha, para as saídas de vários lotes não se emendarem.
+    """
+    with abrir_resultado(destino, "wb") as saida:
+        for blocos in partes:
+            resto = b""
+            for bloco in blocos:
+                saida.write(bloco)
+                linhas, resto = _separar_linhas(resto, bloco)
+                yield from linhas
+            if resto:
+                saida.write(b"\n")
+                if resto.strip():
+                    yield resto.decode("utf-8")
+
+
+def _limpar_erros(cliente_openai, erros, arquivo_saida):
+    if erros:
+        for _ in _gravar_blocos((_blocos(cliente_openai, file_id) for file_id in erros), caminho_erros(arquivo_saida)):
+            pass
+    elif os.path.exists(caminho_erros(arquivo_saida)):
+        os.remove(caminho_erros(arquivo_saida))
+
+
+def baixar_linhas(batches, arquivo_saida, cliente_openai=None):
+    """Baixa as saídas dos jobs para `arquivo_saida` devolvendo as linhas conforme chegam do servidor.
+
+    Quem consome (ex.: ler_resultados) processa o resultado durante o download; ao
+    esgotar o gerador o arquivo está completo no disco, com os erros por linha em
+    caminho_erros(arquivo_saida). Um `arquivo_saida` terminado em .gz é gravado comprimido.
+    """
+    cliente_openai = cliente_openai or openai
+    _limpar_erros(cliente_openai, _arquivos(batches, "error_file_id"), arquivo_saida)
+    partes = _arquivos(batches, "output_file_id")
+    if not partes:
+        return
+    print(f"🔽 Baixando resultado de {len(partes)} batch(es)...")
+    yield from _gravar_blocos((_blocos(cliente_openai, file_id) for file_id in partes), arquivo_saida)
+    print(f"✅ Resultado salvo em {arquivo_saida}")
+
+
+def baixar_resultados(batches, arquivo_saida, cliente_openai=None):
+    """Junta as saídas dos jobs em `arquivo_saida` e os erros por linha em caminho_erros(arquivo_saida).
+
+    Retorna (arquivo_saida ou None se nenhum job gerou saída, True se todos concluíram).
+    """
+    for _ in baixar_linhas(batches, arquivo_saida, cliente_openai):
+        pass
+    if not tem_saida(batches):
+        return None, concluidos(batches)
+    return arquivo_saida, concluidos(batches)
+
+
+# -----------------------------
+# VERSÃO ASSÍNCRONA (VÁRIOS CLIENTES NO MESMO EVENT LOOP)
+# -----------------------------
+async def enviar_lote_async(cliente_openai, arquivo, registro=None, arquivo_input=None, rodada=0):
+    """enviar_lote com um openai.AsyncOpenAI."""
+    hash_lote, anterior = await asyncio.to_thread(_envio_anterior, registro, arquivo)
+    if anterior is not None and anterior["batch_id"]:
+        print(f"🔁 {os.path.basename(arquivo)}: retomando job {anterior['batch_id']}")
+        return anterior["batch_id"]
+
+    if anterior is not None:
+        file_id, id_registro = anterior["file_id"], anterior["id"]
+    else:
+        with open(arquivo, "rb") as f:
+            file_id = (await cliente_openai.files.create(file=f, purpose="batch")).id
+        id_registro = (registro.registrar_upload(arquivo_input or arquivo, hash_lote, file_id, rodada)
+                       if registro else None)
+    batch = await cliente_openai.batches.create(
+        input_file_id=file_id,
+        endpoint=URL_CHAT,
+        completion_window="24h",
+    )
+    if registro is not None:
+        registro.registrar_batch(id_registro, batch)
+    print(f"✅ {os.path.basename(arquivo)}: arquivo {file_id} -> job {batch.id}")
+    return batch.id
+
+
+async def criar_jobs_async(cliente_openai, arquivo, max_requisicoes=MAX_REQUISICOES_LOTE_PADRAO,
+                           max_mb=MAX_MB_LOTE_PADRAO, registro=None, arquivo_input=None, rodada=0):
+    """criar_jobs com os uploads concorrentes no event loop."""
+    lotes = await asyncio.to_thread(dividir_input, arquivo, max_requisicoes, max_mb)
+    try:
+        job_ids = await asyncio.gather(*(enviar_lote_async(cliente_openai, lote, registro, arquivo_input or arquivo,
+                                                           rodada)
+                                         for lote in lotes))
+    finally:
+        for lote in lotes:
+            if lote != arquivo and os.path.exists(lote):
+                os.remove(lote)
+    return list(job_ids)
+
+
+async def aguardar_batch_async(cliente_openai, job_id, intervalo=INTERVALO_INICIAL, prazo_horas=PRAZO_HORAS,
+                               rotulo="", registro=None):
+    """Acompanha um job sem bloquear o loop, com backoff exponencial e jitter.
+
+    Retorna o último estado lido (None se nunca foi lido); com `registro`, grava cada estado nele.
+    """
+    batch = None
+    anterior = None
+    limite = time.monotonic() + prazo_horas * 3600
+    while True:
+        try:
+            batch = await cliente_openai.batches.retrieve(job_id)
+        except OpenAIError as e:
+            print(f"⚠️ {rotulo}{job_id}: {e}. Tentando novamente...")
+        else:
+            if registro is not None:
+                registro.atualizar(batch)
+            if anterior is None or batch.status != anterior[0]:
+                print(f"{rotulo}{job_id}: {batch.status}")
+            if batch.status in STATUS_FINAIS:
+                if batch.status != "completed":
+                    print(f"❌ {rotulo}{job_id}: batch terminou com status {batch.status}")
+                return batch
+        if time.monotonic() >= limite:
+            print(f"⌛ {rotulo}{job_id}: prazo de {prazo_horas}h esgotado")
+            return batch
+        andou = batch is not None and _progresso(batch) != anterior
+        anterior = _progresso(batch) if batch is not None else anterior
+        intervalo = proximo_intervalo(intervalo, andou)
+        await asyncio.sleep(com_jitter(intervalo))
+
+
+async def _gravar_blocos_async(cliente_openai, file_ids, destino):
+    """_gravar_blocos no event loop: grava cada bloco e devolve a lista das linhas que ele completou."""
+    with abrir_resultado(destino, "wb") as saida:
+        for file_id in file_ids:
+            resto = b""
+            async with cliente_openai.files.with_streaming_response.content(file_id) as resposta:
+                async for bloco in resposta.iter_bytes(TAMANHO_BLOCO):
+                    if bloco:
+                        saida.write(bloco)
+                        linhas, resto = _separar_linhas(resto, bloco)
+                        if linhas:
+                            yield linhas
+            if resto:
+                saida.write(b"\n")
+                if resto.strip():
+                    yield [resto.decode("utf-8")]
+
+
+async def baixar_linhas_async(cliente_openai, batches, arquivo_saida):
+    """baixar_linhas com um openai.AsyncOpenAI: gerador assíncrono de listas de linhas, uma por bloco baixado."""
+    erros = _arquivos(batches, "error_file_id")
+    if erros:
+        async for _ in _gravar_blocos_async(cliente_openai, erros, caminho_erros(arquivo_saida)):
+            pass
+    elif os.path.exists(caminho_erros(arquivo_saida)):
+        os.remove(caminho_erros(arquivo_saida))
+    partes = _arquivos(batches, "output_file_id")
+    if not partes:
+        return
+    async for linhas in _gravar_blocos_async(cliente_openai, partes, arquivo_saida):
+        yield linhas
+    print(f"✅ Resultado salvo em {arquivo_saida}")
+
+
+async def baixar_resultados_async(cliente_openai, batches, arquivo_saida):
+    """baixar_resultados com um openai.AsyncOpenAI; mesmo retorno."""
+    async for _ in baixar_linhas_async(cliente_openai, batches, arquivo_saida):
+        pass
+    if not tem_saida(batches):
+        return None, concluidos(batches)
+    return arquivo_saida, concluidos(batches)
+
+
+def finalizados(batches):
+    """Ids dos jobs que chegaram a um status final (os que não vão mais mudar)."""
+    return [job_id for job_id, b in batches.items() if b is not None and b.status in STATUS_FINAIS]
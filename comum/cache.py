@@ -0,0 +1,105 @@
+import os
+import time
+import sqlite3
+import threading
+
+# Cache das classificações já pagas, por cliente (fica na pasta data/ dele).
+# A chave é o mesmo hash usado na deduplicação (modelo + SYSTEM_PROMPT + conversa
+# normalizada), então mudar o prompt ou o modelo invalida o cache naturalmente.
+ARQUIVO_CACHE = "cache_classificacoes.sqlite"
+
+TTL_DIAS_PADRAO = 30
+MAX_ENTRADAS_PADRAO = 500_000
+
+
+class CacheClassificacoes:
+    """Mapa chave da conversa -> (assunto, unidade, tokens) persistido em SQLite.
+
+    Entradas mais velhas que `ttl_dias` expiram; acima de `max_entradas`, saem as
+    usadas há mais tempo (LRU). Pode ser usado por várias threads (extração paralela).
+    """
+
+    def __init__(self, data_dir, ttl_dias=TTL_DIAS_PADRAO, max_entradas=MAX_ENTRADAS_PADRAO):
+        os.makedirs(data_dir, exist_ok=True)
+        self.ttl = ttl_dias * 86400
+        self.max_entradas = max_entradas
+        self.lock = threading.Lock()
+        self.usados = []
+        self.acertos = 0
+        self.consultas = 0
+        self.conn = sqlite3.connect(os.path.join(data_dir, ARQUIVO_CACHE), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS classificacoes (
+                chave BLOB PRIMARY KEY,
+                assunto TEXT NOT NULL,
+                unidade TEXT NOT NULL,
+                tokens INTEGER NOT NULL,
+                criado_em REAL NOT NULL,
+                usado_em REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_classificacoes_usado_em ON classificacoes (usado_em)")
+
+    def buscar(self, chave):
+        """Retorna (assunto, unidade, tokens) ou None se não houver entrada válida."""
+        with self.lock:
+            self.consultas += 1
+            linha = self.conn.execute(
+                "SELECT assunto, unidade, tokens FROM classificacoes WHERE chave = ? AND criado_em >= ?",
+                (chave, time.time() - self.ttl),
+            ).fetchone()
+            if linha is not None:
+                self.acertos += 1
+                self.usados.append(chave)
+            return linha
+
+    def gravar(self, itens):
+        """Grava uma sequência de (chave, assunto, unidade, tokens)."""
+        agora = time.time()
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO classificacoes VALUES (?, ?, ?, ?, ?, ?)",
+                [(chave, assunto, unidade, tokens, agora, agora) for chave, assunto, unidade, tokens in itens],
+            )
+            self.conn.commit()
+
+    def limpar(self):
+        """Remove as entradas expiradas e, se preciso, as menos usadas recentemente."""
+        with self.lock:
+            expiradas = self.conn.execute(
+                "DELETE FROM classificacoes WHERE criado_em < ?", (time.time() - self.ttl,)
+            ).rowcount
+            excesso = self.conn.execute("SELECT COUNT(*) FROM classificacoes").fetchone()[0] - self.max_entradas
+            if excesso > 0:
+                self.conn.execute("""
+                    DELETE FROM classificacoes WHERE chave IN (
+                        SELECT chave FROM classificacoes ORDER BY usado_em LIMIT ?
+                    )
+                """, (excesso,))
+            self.conn.commit()
+        if expiradas or excesso > 0:
+            print(f"🧹 Cache: {expiradas} entradas expiradas e {max(excesso, 0)} removidas por tamanho.")
+
+    def fechar(self):
+        with self.lock:
+            if self.usados:
+                # Atualiza o LRU de uma vez, em vez de uma escrita por acerto
+                agora = time.time()
+                self.conn.executemany("UPDATE classificacoes SET usado_em = ? WHERE chave = ?",
+                                      [(agora, chave) for chave in self.usados])
+                self.usados = []
+            self.conn.commit()
+            self.conn.close()
+        if self.consultas:
+            print(f"🗃️ Cache: {self.acertos} de {self.consultas} conversas já classificadas "
+                  f"({self.acertos / self.consultas * 100:.1f}%)")
+
+
+def abrir_cache(data_dir):
+    """Abre o cache do cliente com TTL e tamanho vindos de CACHE_TTL_DIAS / CACHE_MAX_ENTRADAS."""
+    return CacheClassificacoes(
+        data_dir,
+        ttl_dias=float(os.getenv("CACHE_TTL_DIAS", TTL_DIAS_PADRAO)),
+        max_entradas=int(os.getenv("CACHE_MAX_ENTRADAS", MAX_ENTRADAS_PADRAO)),
+    )
@@ -0,0 +1,88 @@
+import json
+import os
+from datetime import datetime
+
+# O checkpoint fica na pasta data/ do cliente, então já é separado por cliente.
+# A extração grava um checkpoint "pendente"; ele só vira o oficial depois que o
+# batch foi processado com sucesso, para que uma execução que falhou no meio
+# não faça leads serem pulados na próxima. O pendente guarda a execução (o input
+# que a extração gravou) e só é promovido por quem processou esse mesmo input.
+ARQUIVO_CHECKPOINT = "checkpoint.json"
+ARQUIVO_PENDENTE = "checkpoint_pendente.json"
+
+
+def _ler(caminho):
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _gravar(caminho, dados):
+    # Grava num temporário e renomeia, para nunca deixar um checkpoint pela metade
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(dados, f, ensure_ascii=False, indent=2)
+    os.replace(temporario, caminho)
+
+
+def carregar_checkpoint(data_dir, client_id):
+    """Retorna o último checkpoint confirmado do cliente, ou {} se nunca rodou."""
+    checkpoint = _ler(os.path.join(data_dir, ARQUIVO_CHECKPOINT))
+    if checkpoint.get("client_id") != client_id:
+        return {}
+    return checkpoint
+
+
+def ultima_mensagem_processada(data_dir, client_id):
+    """Maior "createdAt" já classificado para o cliente (texto ISO), ou None."""
+    return carregar_checkpoint(data_dir, client_id).get("ultima_mensagem")
+
+
+def execucao(arquivo_input):
+    """Identifica a extração pelo input que ela gravou: nome, tamanho e data de modificação."""
+    if not os.path.exists(arquivo_input):
+        return None
+    info = os.stat(arquivo_input)
+    return f"{os.path.basename(arquivo_input)}:{info.st_size}:{info.st_mtime_ns}"
+
+
+def descartar_pendente(data_dir):
+    """Apaga o checkpoint pendente de uma extração anterior. Chamar antes de extrair de novo."""
+    pendente = os.path.join(data_dir, ARQUIVO_PENDENTE)
+    if os.path.exists(pendente):
+        os.remove(pendente)
+
+
+def registrar_pendente(data_dir, client_id, ultima_mensagem, leads, arquivo_input):
+    """Guarda o checkpoint desta extração (que gravou `arquivo_input`) até o batch ser processado."""
+    anterior = carregar_checkpoint(data_dir, client_id)
+    if ultima_mensagem is None:
+        # Nenhum lead novo: mantém a marca anterior
+        ultima_mensagem = anterior.get("ultima_mensagem")
+    _gravar(os.path.join(data_dir, ARQUIVO_PENDENTE), {
+        "client_id": client_id,
+        "execucao": execucao(arquivo_input),
+        "ultima_mensagem": ultima_mensagem,
+        "leads_na_execucao": leads,
+        "leads_classificados": anterior.get("leads_classificados", 0) + leads,
+        "gerado_em": datetime.now().isoformat(timespec="seconds"),
+    })
+
+
+def confirmar_checkpoint(data_dir, arquivo_input):
+    """Promove a oficial o checkpoint pendente da extração que gravou `arquivo_input`.
+
+    Chamar só após o processamento desse input dar certo. Um pendente de outra
+    extração (ex.: de uma execução que falhou, ou de um input regravado por uma
+    amostra com LIMITE) fica onde está e o checkpoint não avança.
+    """
+    pendente = os.path.join(data_dir, ARQUIVO_PENDENTE)
+    dados = _ler(pendente)
+    if not dados:
+        return
+    if dados.get("execucao") is None or dados.get("execucao") != execucao(arquivo_input):
+        print(f"⚠️ Checkpoint pendente não é de {os.path.basename(arquivo_input)}; checkpoint mantido.")
+        return
+    os.replace(pendente, os.path.join(data_dir, ARQUIVO_CHECKPOINT))
+    print("🔖 Checkpoint atualizado.")
@@ -0,0 +1,74 @@
+import importlib.util
+import os
+
+# Raiz do projeto: cada subpasta com um config.py é um cliente (Vamo, Iate, Fantástico...)
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# -----------------------------
+# REGISTRO DE CLIENTES
+# -----------------------------
+def _carregar_config(pasta):
+    caminho = os.path.join(pasta, "config.py")
+    # Nome único por pasta, já que todos os arquivos se chamam config.py
+    nome_modulo = "config_" + os.path.basename(pasta)
+    spec = importlib.util.spec_from_file_location(nome_modulo, caminho)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+def carregar_clientes(nomes=None):
+    """Lê o config.py de cada pasta de cliente e devolve a lista de clientes configurados.
+
+    `nomes` restringe a lista (compara com o NOME do config ou com o nome da pasta).
+    """
+    clientes = []
+    for pasta in sorted(os.listdir(RAIZ)):
+        base_dir = os.path.join(RAIZ, pasta)
+        if not os.path.isfile(os.path.join(base_dir, "config.py")):
+            continue
+        config = _carregar_config(base_dir)
+        if nomes and config.NOME not in nomes and pasta not in nomes:
+            continue
+        if not config.CLIENT_ID:
+            print(f"⚠️ Cliente {config.NOME} sem CLIENT_ID configurado. Ignorando.")
+            continue
+        clientes.append({
+            "nome": config.NOME,
+            "client_id": config.CLIENT_ID,
+            "system_prompt": config.SYSTEM_PROMPT,
+            "limite": config.LIMITE,
+            "extrair_unidade": getattr(config, "EXTRAIR_UNIDADE", False),
+            "agrupar_apelidos": getattr(config, "AGRUPAR_APELIDOS", False),
+            "regras": getattr(config, "REGRAS", {}),
+            "regras_max_palavras": getattr(config, "REGRAS_MAX_PALAVRAS", 25),
+            "unidades": getattr(config, "UNIDADES", {}),
+            "base_dir": base_dir,
+            "data_dir": os.path.join(base_dir, "data"),
+        })
+    return clientes
+
+
+def arquivo_input(cliente, data):
+    """Caminho do batch_input do cliente para a data (YYYYMMDD), igual ao usado pelo main.py."""
+    return os.path.join(cliente["data_dir"], f"batch_input_{data}.jsonl")
+
+
+def arquivos_do_input(cliente, arquivo_input, data, rotulo="", comprimido=False):
+    """Arquivos gerados a partir de um batch_input: saída do batch, retentativas, Excel e Parquet da `data`.
+
+    `rotulo` entra nos nomes (ex.: "_verifica") para não sobrescrever os do main.py;
+    com `comprimido`, a saída do batch é gravada em .jsonl.gz. Em "retentativa", a
+    rodada entra com .format(rodada=...).
+    """
+    data_dir, nome = cliente["data_dir"], cliente["nome"]
+    extensao = ".jsonl.gz" if comprimido else ".jsonl"
+    return {
+        "input": arquivo_input,
+        "data": data,
+        "saida": os.path.join(data_dir, f"resultado_batch{rotulo}_{data}{extensao}"),
+        "retentativa": os.path.join(data_dir, f"resultado_retentativa{rotulo}{{rodada}}_{data}.jsonl"),
+        "excel": os.path.join(data_dir, f"analise_mensagens{rotulo}_{nome}_{data}.xlsx"),
+        "parquet": os.path.join(data_dir, f"analise_mensagens{rotulo}_{nome}_{data}.parquet"),
+    }
@@ -0,0 +1,124 @@
+import os
+import time
+import sqlite3
+
+import psycopg2
+
+from comum.extracao import ITERSIZE_PADRAO, relatar_extracao, _finalizar_resumo
+
+# Cópia local (SQLite) das mensagens do cliente, guardada na pasta data/ dele.
+# Reexecuções e testes de prompt leem daqui em vez de rodar o agregado pesado
+# no Postgres de produção; só as mensagens novas são trazidas a cada sincronização.
+ARQUIVO_ESPELHO = "espelho_mensagens.sqlite"
+
+SQL_SINCRONIZAR = """
+SELECT "leadId", message, "createdAt"
+FROM ideia_message_db
+WHERE "clientId" = %s
+AND "createdAt" >= %s
+"""
+
+
+def _data_sqlite(valor):
+    """Datas guardadas como texto "YYYY-MM-DD HH:MM:SS[.ffffff]", que ordena igual à data."""
+    if valor is None:
+        return None
+    return str(valor).replace("T", " ", 1)
+
+
+# -----------------------------
+# ABERTURA E SINCRONIZAÇÃO
+# -----------------------------
+def abrir_espelho(data_dir):
+    os.makedirs(data_dir, exist_ok=True)
+    espelho = sqlite3.connect(os.path.join(data_dir, ARQUIVO_ESPELHO))
+    espelho.execute("PRAGMA journal_mode=WAL")
+    espelho.execute("""
+        CREATE TABLE IF NOT EXISTS mensagens (
+            lead_id TEXT NOT NULL,
+            message TEXT,
+            created_at TEXT NOT NULL
+        )
+    """)
+    espelho.execute("CREATE INDEX IF NOT EXISTS idx_mensagens_created_at ON mensagens (created_at)")
+    espelho.execute("CREATE INDEX IF NOT EXISTS idx_mensagens_lead ON mensagens (lead_id)")
+    return espelho
+
+
+def sincronizar_espelho(conn, espelho, client_id, data_inicio, itersize=ITERSIZE_PADRAO):
+    """Traz do Postgres as mensagens posteriores à mais recente já espelhada.
+
+    As mensagens com o mesmo "createdAt" da marca atual são apagadas e trazidas de
+    novo, para não perder nem duplicar as que chegaram no mesmo instante.
+    """
+    marca = espelho.execute("SELECT MAX(created_at) FROM mensagens").fetchone()[0]
+    desde = marca or data_inicio
+    espelho.execute("DELETE FROM mensagens WHERE created_at = ?", (marca,))
+
+    inicio = time.perf_counter()
+    total = 0
+    with conn.cursor(name="espelho_stream") as cursor:
+        cursor.itersize = itersize
+        cursor.execute(SQL_SINCRONIZAR.strip(), (client_id, desde))
+        while True:
+            lote = cursor.fetchmany(itersize)
+            if not lote:
+                break
+            espelho.executemany(
+                "INSERT INTO mensagens (lead_id, message, created_at) VALUES (?, ?, ?)",
+                [(str(lead_id), message, _data_sqlite(criado)) for lead_id, message, criado in lote],
+            )
+            total += len(lote)
+    espelho.commit()
+    print(f"🪞 Espelho sincronizado: {total} mensagens novas em {time.perf_counter() - inicio:.1f}s")
+    return total
+
+
+# -----------------------------
+# EXTRAÇÃO A PARTIR DO ESPELHO
+# -----------------------------
+def extrair_do_espelho(espelho, data_inicio, saida, desde=None, limite=None):
+    """Equivalente local de montar_consulta + extrair_para_jsonl, sem tocar no Postgres."""
+    sql = """
+        SELECT lead_id, group_concat(message, ' || ') AS mensagens, MAX(created_at) AS ultima_mensagem
+        FROM mensagens
+        WHERE created_at >= ?
+    """
+    params = [_data_sqlite(data_inicio)]
+    if desde:
+        sql += " AND lead_id IN (SELECT DISTINCT lead_id FROM mensagens WHERE created_at > ?)"
+        params.append(_data_sqlite(desde))
+    sql += " GROUP BY lead_id"
+    if limite:
+        sql += f" LIMIT {int(limite)}"
+
+    inicio = time.perf_counter()
+    resumo = {"ultima_mensagem": None}
+    for lead_id, mensagens, ultima_mensagem in espelho.execute(sql, params):
+        saida.escrever(lead_id, str(mensagens).strip())
+        if resumo["ultima_mensagem"] is None or ultima_mensagem > resumo["ultima_mensagem"]:
+            resumo["ultima_mensagem"] = ultima_mensagem
+
+    _finalizar_resumo(resumo, saida)
+    relatar_extracao(resumo["leads"], time.perf_counter() - inicio, resumo["requisicoes"],
+                     resumo["linhas"], resumo["tokens_economizados"])
+    if resumo["ultima_mensagem"] is not None:
+        # Mesmo formato ISO dos checkpoints gravados pela extração direta
+        resumo["ultima_mensagem"] = resumo["ultima_mensagem"].replace(" ", "T", 1)
+    return resumo
+
+
+def extrair_com_espelho(db_config, data_dir, client_id, data_inicio, saida,
+                        desde=None, limite=None, sincronizar=True, itersize=ITERSIZE_PADRAO):
+    """Sincroniza o espelho do cliente (a menos que `sincronizar=False`) e extrai dele."""
+    espelho = abrir_espelho(data_dir)
+    try:
+        if sincronizar:
+            conn = psycopg2.connect(**db_config)
+            try:
+                sincronizar_espelho(conn, espelho, client_id, data_inicio, itersize=itersize)
+            finally:
+                conn.close()
+        return extrair_do_espelho(espelho, data_inicio, saida, desde=desde, limite=limite)
+    finally:
+        espelho.close()
@@ -0,0 +1,409 @@
+import io
+import os
+import re
+import sys
+import time
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
+
+from comum.requisicoes import (EscritorRequisicoes, SUFIXOS, SUFIXO_INDICE, caminho_sidecar, relatar_deduplicacao,
+                               relatar_empacotamento)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Quantidade de linhas trazidas do servidor a cada ida ao banco pelo cursor nomeado
+ITERSIZE_PADRAO = 2000
+
+# As consultas de um cliente terminam no WHERE; montar_consulta acrescenta os
+# filtros opcionais, o GROUP BY e o LIMIT.
+SQL_COMPLETO = """
+SELECT
+    m."leadId",
+    STRING_AGG(m.message, ' || ') AS mensagens,
+    MAX(m."createdAt") AS ultima_mensagem
+FROM ideia_message_db m
+WHERE m."clientId" = %s
+AND m."createdAt" >= %s
+"""
+
+# Só os leads que receberam mensagem depois do checkpoint, mas com a conversa
+# inteira desde DATA_INICIO, para que a classificação continue vendo tudo.
+SQL_INCREMENTAL = """
+SELECT
+    m."leadId",
+    STRING_AGG(m.message, ' || ') AS mensagens,
+    MAX(m."createdAt") AS ultima_mensagem
+FROM ideia_message_db m
+WHERE m."clientId" = %s
+AND m."createdAt" >= %s
+AND m."leadId" IN (
+    SELECT DISTINCT "leadId"
+    FROM ideia_message_db
+    WHERE "clientId" = %s
+    AND "createdAt" > %s
+)
+"""
+
+# Bucket de hash do lead, para dividir a extração de um cliente entre várias conexões.
+# O "& 2147483647" evita o abs() de INT_MIN, que estoura em int4.
+FILTRO_PARTICAO = """AND mod(hashtext(m."leadId"::text) & 2147483647, %s) = %s
+"""
+
+# Uma varredura só para vários clientes. O UNNEST traz o checkpoint de cada
+# cliente ('-infinity' para quem ainda não tem) e o HAVING deixa só os leads com
+# mensagem depois dele, sem reler a tabela numa subconsulta. A tupla do IN vira
+# literais sem tipo, que o Postgres converte para o tipo da coluna (text ou uuid) e
+# que usam o índice; o UNNEST é text[], então a junção compara "clientId"::text.
+# Os checkpoints vão como timestamptz[]: o ISO gravado guarda o fuso quando a coluna
+# é timestamptz, e um ISO sem fuso (coluna timestamp) é lido no fuso da sessão, o
+# mesmo usado para comparar a coluna com ele; timestamp[] descartaria o fuso.
+SQL_MULTICLIENTES = """
+SELECT
+    m."clientId"::text AS "clientId",
+    m."leadId",
+    STRING_AGG(m.message, ' || ') AS mensagens,
+    MAX(m."createdAt") AS ultima_mensagem
+FROM ideia_message_db m
+JOIN UNNEST(%s::text[], %s::timestamptz[]) AS c("clientId", desde)
+    ON c."clientId" = m."clientId"::text
+WHERE m."clientId" IN %s
+AND m."createdAt" >= %s
+GROUP BY m."clientId", m."leadId", c.desde
+HAVING MAX(m."createdAt") > c.desde
+"""
+
+
+# -----------------------------
+# CONSULTA
+# -----------------------------
+def montar_consulta(client_id, data_inicio, desde=None, limite=None, particao=None):
+    """Retorna (sql, params) da extração.
+
+    Com `desde`, só traz leads com mensagens novas. `particao` = (k, n) restringe a
+    consulta ao k-ésimo de n buckets de hash de leadId.
+    """
+    if desde:
+        sql, params = SQL_INCREMENTAL, (client_id, data_inicio, client_id, desde)
+    else:
+        sql, params = SQL_COMPLETO, (client_id, data_inicio)
+    if particao:
+        k, n = particao
+        sql += FILTRO_PARTICAO
+        params += (n, k)
+    sql += 'GROUP BY m."leadId"\n'
+    if limite:
+        sql += f"LIMIT {int(limite)}\n"
+    return sql, params
+
+
+# -----------------------------
+# MÉTRICAS DA EXTRAÇÃO
+# -----------------------------
+def pico_memoria_mb():
+    """Pico de memória residente (RSS) do processo em MB, ou None se indisponível."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    if sys.platform == "darwin":
+        return pico / (1024 * 1024)
+    return pico / 1024
+
+
+def _mais_recente(atual, criado):
+    if criado is not None and (atual is None or criado > atual):
+        return criado
+    return atual
+
+
+def _finalizar_resumo(resumo, saida):
+    """Completa o resumo com as contagens do escritor e a marca em ISO 8601."""
+    saida.descarregar()
+    resumo["leads"] = saida.leads
+    resumo["requisicoes"] = saida.requisicoes
+    resumo["linhas"] = saida.linhas
+    resumo["tokens_economizados"] = saida.tokens_economizados
+    if resumo["ultima_mensagem"] is not None and not isinstance(resumo["ultima_mensagem"], str):
+        resumo["ultima_mensagem"] = resumo["ultima_mensagem"].isoformat()
+    return resumo
+
+
+def relatar_extracao(total, duracao, requisicoes=None, linhas=None, tokens_economizados=0):
+    taxa = total / duracao if duracao > 0 else 0.0
+    pico = pico_memoria_mb()
+    pico_txt = f"{pico:.1f} MB" if pico is not None else "n/d"
+    print(f"📈 {total} leads em {duracao:.1f}s ({taxa:.0f} linhas/s) | pico de memória: {pico_txt}")
+    if requisicoes is not None:
+        relatar_deduplicacao(total, requisicoes)
+        if linhas is not None:
+            relatar_empacotamento(requisicoes, linhas, tokens_economizados)
+
+
+# -----------------------------
+# EXTRAÇÃO EM STREAMING
+# -----------------------------
+def extrair_para_jsonl(conn, sql, params, saida, itersize=ITERSIZE_PADRAO, relatar=True):
+    """Lê as conversas por um cursor nomeado (server-side) e grava cada requisição assim que chega.
+
+    `saida` é o EscritorRequisicoes do batch_input. Só `itersize` linhas ficam em
+    memória por vez, então o consumo não cresce com o número de leads do cliente.
+    Retorna um resumo com a quantidade de leads e de requisições gravadas e o maior
+    "createdAt" visto (usado como checkpoint da extração incremental).
+    """
+    # O cursor nomeado vira um DECLARE ... CURSOR FOR <sql>; o ";" final não é aceito ali
+    sql = sql.strip().rstrip(";")
+
+    inicio = time.perf_counter()
+    resumo = {"ultima_mensagem": None}
+    with conn.cursor(name="leads_stream", cursor_factory=RealDictCursor) as cursor:
+        cursor.itersize = itersize
+        cursor.execute(sql, params)
+        for row in cursor:
+            saida.escrever(row["leadId"], str(row.get("mensagens", "")).strip())
+            resumo["ultima_mensagem"] = _mais_recente(resumo["ultima_mensagem"], row.get("ultima_mensagem"))
+
+    _finalizar_resumo(resumo, saida)
+    if relatar:
+        relatar_extracao(resumo["leads"], time.perf_counter() - inicio, resumo["requisicoes"],
+                         resumo["linhas"], resumo["tokens_economizados"])
+    return resumo
+
+
+# -----------------------------
+# EXTRAÇÃO VIA COPY
+# -----------------------------
+# Formato texto do COPY: uma linha por registro, campos separados por TAB e
+# quebras de linha/TABs/barras escapados com "\". Por ser delimitado por linha
+# dá para processar à medida que os dados chegam, sem montar um dict por linha.
+_ESCAPES_COPY = {"b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "v": "\v"}
+_RE_ESCAPE_COPY = re.compile(r"\\(.)")
+
+
+def _desescapar_copy(campo):
+    if campo == "\\N":
+        return None
+    if "\\" not in campo:
+        return campo
+    return _RE_ESCAPE_COPY.sub(lambda m: _ESCAPES_COPY.get(m.group(1), m.group(1)), campo)
+
+
+class _LeitorCopy(io.TextIOBase):
+    """Destino do copy_expert que monta as requisições enquanto o COPY chega."""
+
+    def __init__(self, saida):
+        self.saida = saida
+        self.pendente = ""
+        self.resumo = {"ultima_mensagem": None}
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        if isinstance(dados, bytes):
+            dados = dados.decode("utf-8")
+        linhas = (self.pendente + dados).split("\n")
+        # A última parte pode ser um registro incompleto; fica para o próximo pedaço
+        self.pendente = linhas.pop()
+        for linha in linhas:
+            self._processar(linha)
+        return len(dados)
+
+    def _processar(self, linha):
+        lead_id, mensagens, ultima_mensagem = (_desescapar_copy(c) for c in linha.split("\t"))
+        self.saida.escrever(lead_id, str(mensagens).strip())
+        if ultima_mensagem is not None:
+            # "2025-02-09 10:00:00" -> ISO 8601, igual ao checkpoint do caminho com cursor
+            ultima_mensagem = ultima_mensagem.replace(" ", "T", 1)
+        self.resumo["ultima_mensagem"] = _mais_recente(self.resumo["ultima_mensagem"], ultima_mensagem)
+
+    def finalizar(self):
+        if self.pendente:
+            self._processar(self.pendente)
+            self.pendente = ""
+        return _finalizar_resumo(self.resumo, self.saida)
+
+
+def extrair_via_copy(conn, sql, params, saida, relatar=True):
+    """Mesma extração de extrair_para_jsonl, mas lendo por COPY (SELECT ...) TO STDOUT.
+
+    Evita o RealDictCursor: cada registro chega como uma linha de texto e vira
+    requisição direto. Retorna o mesmo resumo de extrair_para_jsonl.
+    """
+    inicio = time.perf_counter()
+    with conn.cursor() as cursor:
+        consulta = cursor.mogrify(sql.strip().rstrip(";"), params).decode("utf-8")
+        leitor = _LeitorCopy(saida)
+        cursor.copy_expert(f"COPY ({consulta}) TO STDOUT", leitor)
+        resumo = leitor.finalizar()
+
+    if relatar:
+        relatar_extracao(resumo["leads"], time.perf_counter() - inicio, resumo["requisicoes"],
+                         resumo["linhas"], resumo["tokens_economizados"])
+    return resumo
+
+
+# -----------------------------
+# EXTRAÇÃO MULTICLIENTE
+# -----------------------------
+def extrair_multiclientes(conn, clientes, data_inicio, arquivos, desde=None, itersize=ITERSIZE_PADRAO,
+                          caches=None, regras=None, **opcoes_escritor):
+    """Extrai todos os clientes numa única consulta e separa as linhas por cliente durante o streaming.
+
+    `arquivos` mapeia client_id -> caminho do batch_input, `desde` mapeia
+    client_id -> checkpoint (ausente = desde DATA_INICIO); `caches` e `regras`
+    mapeiam client_id -> CacheClassificacoes / ClassificadorRegras e
+    `opcoes_escritor` (deduplicar, leads_por_pacote...) vale para todos. Retorna
+    um resumo por client_id no mesmo formato de extrair_para_jsonl.
+    """
+    desde = desde or {}
+    caches = caches or {}
+    regras = regras or {}
+    ids = [c["client_id"] for c in clientes]
+    params = (ids, [desde.get(i) or "-infinity" for i in ids], tuple(ids), data_inicio)
+
+    resumos = {i: {"ultima_mensagem": None} for i in ids}
+    saidas = {
+        c["client_id"]: EscritorRequisicoes(arquivos[c["client_id"]], c["system_prompt"], cache=caches.get(c["client_id"]),
+                                            regras=regras.get(c["client_id"]), **opcoes_escritor)
+        for c in clientes
+    }
+    inicio = time.perf_counter()
+    try:
+        with conn.cursor(name="leads_stream_multi", cursor_factory=RealDictCursor) as cursor:
+            cursor.itersize = itersize
+            cursor.execute(SQL_MULTICLIENTES.strip(), params)
+            for row in cursor:
+                client_id = row["clientId"]
+                saidas[client_id].escrever(row["leadId"], str(row.get("mensagens", "")).strip())
+                resumo = resumos[client_id]
+                resumo["ultima_mensagem"] = _mais_recente(resumo["ultima_mensagem"], row.get("ultima_mensagem"))
+    finally:
+        for saida in saidas.values():
+            saida.fechar()
+
+    resumos = {i: _finalizar_resumo(r, saidas[i]) for i, r in resumos.items()}
+    total = {k: sum(r[k] for r in resumos.values()) for k in ("leads", "requisicoes", "linhas", "tokens_economizados")}
+    relatar_extracao(total["leads"], time.perf_counter() - inicio, total["requisicoes"],
+                     total["linhas"], total["tokens_economizados"])
+    return resumos
+
+
+# -----------------------------
+# EXTRAÇÃO PARALELA POR PARTIÇÕES
+# -----------------------------
+def caminho_shard(arquivo, k):
+    """batch_input_20250101.jsonl -> batch_input_20250101.part03.jsonl"""
+    base, ext = os.path.splitext(arquivo)
+    return f"{base}.part{k:02d}{ext}"
+
+
+def _concatenar(partes, destino):
+    with open(destino, "wb") as saida:
+        for parte in partes:
+            with open(parte, "rb") as f:
+                shutil.copyfileobj(f, saida, 1024 * 1024)
+    for parte in partes:
+        os.remove(parte)
+
+
+def _juntar_indices(shards, destino):
+    """Junta os .indice.tsv dos shards somando aos offsets o tamanho dos shards anteriores."""
+    deslocamento = 0
+    partes = []
+    with open(caminho_sidecar(destino, SUFIXO_INDICE), "w", encoding="utf-8") as saida:
+        for shard in shards:
+            caminho = caminho_sidecar(shard, SUFIXO_INDICE)
+            if os.path.exists(caminho):
+                with open(caminho, "r", encoding="utf-8") as f:
+                    for linha in f:
+                        custom_id, offset, tamanho = linha.rstrip("\n").split("\t")
+                        saida.write(f"{custom_id}\t{int(offset) + deslocamento}\t{tamanho}\n")
+                partes.append(caminho)
+            deslocamento += os.path.getsize(shard)
+    for parte in partes:
+        os.remove(parte)
+
+
+def juntar_shards(shards, destino):
+    """Concatena os shards (e os arquivos ao lado de cada um) em `destino` e apaga os parciais."""
+    # Antes de concatenar: os offsets dependem do tamanho de cada shard
+    _juntar_indices(shards, destino)
+    _concatenar(shards, destino)
+    for sufixo in SUFIXOS:
+        if sufixo == SUFIXO_INDICE:
+            continue
+        partes = [caminho_sidecar(s, sufixo) for s in shards if os.path.exists(caminho_sidecar(s, sufixo))]
+        if partes:
+            _concatenar(partes, caminho_sidecar(destino, sufixo))
+        elif os.path.exists(caminho_sidecar(destino, sufixo)):
+            os.remove(caminho_sidecar(destino, sufixo))
+
+
+def extrair_paralelo(db_config, client_id, data_inicio, arquivo, system_prompt, particoes,
+                     desde=None, limite=None, itersize=ITERSIZE_PADRAO, juntar=True, **opcoes_escritor):
+    """Divide os leads do cliente em `particoes` buckets de hash e extrai cada um numa conexão própria.
+
+    As conexões vêm de um ThreadedConnectionPool criado com `db_config` (kwargs do
+    psycopg2.connect). Cada worker grava o seu shard; com `juntar=True` os shards
+    são concatenados em `arquivo`, senão ficam separados para envio independente.
+    O `limite`, se houver, vale por partição. `opcoes_escritor` (deduplicar,
+    cache, regras, leads_por_pacote...) vai para o EscritorRequisicoes de cada shard. Retorna o
+    resumo agregado, com a lista de arquivos gerados em "shards".
+    """
+    pool = ThreadedConnectionPool(1, particoes, **db_config)
+    # Compartilhado entre os shards quando eles vão ser juntados, para uma conversa repetida
+    # em dois buckets ir uma vez só. Shards enviados separados têm cada um o seu: a
+    # duplicata de um shard não pode apontar para uma requisição que está em outro (None:
+    # o EscritorRequisicoes cria um por shard)
+    vistos = {} if juntar else None
+
+    def extrair_particao(k):
+        sql, params = montar_consulta(client_id, data_inicio, desde=desde, limite=limite, particao=(k, particoes))
+        shard = caminho_shard(arquivo, k)
+        conn = pool.getconn()
+        try:
+            with EscritorRequisicoes(shard, system_prompt, vistos=vistos, **opcoes_escritor) as saida:
+                resumo = extrair_para_jsonl(conn, sql, params, saida, itersize=itersize, relatar=False)
+            # Fecha a transação do cursor nomeado antes de devolver a conexão ao pool
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            pool.putconn(conn)
+        return shard, resumo
+
+    inicio = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=particoes) as executor:
+            resultados = list(executor.map(extrair_particao, range(particoes)))
+    finally:
+        pool.closeall()
+
+    shards = [shard for shard, _ in resultados]
+    resumo = {k: sum(r[k] for _, r in resultados) for k in ("leads", "requisicoes", "linhas", "tokens_economizados")}
+    # Os resumos parciais já vêm em ISO 8601, que ordena igual às datas
+    marcas = [r["ultima_mensagem"] for _, r in resultados if r["ultima_mensagem"]]
+    relatar_extracao(resumo["leads"], time.perf_counter() - inicio, resumo["requisicoes"],
+                     resumo["linhas"], resumo["tokens_economizados"])
+
+    if juntar:
+        juntar_shards(shards, arquivo)
+        shards = [arquivo]
+    resumo["ultima_mensagem"] = max(marcas) if marcas else None
+    resumo["shards"] = shards
+    return resumo
+
+
+def contar_leads(arquivo):
+    """Quantidade de requisições num batch_input já gerado."""
+    if not os.path.exists(arquivo):
+        return 0
+    with open(arquivo, "r", encoding="utf-8") as f:
+        return sum(1 for linha in f if linha.strip())
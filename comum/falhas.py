@@ -0,0 +1,116 @@
+import os
+import json
+from contextlib import nullcontext
+
+from comum.batches import caminho_erros
+from comum.requisicoes import caminho_sidecar, ler_pacotes, abrir_resultado
+from comum.processamento import extrair_assunto_e_unidade
+
+# Requisições que falharam (erro da API, status != 200), vieram sem assunto
+# legível ou nem voltaram (lote expirado) são reenviadas sozinhas depois do batch,
+# e as respostas novas entram no mesmo arquivo de resultado antes do relatório.
+
+
+# -----------------------------
+# DETECÇÃO
+# -----------------------------
+def _resposta_valida(item, pacotes):
+    resposta = item.get("response") or {}
+    if item.get("error") or resposta.get("status_code") != 200:
+        return False
+    choices = (resposta.get("body") or {}).get("choices") or []
+    conteudo = ""
+    if choices:
+        conteudo = (choices[0].get("message") or {}).get("content") or ""
+    custom_id = item.get("custom_id", "")
+    if custom_id in pacotes:
+        try:
+            classificacoes = json.loads(conteudo)
+        except ValueError:
+            return False
+        if not isinstance(classificacoes, dict):
+            return False
+        return all((classificacoes.get(lead) or {}).get("assunto") for lead in pacotes[custom_id])
+    assunto, _ = extrair_assunto_e_unidade(conteudo)
+    return bool(assunto)
+
+
+def _ler_jsonl(fonte):
+    """Itens de um JSONL: caminho (.jsonl ou .jsonl.gz) ou iterável de linhas, como o baixar_linhas."""
+    if not fonte or (isinstance(fonte, str) and not os.path.exists(fonte)):
+        return
+    with abrir_resultado(fonte) if isinstance(fonte, str) else nullcontext(fonte) as f:
+        for linha in f:
+            try:
+                yield json.loads(linha)
+            except ValueError:
+                continue
+
+
+def _ids_input(arquivo_input):
+    with open(arquivo_input, "r", encoding="utf-8") as f:
+        for linha in f:
+            if linha.strip():
+                yield json.loads(linha)["custom_id"]
+
+
+def coletar_falhas(arquivo_input, arquivo_saida):
+    """custom_ids do batch_input sem nenhuma resposta válida na saída (nem no arquivo de erros)."""
+    pacotes = ler_pacotes(arquivo_input)
+    validos = {item.get("custom_id") for item in _ler_jsonl(arquivo_saida) if _resposta_valida(item, pacotes)}
+    return [custom_id for custom_id in _ids_input(arquivo_input) if custom_id not in validos]
+
+
+# -----------------------------
+# REENVIO
+# -----------------------------
+def preparar_retentativa(arquivo_input, arquivo_saida, rodada):
+    """Grava num input à parte só as requisições com falha. Retorna o caminho, ou None se não houver falhas."""
+    falhas = set(coletar_falhas(arquivo_input, arquivo_saida))
+    if not falhas:
+        return None
+    destino = caminho_sidecar(arquivo_input, f"retentativa{rodada}.jsonl")
+    with open(arquivo_input, "r", encoding="utf-8") as f, open(destino, "w", encoding="utf-8") as saida:
+        for linha in f:
+            if linha.strip() and json.loads(linha)["custom_id"] in falhas:
+                saida.write(linha)
+    print(f"🩹 {len(falhas)} requisições com falha ou sem resposta; reenviando (rodada {rodada})...")
+    return destino
+
+
+def juntar_retentativa(arquivo_input, arquivo_saida, saida_retentativa):
+    """Troca, em `arquivo_saida`, as linhas das requisições recuperadas pelas respostas novas.
+
+    `saida_retentativa` pode ser o caminho ou as linhas conforme são baixadas (baixar_linhas).
+
+    Retorna quantas foram recuperadas.
+    """
+    pacotes = ler_pacotes(arquivo_input)
+    recuperadas = {}
+    for item in _ler_jsonl(saida_retentativa):
+        if _resposta_valida(item, pacotes):
+            recuperadas[item["custom_id"]] = json.dumps(item, ensure_ascii=False) + "\n"
+    if recuperadas:
+        temporario = arquivo_saida + ".tmp"
+        with abrir_resultado(temporario, "w", comprimido=arquivo_saida.endswith(".gz")) as saida:
+            for item in _ler_jsonl(arquivo_saida):
+                if item.get("custom_id") not in recuperadas:
+                    saida.write(json.dumps(item, ensure_ascii=False) + "\n")
+            saida.writelines(recuperadas.values())
+        os.replace(temporario, arquivo_saida)
+    print(f"🩹 {len(recuperadas)} requisições recuperadas.")
+    return len(recuperadas)
+
+
+def relatar_falhas(arquivo_input, arquivo_saida):
+    """Avisa quantas requisições ficaram sem resposta válida.
+
+    Os leads delas continuam no relatório, com assunto vazio (inclusive os que
+    nem voltaram na saída: ver comum.processamento.iterar_resultados).
+    """
+    restantes = coletar_falhas(arquivo_input, arquivo_saida)
+    if restantes:
+        erros = sum(1 for _ in _ler_jsonl(caminho_erros(arquivo_saida)))
+        print(f"⚠️ {len(restantes)} requisições sem resposta válida após as retentativas; os leads delas saem "
+              f"sem assunto no relatório ({erros} linhas no arquivo de erros do batch).")
+    return restantes
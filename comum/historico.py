@@ -0,0 +1,127 @@
+import os
+import glob
+
+import duckdb
+
+from comum.clientes import RAIZ
+from comum.parquet import gravar_tabela
+
+# Histórico de todas as execuções, só de acréscimo, particionado por cliente e data:
+#   historico/cliente=Vamo/data=2026-10-17/<execucao>.parquet
+# Cada execução grava um arquivo novo na sua partição e nunca reescreve os antigos.
+# As consultas passam pelo DuckDB direto nos parquets, sem abrir Excel nem JSONL.
+PASTA_HISTORICO_PADRAO = os.path.join(RAIZ, "historico")
+DIAS_TENDENCIA_PADRAO = 90
+
+
+# -----------------------------
+# GRAVAÇÃO
+# -----------------------------
+def caminho_particao(pasta_historico, cliente, data):
+    return os.path.join(pasta_historico, f"cliente={cliente}", f"data={data.isoformat()}")
+
+
+def acrescentar_historico(tabela, pasta_historico=PASTA_HISTORICO_PADRAO):
+    """Acrescenta a tabela de uma execução (comum.parquet.tabela_resultados) ao histórico.
+
+    Cliente e data vão no caminho da partição, não nas colunas do arquivo.
+    """
+    linha = tabela.slice(0, 1).to_pylist()
+    if not linha:
+        return None
+    cliente, data, execucao = linha[0]["cliente"], linha[0]["data"], linha[0]["execucao"]
+    particao = caminho_particao(pasta_historico, cliente, data)
+    os.makedirs(particao, exist_ok=True)
+    destino = os.path.join(particao, f"{execucao}.parquet")
+    gravar_tabela(tabela.drop_columns(["cliente", "data"]), destino)
+    print(f"🗄️ Histórico: {tabela.num_rows} linhas em {os.path.relpath(destino, pasta_historico)}")
+    return destino
+
+
+# -----------------------------
+# CONSULTA
+# -----------------------------
+def abrir_historico(pasta_historico=PASTA_HISTORICO_PADRAO):
+    """Conexão DuckDB em memória com as views do histórico.
+
+    - `execucoes`: todas as linhas de todas as execuções, como gravadas;
+    - `resultados`: uma linha por lead e dia (se o mesmo dia foi processado de novo,
+      vale a execução mais recente);
+    - `assuntos`: `resultados` com um assunto por linha, para contar por assunto.
+
+    Os assuntos vão pelo nome: os códigos dos parquets só valem dentro de cada
+    arquivo (assunto fora da taxonomia ganha código na ordem de aparição).
+    """
+    padrao = os.path.join(pasta_historico, "cliente=*", "data=*", "*.parquet")
+    if not glob.glob(padrao):
+        raise FileNotFoundError(f"Histórico vazio: {pasta_historico}")
+    conexao = duckdb.connect()
+    padrao = padrao.replace("'", "''")
+    conexao.execute(f"""
+        CREATE VIEW execucoes AS
+        SELECT id, cliente, CAST(data AS DATE) AS data, CAST(execucao AS VARCHAR) AS execucao,
+               CAST(assunto AS VARCHAR) AS assunto, CAST(unidade AS VARCHAR) AS unidade, tokens
+        FROM read_parquet('{padrao}', hive_partitioning = true, union_by_name = true)
+    """)
+    conexao.execute("""
+        CREATE VIEW resultados AS
+        SELECT * FROM execucoes
+        QUALIFY row_number() OVER (PARTITION BY cliente, data, id ORDER BY execucao DESC) = 1
+    """)
+    conexao.execute("""
+        CREATE VIEW assuntos AS
+        SELECT cliente, data, id, trim(a) AS assunto, coalesce(unidade, 'Não Informada') AS unidade, tokens
+        FROM resultados, unnest(string_split(assunto, ',')) AS t(a)
+        WHERE trim(a) <> ''
+    """)
+    return conexao
+
+
+def _filtros(cliente=None, unidade=None, inicio=None, fim=None):
+    condicoes, parametros = [], []
+    for coluna, operador, valor in (("lower(cliente)", "= lower", cliente), ("lower(unidade)", "= lower", unidade),
+                                    ("data", ">=", inicio), ("data", "<=", fim)):
+        if valor is not None:
+            condicoes.append(f"{coluna} {operador}(?)")
+            parametros.append(valor)
+    return (" AND ".join(condicoes) or "TRUE"), parametros
+
+
+def tendencia(conexao, assunto, cliente=None, unidade=None, dias=DIAS_TENDENCIA_PADRAO):
+    """Por dia dos últimos `dias` com dados: conversas com o assunto e a fatia dele no total do dia.
+
+    O total é de conversas (ids distintos), como a "Porcentagem" do relatório.
+    """
+    filtro, parametros = _filtros(cliente, unidade)
+    return conexao.execute(f"""
+        WITH base AS (SELECT * FROM assuntos WHERE {filtro}),
+             limite AS (SELECT max(data) - INTERVAL ({int(dias) - 1}) DAY AS inicio FROM base)
+        SELECT data,
+               count(DISTINCT id) FILTER (WHERE lower(assunto) = lower(?)) AS quantidade,
+               count(DISTINCT id) AS total,
+               round(100.0 * count(DISTINCT id) FILTER (WHERE lower(assunto) = lower(?)) / count(DISTINCT id), 2)
+                   AS "porcentagem (%)"
+        FROM base, limite
+        WHERE data >= limite.inicio
+        GROUP BY data
+        ORDER BY data
+    """, parametros + [assunto, assunto]).df()
+
+
+def comparar(conexao, periodo_a, periodo_b, cliente=None, unidade=None):
+    """Contagem por assunto em dois períodos (pares (inicio, fim) de datas) e a variação entre eles."""
+    def contagem(periodo):
+        filtro, parametros = _filtros(cliente, unidade, *periodo)
+        return f"SELECT assunto, count(DISTINCT id) AS q FROM assuntos WHERE {filtro} GROUP BY assunto", parametros
+
+    consulta_a, parametros_a = contagem(periodo_a)
+    consulta_b, parametros_b = contagem(periodo_b)
+    return conexao.execute(f"""
+        SELECT assunto,
+               coalesce(a.q, 0) AS periodo_a,
+               coalesce(b.q, 0) AS periodo_b,
+               coalesce(b.q, 0) - coalesce(a.q, 0) AS variacao,
+               round(100.0 * (coalesce(b.q, 0) - a.q) / a.q, 1) AS "variacao (%)"
+        FROM ({consulta_a}) a FULL OUTER JOIN ({consulta_b}) b USING (assunto)
+        ORDER BY periodo_b DESC, periodo_a DESC
+    """, parametros_a + parametros_b).df()
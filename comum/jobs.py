@@ -0,0 +1,132 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+# Registro dos jobs enviados ao Batch API, por cliente (fica na pasta data/ dele).
+# Cada lote é gravado assim que o upload termina e atualizado a cada consulta, para
+# que uma execução interrompida retome os jobs em andamento em vez de reenviar tudo.
+ARQUIVO_REGISTRO = "registro_jobs.sqlite"
+
+# Jobs nesses status não serão concluídos: não são retomados
+STATUS_PERDIDOS = ("failed", "expired", "cancelled")
+
+
+def hash_arquivo(caminho):
+    """blake2b do conteúdo do arquivo, lido em blocos de 1 MB."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+class RegistroJobs:
+    """Tabela de lotes enviados: cliente, input, hash do lote, ids de arquivo/batch, status e datas.
+
+    Pode ser usado por várias threads (uploads simultâneos dos lotes).
+    """
+
+    def __init__(self, data_dir, cliente):
+        os.makedirs(data_dir, exist_ok=True)
+        self.cliente = cliente
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(data_dir, ARQUIVO_REGISTRO), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                cliente TEXT NOT NULL,
+                arquivo_input TEXT NOT NULL,
+                hash_lote TEXT NOT NULL,
+                file_id TEXT,
+                batch_id TEXT,
+                status TEXT,
+                output_file_id TEXT,
+                error_file_id TEXT,
+                processado INTEGER NOT NULL DEFAULT 0,
+                rodada INTEGER NOT NULL DEFAULT 0,
+                criado_em REAL NOT NULL,
+                atualizado_em REAL NOT NULL
+            )
+        """)
+        # Registros criados antes das retentativas entrarem no registro
+        colunas = {linha["name"] for linha in self.conn.execute("PRAGMA table_info(jobs)")}
+        if "rodada" not in colunas:
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN rodada INTEGER NOT NULL DEFAULT 0")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_hash ON jobs (hash_lote)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_batch ON jobs (batch_id)")
+        self.conn.commit()
+
+    def _executar(self, sql, params=()):
+        with self.lock:
+            cursor = self.conn.execute(sql, params)
+            self.conn.commit()
+            return cursor
+
+    def reaproveitavel(self, hash_lote):
+        """Último envio ainda aproveitável de um lote com este conteúdo (não perdido nem processado), ou None."""
+        marcadores = ", ".join("?" * len(STATUS_PERDIDOS))
+        with self.lock:
+            return self.conn.execute(f"""
+                SELECT * FROM jobs
+                WHERE cliente = ? AND hash_lote = ? AND processado = 0
+                AND file_id IS NOT NULL AND (status IS NULL OR status NOT IN ({marcadores}))
+                ORDER BY id DESC LIMIT 1
+            """, (self.cliente, hash_lote, *STATUS_PERDIDOS)).fetchone()
+
+    def registrar_upload(self, arquivo_input, hash_lote, file_id, rodada=0):
+        """Grava um lote subido. `rodada` > 0: lote de retentativa das falhas de `arquivo_input`."""
+        agora = time.time()
+        return self._executar(
+            "INSERT INTO jobs (cliente, arquivo_input, hash_lote, file_id, rodada, criado_em, atualizado_em) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (self.cliente, arquivo_input, hash_lote, file_id, rodada, agora, agora),
+        ).lastrowid
+
+    def registrar_batch(self, id_registro, batch):
+        self._executar("UPDATE jobs SET batch_id = ?, status = ?, atualizado_em = ? WHERE id = ?",
+                       (batch.id, batch.status, time.time(), id_registro))
+
+    def atualizar(self, batch):
+        """Guarda o último estado lido de um batch (status e arquivos de saída/erro)."""
+        self._executar(
+            "UPDATE jobs SET status = ?, output_file_id = ?, error_file_id = ?, atualizado_em = ? WHERE batch_id = ?",
+            (batch.status, getattr(batch, "output_file_id", None), getattr(batch, "error_file_id", None),
+             time.time(), batch.id),
+        )
+
+    def marcar_processados(self, batch_ids):
+        with self.lock:
+            self.conn.executemany("UPDATE jobs SET processado = 1, atualizado_em = ? WHERE batch_id = ?",
+                                  [(time.time(), b) for b in batch_ids])
+            self.conn.commit()
+
+    def em_aberto(self, arquivo_input=None):
+        """Jobs criados e ainda não processados (de `arquivo_input`, ou de qualquer input), mais antigos primeiro."""
+        sql = "SELECT * FROM jobs WHERE cliente = ? AND batch_id IS NOT NULL AND processado = 0"
+        params = [self.cliente]
+        if arquivo_input is not None:
+            sql += " AND arquivo_input = ?"
+            params.append(arquivo_input)
+        with self.lock:
+            return self.conn.execute(sql + " ORDER BY id", params).fetchall()
+
+    def lote(self, batch_id):
+        """Linha do registro do lote `batch_id` (input de origem, rodada...), ou None se ele não está no registro."""
+        with self.lock:
+            return self.conn.execute("SELECT * FROM jobs WHERE cliente = ? AND batch_id = ?",
+                                     (self.cliente, batch_id)).fetchone()
+
+    def fechar(self):
+        with self.lock:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
@@ -0,0 +1,321 @@
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager, asynccontextmanager
+
+from openai import APIConnectionError
+
+from comum.texto import estimar_tokens
+from comum.taxonomia import ler_taxonomia
+
+# Substituto local do Files/Batches API (e do chat completions do modo tempo real)
+# para rodar o pipeline de ponta a ponta sem rede: testes de carga, benchmarks e
+# CI. Os arquivos e o estado dos jobs ficam numa pasta local, então um job criado
+# pelo main.py pode ser acompanhado depois pelo verifica.py. As classificações são
+# sintéticas, mas determinísticas (hash da conversa), e tiradas da lista de
+# assuntos do SYSTEM_PROMPT de cada requisição, ou seja, da taxonomia do cliente.
+PASTA_PADRAO = os.path.join(tempfile.gettempdir(), "openai_falso")
+DURACAO_BATCH_PADRAO = 5
+TAMANHO_BLOCO = 1024 * 1024
+# Cabeçalho de cada conversa na mensagem de um pacote
+PADRAO_PACOTE = re.compile(r"^### (\S+)$", re.MULTILINE)
+
+
+# -----------------------------
+# CLASSIFICAÇÃO SINTÉTICA
+# -----------------------------
+def _hash(texto):
+    return hashlib.blake2b(texto.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def classificar(chave, assuntos, unidades):
+    """(assunto, unidade) sempre iguais para a mesma chave: 1 a 3 assuntos da lista."""
+    sorteio = random.Random(int(_hash(chave), 16))
+    escolhidos = sorteio.sample(assuntos, min(len(assuntos), sorteio.choice((1, 1, 1, 2, 2, 3))))
+    unidade = sorteio.choice(unidades) if unidades else ""
+    return ", ".join(escolhidos), unidade
+
+
+def _resposta_chat(body):
+    """Chat completion sintético: a mesma conversa sempre recebe a mesma classificação."""
+    mensagens = body.get("messages", [])
+    system_prompt = next((m["content"] for m in mensagens if m["role"] == "system"), "")
+    usuario = "\n".join(m["content"] for m in mensagens if m["role"] == "user")
+    assuntos, unidades, _ = ler_taxonomia(system_prompt)
+
+    if body.get("response_format"):
+        # Pacote: uma classificação por "### <custom_id>" da mensagem
+        classificacoes = {}
+        for lead in PADRAO_PACOTE.findall(usuario):
+            assunto, unidade = classificar(lead, assuntos, unidades)
+            classificacoes[lead] = {"assunto": assunto, "unidade": unidade}
+        conteudo = json.dumps(classificacoes, ensure_ascii=False)
+    else:
+        assunto, unidade = classificar(usuario, assuntos, unidades)
+        conteudo = f"Assuntos: {assunto}" + (f"\nUnidade: {unidade}" if unidade else "")
+
+    prompt = sum(estimar_tokens(m["content"]) for m in mensagens)
+    completion = estimar_tokens(conteudo)
+    return {
+        "id": f"chatcmpl-{_hash(usuario)}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", ""),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": conteudo}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion},
+    }
+
+
+class _Objeto:
+    """Atributos a partir de um dict, como os modelos do SDK (com model_dump)."""
+
+    def __init__(self, dados):
+        self._dados = dados
+        for chave, valor in dados.items():
+            setattr(self, chave, _Objeto(valor) if isinstance(valor, dict) else valor)
+
+    def model_dump(self):
+        return self._dados
+
+
+# -----------------------------
+# ESTADO (PASTA LOCAL)
+# -----------------------------
+class ServidorFalso:
+    """Arquivos e jobs simulados, guardados em `pasta`.
+
+    `latencia`: segundos de espera em cada chamada; `duracao`: segundos até um job
+    terminar (o progresso anda proporcionalmente); `taxa_falha`: fração das
+    requisições que vão para o arquivo de erros; `taxa_erro_api`: fração das
+    chamadas que falham com APIConnectionError; `semente` fixa os sorteios de falha.
+    """
+
+    def __init__(self, pasta=PASTA_PADRAO, latencia=0.0, duracao=DURACAO_BATCH_PADRAO, taxa_falha=0.0,
+                 taxa_erro_api=0.0, semente=0):
+        os.makedirs(pasta, exist_ok=True)
+        self.pasta = pasta
+        self.latencia = latencia
+        self.duracao = duracao
+        self.taxa_falha = taxa_falha
+        self.taxa_erro_api = taxa_erro_api
+        self.sorteio = random.Random(semente)
+        self.lock = threading.Lock()
+        # Só uma consulta por vez gera os arquivos de saída de um job
+        self.lock_batches = threading.Lock()
+
+    def _caminho(self, id_objeto):
+        return os.path.join(self.pasta, id_objeto)
+
+    def _novo_id(self, prefixo):
+        with self.lock:
+            return f"{prefixo}-{time.time_ns():x}{self.sorteio.getrandbits(32):08x}"
+
+    def chamar(self):
+        """Sorteia o erro de conexão simulado de uma chamada."""
+        with self.lock:
+            falhou = self.sorteio.random() < self.taxa_erro_api
+        if falhou:
+            raise APIConnectionError(message="Erro de conexão simulado", request=None)
+
+    def falhou(self):
+        with self.lock:
+            return self.sorteio.random() < self.taxa_falha
+
+    # Arquivos
+    def criar_arquivo(self, file):
+        file_id = self._novo_id("file")
+        with open(self._caminho(file_id), "wb") as destino:
+            for bloco in iter(lambda: file.read(TAMANHO_BLOCO), b""):
+                destino.write(bloco)
+        return _Objeto({"id": file_id, "object": "file", "purpose": "batch",
+                        "bytes": os.path.getsize(self._caminho(file_id))})
+
+    def ler_arquivo(self, file_id):
+        with open(self._caminho(file_id), "rb") as f:
+            for bloco in iter(lambda: f.read(TAMANHO_BLOCO), b""):
+                yield bloco
+
+    # Jobs
+    def _gravar_batch(self, batch):
+        temporario = self._caminho(batch["id"]) + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(batch, f)
+        os.replace(temporario, self._caminho(batch["id"]))
+
+    def criar_batch(self, input_file_id, endpoint, completion_window):
+        with open(self._caminho(input_file_id), "rb") as f:
+            total = sum(1 for linha in f if linha.strip())
+        batch = {
+            "id": self._novo_id("batch"), "object": "batch", "endpoint": endpoint,
+            "completion_window": completion_window, "input_file_id": input_file_id,
+            "status": "validating", "created_at": time.time(),
+            "output_file_id": None, "error_file_id": None,
+            "request_counts": {"total": total, "completed": 0, "failed": 0},
+        }
+        self._gravar_batch(batch)
+        return _Objeto(batch)
+
+    def _executar(self, batch):
+        """Gera os arquivos de saída e de erros do job."""
+        saida_id, erros_id = self._novo_id("file"), self._novo_id("file")
+        completed = failed = 0
+        with open(self._caminho(batch["input_file_id"]), "r", encoding="utf-8") as entrada, \
+                open(self._caminho(saida_id), "w", encoding="utf-8") as saida, \
+                open(self._caminho(erros_id), "w", encoding="utf-8") as erros:
+            for linha in entrada:
+                if not linha.strip():
+                    continue
+                requisicao = json.loads(linha)
+                custom_id = requisicao["custom_id"]
+                item = {"id": f"batch_req_{completed + failed}", "custom_id": custom_id, "error": None}
+                if self.falhou():
+                    item["response"] = {"status_code": 500, "request_id": "",
+                                        "body": {"error": {"message": "Erro simulado", "type": "server_error"}}}
+                    erros.write(json.dumps(item, ensure_ascii=False) + "\n")
+                    failed += 1
+                else:
+                    item["response"] = {"status_code": 200, "request_id": "",
+                                        "body": _resposta_chat(requisicao["body"])}
+                    saida.write(json.dumps(item, ensure_ascii=False) + "\n")
+                    completed += 1
+        batch["output_file_id"] = saida_id if completed else None
+        batch["error_file_id"] = erros_id if failed else None
+        batch["request_counts"].update(completed=completed, failed=failed)
+
+    def consultar_batch(self, batch_id):
+        with self.lock_batches:
+            return self._consultar_batch(batch_id)
+
+    def _consultar_batch(self, batch_id):
+        with open(self._caminho(batch_id), "r", encoding="utf-8") as f:
+            batch = json.load(f)
+        if batch["status"] not in ("validating", "in_progress"):
+            return _Objeto(batch)
+        fracao = (time.time() - batch["created_at"]) / self.duracao if self.duracao else 1.0
+        if fracao >= 1:
+            self._executar(batch)
+            batch["status"] = "completed"
+        else:
+            batch["status"] = "in_progress" if fracao >= 0.1 else "validating"
+            batch["request_counts"]["completed"] = int(batch["request_counts"]["total"] * fracao)
+        self._gravar_batch(batch)
+        return _Objeto(batch)
+
+    def listar_batches(self, limit=20):
+        ids = sorted((n for n in os.listdir(self.pasta) if n.startswith("batch-") and not n.endswith(".tmp")),
+                     reverse=True)
+        return _Objeto({"object": "list", "data": [self.consultar_batch(b) for b in ids[:limit]]})
+
+
+def servidor_do_ambiente():
+    """ServidorFalso configurado pelas variáveis OPENAI_FALSO_* (pasta, latência, duração e taxas de falha)."""
+    return ServidorFalso(
+        pasta=os.getenv("OPENAI_FALSO_PASTA", PASTA_PADRAO),
+        latencia=float(os.getenv("OPENAI_FALSO_LATENCIA", "0")),
+        duracao=float(os.getenv("OPENAI_FALSO_DURACAO", DURACAO_BATCH_PADRAO)),
+        taxa_falha=float(os.getenv("OPENAI_FALSO_TAXA_FALHA", "0")),
+        taxa_erro_api=float(os.getenv("OPENAI_FALSO_TAXA_ERRO_API", "0")),
+        semente=int(os.getenv("OPENAI_FALSO_SEMENTE", "0")),
+    )
+
+
+# -----------------------------
+# CLIENTES (MESMA INTERFACE DO SDK)
+# -----------------------------
+class _Conteudo:
+    def __init__(self, blocos):
+        self._blocos = blocos
+
+    def iter_bytes(self, tamanho=None):
+        return self._blocos
+
+
+class _ConteudoAsync:
+    def __init__(self, blocos):
+        self._blocos = blocos
+
+    async def iter_bytes(self, tamanho=None):
+        for bloco in self._blocos:
+            yield bloco
+
+
+class _Namespace:
+    def __init__(self, **atributos):
+        self.__dict__.update(atributos)
+
+
+class OpenAIFalso:
+    """Substitui o módulo `openai` nas funções de comum/batches.py (files e batches)."""
+
+    def __init__(self, servidor=None, **opcoes):
+        self.servidor = servidor or ServidorFalso(**opcoes)
+        self.files = _Namespace(create=self._create_file, content=self._content,
+                                with_streaming_response=_Namespace(content=self._content_streaming))
+        self.batches = _Namespace(create=self._chamada(self.servidor.criar_batch),
+                                  retrieve=self._chamada(self.servidor.consultar_batch),
+                                  list=self._chamada(self.servidor.listar_batches))
+
+    def _chamada(self, funcao):
+        def chamar(*args, **kwargs):
+            if self.servidor.latencia:
+                time.sleep(self.servidor.latencia)
+            self.servidor.chamar()
+            return funcao(*args, **kwargs)
+        return chamar
+
+    def _create_file(self, file, purpose="batch"):
+        return self._chamada(self.servidor.criar_arquivo)(file)
+
+    def _content(self, file_id):
+        conteudo = b"".join(self._chamada(self.servidor.ler_arquivo)(file_id))
+        return _Objeto({"content": conteudo, "text": conteudo.decode("utf-8")})
+
+    @contextmanager
+    def _content_streaming(self, file_id):
+        yield _Conteudo(self._chamada(self.servidor.ler_arquivo)(file_id))
+
+
+class AsyncOpenAIFalso:
+    """Substitui o openai.AsyncOpenAI: files, batches e chat.completions (modo tempo real)."""
+
+    def __init__(self, servidor=None, **opcoes):
+        self.servidor = servidor or ServidorFalso(**opcoes)
+        self.files = _Namespace(create=self._create_file, content=self._content,
+                                with_streaming_response=_Namespace(content=self._content_streaming))
+        self.batches = _Namespace(create=self._chamada(self.servidor.criar_batch),
+                                  retrieve=self._chamada(self.servidor.consultar_batch),
+                                  list=self._chamada(self.servidor.listar_batches))
+        self.chat = _Namespace(completions=_Namespace(create=self._chamada(self._completar)))
+
+    def _chamada(self, funcao):
+        async def chamar(*args, **kwargs):
+            if self.servidor.latencia:
+                await asyncio.sleep(self.servidor.latencia)
+            self.servidor.chamar()
+            return await asyncio.to_thread(funcao, *args, **kwargs)
+        return chamar
+
+    def _completar(self, **body):
+        if self.servidor.falhou():
+            raise APIConnectionError(message="Falha simulada", request=None)
+        return _Objeto(_resposta_chat(body))
+
+    async def _create_file(self, file, purpose="batch"):
+        return await self._chamada(self.servidor.criar_arquivo)(file)
+
+    async def _content(self, file_id):
+        conteudo = b"".join(await self._chamada(lambda: list(self.servidor.ler_arquivo(file_id)))())
+        return _Objeto({"content": conteudo, "text": conteudo.decode("utf-8")})
+
+    @asynccontextmanager
+    async def _content_streaming(self, file_id):
+        if self.servidor.latencia:
+            await asyncio.sleep(self.servidor.latencia)
+        self.servidor.chamar()
+        yield _ConteudoAsync(self.servidor.ler_arquivo(file_id))
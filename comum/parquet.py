@@ -0,0 +1,98 @@
+import os
+import json
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Parquet com as classificações de uma execução, ao lado do Excel: tipado e
+# comprimido, para outras ferramentas lerem sem abrir o .xlsx nem o JSONL do batch.
+# Os assuntos saem como códigos inteiros; os nomes ficam nos metadados do arquivo.
+COMPRESSAO_PADRAO = "zstd"
+CHAVE_METADADOS = b"analise_mensagens"
+
+ESQUEMA = pa.schema([
+    ("id", pa.string()),
+    ("cliente", pa.dictionary(pa.int8(), pa.string())),
+    ("data", pa.date32()),
+    ("execucao", pa.dictionary(pa.int8(), pa.string())),
+    ("assunto", pa.dictionary(pa.int32(), pa.string())),
+    ("codigos_assuntos", pa.list_(pa.int16())),
+    ("unidade", pa.dictionary(pa.int32(), pa.string())),
+    ("tokens", pa.int64()),
+])
+
+
+def nova_execucao():
+    """Identificador da execução: o momento em que o relatório foi gerado."""
+    return datetime.now().strftime("%Y%m%dT%H%M%S")
+
+
+def _dicionario(codigos, nomes, tipo):
+    """Códigos inteiros (-1 sem valor) e os nomes deles -> DictionaryArray, sem passar pelas strings das linhas."""
+    codigos = codigos.astype(tipo.index_type.to_pandas_dtype(), copy=False)
+    return pa.DictionaryArray.from_arrays(pa.array(codigos, mask=codigos < 0), pa.array(nomes, pa.string()))
+
+
+def _constante(valor, linhas, tipo):
+    """Coluna com o mesmo valor em todas as linhas: um dicionário de uma entrada e códigos zerados."""
+    return pa.DictionaryArray.from_arrays(pa.array(np.zeros(linhas, dtype=tipo.index_type.to_pandas_dtype())),
+                                          pa.array([valor], pa.string()))
+
+
+def tabela_resultados(df_resumo, taxonomia, cliente, data, execucao=None):
+    """pa.Table com uma linha por lead a partir do resumo de processar_resultados.
+
+    Assunto e Unidade do resumo são códigos da `taxonomia` (combinação de assuntos e
+    unidade); a lista de códigos de cada linha vem da combinação, sem quebrar textos.
+    """
+    linhas = len(df_resumo)
+    combinacoes = df_resumo["Assunto"].to_numpy() if linhas else np.zeros(0, dtype=np.int32)
+    unidades = df_resumo["Unidade"].to_numpy() if "Unidade" in df_resumo else np.full(linhas, -1)
+    data = datetime.strptime(data, "%Y%m%d").date() if isinstance(data, str) else data
+    execucao = execucao or nova_execucao()
+
+    colunas = [
+        pa.array(df_resumo.get("ID", pd.Series([], dtype=str)).astype(str), pa.string()),
+        _constante(cliente, linhas, ESQUEMA.field("cliente").type),
+        pa.array(np.full(linhas, data, dtype="datetime64[D]"), pa.date32()),
+        _constante(execucao, linhas, ESQUEMA.field("execucao").type),
+        _dicionario(combinacoes, [taxonomia.rotulo(c) for c in taxonomia.combinacoes], ESQUEMA.field("assunto").type),
+        pa.array(taxonomia.combinacoes, ESQUEMA.field("codigos_assuntos").type).take(pa.array(combinacoes)),
+        _dicionario(unidades, taxonomia.unidades.nomes, ESQUEMA.field("unidade").type),
+        pa.array(df_resumo.get("Tokens", pd.Series(np.zeros(linhas))).to_numpy().astype(np.int64, copy=False)),
+    ]
+    metadados = {"cliente": cliente, "data": data.isoformat(), "execucao": execucao,
+                 "assuntos": list(taxonomia.assuntos.nomes)}
+    esquema = ESQUEMA.with_metadata({CHAVE_METADADOS: json.dumps(metadados, ensure_ascii=False).encode("utf-8")})
+    return pa.Table.from_arrays(colunas, schema=esquema)
+
+
+def gravar_parquet(df_resumo, taxonomia, arquivo_parquet, cliente, data, execucao=None,
+                   compressao=COMPRESSAO_PADRAO):
+    """Grava o resumo da execução em `arquivo_parquet` e devolve a pa.Table gravada."""
+    tabela = tabela_resultados(df_resumo, taxonomia, cliente, data, execucao)
+    gravar_tabela(tabela, arquivo_parquet, compressao)
+    print(f"🧱 Parquet gerado: {arquivo_parquet} ({tabela.num_rows} linhas)")
+    return tabela
+
+
+def gravar_tabela(tabela, destino, compressao=COMPRESSAO_PADRAO):
+    """pq.write_table via arquivo temporário, para nunca deixar um parquet pela metade."""
+    temporario = destino + ".tmp"
+    pq.write_table(tabela, temporario, compression=compressao)
+    os.replace(temporario, destino)
+
+
+def ler_metadados(arquivo_parquet):
+    """Cliente, data, execução e nomes dos códigos de assunto gravados no arquivo."""
+    metadados = pq.read_schema(arquivo_parquet).metadata or {}
+    return json.loads(metadados.get(CHAVE_METADADOS, b"{}"))
+
+
+def ler_parquet(arquivos, colunas=None, filtros=None):
+    """Junta um ou mais parquets de resultados (ex.: um mês) num DataFrame."""
+    return pq.read_table(arquivos if isinstance(arquivos, str) else list(arquivos), columns=colunas,
+                         filters=filtros).to_pandas()
@@ -0,0 +1,419 @@
+import os
+import json
+import mmap
+import numpy as np
+import pandas as pd
+from contextlib import nullcontext
+
+from comum.requisicoes import (ler_duplicatas, ler_chaves, ler_resolvidos, ler_indice, abrir_resultado,
+                               caminho_sidecar, SUFIXOS_LOCAIS, SUFIXO_PACOTES)
+from comum.taxonomia import Taxonomia, interpretar_resposta, SEM_UNIDADE
+from comum.relatorio import EscritorRelatorio, MAX_CARACTERES_CELULA
+from comum.parquet import gravar_parquet, tabela_resultados
+from comum.historico import acrescentar_historico
+from comum.unidades import estatisticas_por_unidade
+
+
+# -----------------------------
+# LEITURA DO INPUT
+# -----------------------------
+def _texto_usuario(linha):
+    item = json.loads(linha)
+    return " ".join([m["content"] for m in item["body"]["messages"] if m["role"] == "user"])
+
+
+def _mensagem_pacote(linha):
+    return json.loads(linha)["mensagem"]
+
+
+def _indexar(caminho, pacotes=None):
+    """custom_id -> (offset, tamanho) lendo o arquivo uma vez (inputs gravados sem o .indice.tsv).
+
+    Com `pacotes` (dict), lendo o .pacotes.jsonl, também junta nele custom_id do
+    pacote -> [custom_ids dos leads], na ordem em que foram empacotados.
+    """
+    indice = {}
+    offset = 0
+    with open(caminho, "rb") as f:
+        for linha in f:
+            try:
+                item = json.loads(linha)
+                indice[item["custom_id"]] = (offset, len(linha))
+                if pacotes is not None:
+                    pacotes.setdefault(item["pacote"], []).append(item["custom_id"])
+            except Exception:
+                pass
+            offset += len(linha)
+    return indice
+
+
+class _ArquivoIndexado:
+    """Linhas de um JSONL mapeado com mmap, buscadas pelo índice custom_id -> (offset, tamanho)."""
+
+    def __init__(self, caminho, indice, texto):
+        self.indice = indice
+        self.texto = texto
+        self.arquivo = open(caminho, "rb")
+        # mmap não aceita arquivo vazio
+        self.mapa = mmap.mmap(self.arquivo.fileno(), 0, access=mmap.ACCESS_READ) if indice else None
+
+    def get(self, custom_id, padrao=None):
+        posicao = self.indice.get(custom_id)
+        if posicao is None:
+            return padrao
+        offset, tamanho = posicao
+        try:
+            return self.texto(self.mapa[offset:offset + tamanho])
+        except Exception:
+            return padrao
+
+    def fechar(self):
+        if self.mapa is not None:
+            self.mapa.close()
+        self.arquivo.close()
+
+
+class MensagensOriginais:
+    """custom_id -> texto enviado como mensagem do usuário, lido do batch_input só quando pedido.
+
+    Em memória fica apenas o índice (posição de cada linha); o texto vem do arquivo
+    mapeado com mmap. Os leads empacotados não têm linha própria no batch_input: o
+    texto deles vem do .pacotes.jsonl, indexado do mesmo jeito, e `pacotes` guarda
+    custom_id do pacote -> custom_ids dos leads.
+    """
+
+    def __init__(self, arquivo_input):
+        indice = ler_indice(arquivo_input)
+        self.entradas = _ArquivoIndexado(arquivo_input, _indexar(arquivo_input) if indice is None else indice,
+                                         _texto_usuario)
+        self.pacotes = {}
+        self.membros = None
+        caminho_pacotes = caminho_sidecar(arquivo_input, SUFIXO_PACOTES)
+        if os.path.exists(caminho_pacotes):
+            self.membros = _ArquivoIndexado(caminho_pacotes, _indexar(caminho_pacotes, self.pacotes),
+                                            _mensagem_pacote)
+
+    def get(self, custom_id, padrao=None):
+        texto = self.entradas.get(custom_id)
+        if texto is None and self.membros is not None:
+            texto = self.membros.get(custom_id)
+        return padrao if texto is None else texto
+
+    def enviados(self):
+        """custom_ids das requisições do batch_input (pacotes inteiros, não os leads deles)."""
+        return self.entradas.indice.keys()
+
+    def __len__(self):
+        return len(self.entradas.indice) + (len(self.membros.indice) if self.membros is not None else 0)
+
+    def fechar(self):
+        self.entradas.fechar()
+        if self.membros is not None:
+            self.membros.fechar()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+def ler_mensagens_originais(arquivo_input):
+    """custom_id -> texto enviado como mensagem do usuário (MensagensOriginais; use com `with`)."""
+    return MensagensOriginais(arquivo_input)
+
+
+# -----------------------------
+# LEITURA DAS RESPOSTAS
+# -----------------------------
+def extrair_assunto_e_unidade(resposta):
+    return interpretar_resposta(resposta)
+
+
+def desempacotar_resposta(resposta, membros, tokens):
+    """Quebra a resposta JSON de um pacote em (custom_id, assunto, unidade, tokens) por lead.
+
+    Os tokens do pacote são divididos entre os leads (o resto fica com o primeiro);
+    um lead que faltar na resposta sai com assunto vazio.
+    """
+    try:
+        classificacoes = json.loads(resposta)
+    except ValueError:
+        classificacoes = {}
+    cota, resto = divmod(tokens, len(membros))
+    for i, custom_id in enumerate(membros):
+        item = classificacoes.get(custom_id) or {}
+        yield custom_id, item.get("assunto", ""), item.get("unidade", ""), cota + (resto if i == 0 else 0)
+
+
+def ler_resultados(arquivo_saida, mensagens_originais, duplicatas=None, com_unidade=False, pacotes=None,
+                   taxonomia=None):
+    """Lê o JSONL de saída do batch e devolve (dados, total_tokens) (ver iterar_resultados)."""
+    totais = {}
+    dados = list(iterar_resultados(arquivo_saida, mensagens_originais, duplicatas, com_unidade, pacotes, taxonomia,
+                                   totais))
+    return dados, totais["tokens"]
+
+
+def iterar_resultados(arquivo_saida, mensagens_originais, duplicatas=None, com_unidade=False, pacotes=None,
+                      taxonomia=None, totais=None, enviados=None):
+    """Lê o JSONL de saída do batch e gera uma linha do relatório (dict) por lead.
+
+    No fim, `totais["tokens"]` tem o total de tokens das respostas lidas.
+
+    `arquivo_saida` pode ser o caminho (.jsonl ou .jsonl.gz) ou um iterável de
+    linhas, como o baixar_linhas, para processar o resultado enquanto ele é baixado.
+
+    Cada resposta também vale para os leads em `duplicatas` (conversas idênticas
+    que não foram enviadas); eles entram com os mesmos assuntos e 0 tokens, já que
+    a requisição foi paga uma vez só. As respostas de `pacotes` (custom_id do
+    pacote -> custom_ids dos leads) viram uma linha por lead. Com `taxonomia`
+    (comum.taxonomia.Taxonomia), Assunto sai como a tupla dos códigos dos assuntos e
+    Unidade como o código da unidade (None se a resposta não citou nenhuma); sem, os
+    dois saem como texto, do jeito que vieram na resposta.
+
+    Com `enviados` (custom_ids das requisições do batch_input), as que não têm linha
+    na saída (lote expirado, só no arquivo de erros) entram no fim com assunto vazio
+    e 0 tokens, para nenhum lead sumir do relatório.
+    """
+    duplicatas = duplicatas or {}
+    pacotes = pacotes or {}
+    totais = {} if totais is None else totais
+    total_tokens = 0
+    tokens_prompt_pacotes = 0
+    respondidos = set()
+
+    def linhas_dos_leads(classificados):
+        for lead_enviado, assunto, unidade, tokens_lead in classificados:
+            if taxonomia is not None:
+                assunto, unidade = taxonomia.codigos_assuntos(assunto), taxonomia.codigo_unidade(unidade)
+            elif not unidade:
+                unidade = SEM_UNIDADE
+            mensagem_original = mensagens_originais.get(lead_enviado, "")
+            for i, lead in enumerate([lead_enviado] + duplicatas.get(lead_enviado, [])):
+                linha_dados = {
+                    "ID": lead,
+                    "Mensagem Original": mensagem_original,
+                    "Assunto": assunto,
+                }
+                if com_unidade:
+                    linha_dados["Unidade"] = unidade
+                linha_dados["Tokens"] = tokens_lead if i == 0 else 0
+                yield linha_dados
+
+    with (abrir_resultado(arquivo_saida) if isinstance(arquivo_saida, str) else nullcontext(arquivo_saida)) as f:
+        for linha in f:
+            try:
+                item = json.loads(linha)
+                custom_id = item.get("custom_id", "")
+                body = item.get("response", {}).get("body", {})
+                choices = body.get("choices", [])
+                usage = body.get("usage", {})
+                tokens = usage.get("total_tokens", 0)
+
+                resposta = ""
+                if choices:
+                    resposta = choices[0].get("message", {}).get("content", "")
+
+                if custom_id in pacotes:
+                    classificados = list(desempacotar_resposta(resposta, pacotes[custom_id], tokens))
+                    tokens_prompt_pacotes += usage.get("prompt_tokens", 0)
+                else:
+                    classificados = [(custom_id, *extrair_assunto_e_unidade(resposta), tokens)]
+
+                yield from linhas_dos_leads(classificados)
+                respondidos.add(custom_id)
+                total_tokens += tokens
+            except Exception:
+                continue
+
+    for custom_id in enviados or ():
+        if custom_id not in respondidos:
+            yield from linhas_dos_leads((lead, "", "", 0) for lead in pacotes.get(custom_id, [custom_id]))
+
+    totais["tokens"] = total_tokens
+    if tokens_prompt_pacotes:
+        enviados = sum(len(m) for m in pacotes.values())
+        print(f"📦 {tokens_prompt_pacotes / enviados:.0f} tokens de prompt por lead nos pacotes "
+              f"({len(pacotes)} pacotes, {enviados} leads)")
+
+
+# -----------------------------
+# RESOLVIDOS SEM O MODELO (CACHE E REGRAS)
+# -----------------------------
+def ler_resultados_locais(arquivo_input, com_unidade=False, taxonomia=None):
+    """Linhas do relatório para os leads resolvidos pelo cache ou pelas regras (0 tokens nesta execução).
+
+    Com `taxonomia`, assunto e unidade saem como códigos, como em iterar_resultados.
+    """
+    return list(iterar_resultados_locais(arquivo_input, com_unidade, taxonomia))
+
+
+def iterar_resultados_locais(arquivo_input, com_unidade=False, taxonomia=None):
+    for item in (i for sufixo in SUFIXOS_LOCAIS for i in ler_resolvidos(arquivo_input, sufixo)):
+        assunto, unidade = item["assunto"], item["unidade"]
+        if taxonomia is not None:
+            assunto, unidade = taxonomia.codigos_assuntos(assunto), taxonomia.codigo_unidade(unidade)
+        elif not unidade:
+            unidade = SEM_UNIDADE
+        linha_dados = {
+            "ID": item["custom_id"],
+            "Mensagem Original": item["mensagem"],
+            "Assunto": assunto,
+        }
+        if com_unidade:
+            linha_dados["Unidade"] = unidade
+        linha_dados["Tokens"] = 0
+        yield linha_dados
+
+
+def alimentar_cache(cache, arquivo_input, dados, taxonomia):
+    """Grava no cache as classificações novas (só as requisições enviadas e com assunto).
+
+    `dados` vêm com os códigos da `taxonomia`; o cache guarda os nomes.
+    """
+    chaves = ler_chaves(arquivo_input)
+    novos = [
+        (chaves[d["ID"]], taxonomia.rotulo(d["Assunto"]),
+         "" if d.get("Unidade") is None else taxonomia.nome_unidade(d["Unidade"]), d["Tokens"])
+        for d in dados
+        if d["ID"] in chaves and d["Assunto"]
+    ]
+    cache.gravar(novos)
+    cache.limpar()
+    print(f"🗃️ Cache: {len(novos)} classificações novas guardadas.")
+
+
+# -----------------------------
+# ESTATÍSTICAS
+# -----------------------------
+def calcular_estatisticas(df_resumo, total_tokens, taxonomia, com_unidade=False):
+    """Contagem por assunto (e por unidade, com `com_unidade`), com porcentagens e as linhas de total.
+
+    `df_resumo` tem os códigos da `taxonomia`: Assunto é o código da combinação de
+    assuntos (Taxonomia.combinacao) e Unidade o da unidade (-1 sem unidade). Cada
+    linha vira um inteiro do par (unidade, combinação) e a contagem é um bincount;
+    só os pares distintos passam pelos códigos dos assuntos. A ordem é a da primeira
+    aparição de cada assunto.
+    """
+    colunas = ["Unidade", "Assunto"] if com_unidade else ["Assunto"]
+    contagem = {}
+    if not df_resumo.empty:
+        combinacoes = df_resumo["Assunto"].to_numpy().astype(np.int64)
+        if com_unidade and "Unidade" in df_resumo:
+            unidades = df_resumo["Unidade"].to_numpy().astype(np.int64) + 1
+        else:
+            unidades = np.zeros(len(combinacoes), dtype=np.int64)
+        total_combinacoes = len(taxonomia.combinacoes)
+        pares, distintos = pd.factorize(unidades * total_combinacoes + combinacoes)
+        for par, quantidade in zip(distintos, np.bincount(pares)):
+            unidade, combinacao = divmod(int(par), total_combinacoes)
+            nome_unidade = taxonomia.nome_unidade(unidade - 1 if unidade else None)
+            for codigo in taxonomia.combinacoes[combinacao]:
+                assunto = taxonomia.assuntos.nomes[codigo]
+                chave = (nome_unidade, assunto) if com_unidade else (assunto,)
+                contagem[chave] = contagem.get(chave, 0) + int(quantidade)
+
+    df_estatisticas = pd.DataFrame([(*chave, q) for chave, q in contagem.items()], columns=colunas + ["Quantidade"])
+    total_msgs = int(df_estatisticas["Quantidade"].sum())
+    porcentagens = (df_estatisticas["Quantidade"] / total_msgs * 100).round(2) if total_msgs else []
+    df_estatisticas["Porcentagem (%)"] = porcentagens
+    rotulo = "Unidade" if com_unidade else "Assunto"
+    totais = pd.DataFrame([
+        {rotulo: "TOTAL", "Quantidade": total_msgs, "Porcentagem (%)": 100.0},
+        {rotulo: "TOTAL TOKENS", "Quantidade": total_tokens, "Porcentagem (%)": "-"},
+    ], columns=df_estatisticas.columns).fillna("")
+    return pd.concat([df_estatisticas, totais], ignore_index=True)
+
+
+# -----------------------------
+# PROCESSAMENTO COMPLETO
+# -----------------------------
+def processar_resultados(arquivo_input, arquivo_saida, arquivo_excel, com_unidade=False, cache=None, taxonomia=None,
+                         max_caracteres=MAX_CARACTERES_CELULA, arquivo_parquet=None, cliente="", data=None,
+                         pasta_historico=None, localizador=None):
+    """Junta o input com a saída do batch, calcula as estatísticas e gera o Excel.
+
+    `arquivo_saida` pode ser None quando nenhuma requisição precisou ser enviada.
+    Os leads resolvidos pelo cache na extração entram no relatório junto com os
+    classificados agora; com `cache`, as classificações novas são gravadas nele.
+    Com `taxonomia`, assuntos e unidades são levados aos nomes oficiais do cliente;
+    sem, cada assunto ganha um código na ordem em que aparece.
+
+    As linhas vão para o Excel conforme são lidas (comum.relatorio.EscritorRelatorio),
+    só ali com os nomes dos assuntos; em memória fica só o resumo (ID, códigos de
+    assunto e unidade, tokens) usado nas estatísticas, no cache e no Parquet, sem o
+    texto das conversas. `max_caracteres` corta as mensagens longas.
+
+    Com `arquivo_parquet`, o mesmo resumo também é gravado em Parquet (comum.parquet),
+    identificado pelo `cliente` e pela `data` (YYYYMMDD) da execução; com
+    `pasta_historico`, ele é acrescentado ao histórico de execuções (comum.historico).
+    Com `localizador` (comum.unidades.montar_localizador), as unidades citadas em
+    cada conversa são procuradas enquanto ela passa e o Excel ganha a aba
+    "Estatísticas por unidade".
+    """
+    print("📊 Processando resultados e gerando Excel...")
+    taxonomia = taxonomia or Taxonomia(())
+
+    colunas = ["ID", "Mensagem Original", "Assunto"] + (["Unidade"] if com_unidade else []) + ["Tokens"]
+    resumo = {coluna: [] for coluna in colunas if coluna != "Mensagem Original"}
+    totais = {"tokens": 0}
+    citadas = []
+
+    def gravar(linhas):
+        for linha_dados in linhas:
+            for coluna, valores in resumo.items():
+                valores.append(linha_dados[coluna])
+            if localizador:
+                citadas.append(localizador.citadas(linha_dados["Mensagem Original"]))
+            linha_dados["Assunto"] = taxonomia.rotulo(linha_dados["Assunto"])
+            if com_unidade:
+                linha_dados["Unidade"] = taxonomia.nome_unidade(linha_dados["Unidade"])
+            relatorio.escrever(linha_dados)
+
+    duplicatas = ler_duplicatas(arquivo_input)
+    with EscritorRelatorio(arquivo_excel, colunas, max_caracteres) as relatorio:
+        if arquivo_saida:
+            with ler_mensagens_originais(arquivo_input) as mensagens_originais:
+                gravar(iterar_resultados(arquivo_saida, mensagens_originais, duplicatas, com_unidade,
+                                         mensagens_originais.pacotes, taxonomia, totais,
+                                         mensagens_originais.enviados()))
+        # Senão, nada foi enviado (tudo veio do cache ou das regras)
+        enviados = len(resumo["ID"])
+
+        if duplicatas:
+            copias = {c for lista in duplicatas.values() for c in lista}
+            respostas = sum(1 for lead in resumo["ID"] if lead not in copias)
+            print(f"🧬 {enviados} leads classificados a partir de {respostas} respostas "
+                  f"({(1 - respostas / enviados) * 100 if enviados else 0:.1f}% reaproveitado)")
+
+        if cache is not None:
+            alimentar_cache(cache, arquivo_input, (dict(zip(resumo, valores)) for valores in zip(*resumo.values())),
+                            taxonomia)
+        gravar(iterar_resultados_locais(arquivo_input, com_unidade, taxonomia))
+
+        df_estat_unidades = None
+        if localizador:
+            df_estat_unidades = estatisticas_por_unidade(
+                pd.DataFrame({"Assunto": resumo["Assunto"], "Unidades Citadas": citadas}), localizador, taxonomia)
+
+        # Assunto e unidade ficam como códigos inteiros: a combinação de assuntos e a unidade (-1 sem unidade)
+        linhas = len(resumo["ID"])
+        resumo["Assunto"] = np.fromiter(map(taxonomia.combinacao, resumo["Assunto"]), np.int32, linhas)
+        if com_unidade:
+            resumo["Unidade"] = np.fromiter((-1 if u is None else u for u in resumo["Unidade"]), np.int32, linhas)
+        df_resumo = pd.DataFrame(resumo)
+        df_estatisticas = calcular_estatisticas(df_resumo, totais["tokens"], taxonomia, com_unidade)
+        relatorio.escrever_tabela("Estatísticas", df_estatisticas)
+        if df_estat_unidades is not None:
+            relatorio.escrever_tabela("Estatísticas por unidade", df_estat_unidades)
+
+    print(f"📊 Excel final gerado: {arquivo_excel}")
+    tabela = None
+    if arquivo_parquet:
+        tabela = gravar_parquet(df_resumo, taxonomia, arquivo_parquet, cliente, data)
+    if pasta_historico:
+        if tabela is None:
+            tabela = tabela_resultados(df_resumo, taxonomia, cliente, data)
+        acrescentar_historico(tabela, pasta_historico)
+    return df_resumo
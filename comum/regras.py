@@ -0,0 +1,81 @@
+import re
+import threading
+from collections import Counter
+
+from comum.texto import dobrar_acentos
+
+# Conversas mais longas que isso sempre vão para o modelo: numa conversa longa,
+# achar "reserva" não garante que o assunto seja só esse.
+MAX_PALAVRAS_PADRAO = 25
+
+# Palavras que não dizem nada sobre o assunto (saudações, artigos, cortesia...), sem
+# acentos. Tirando as palavras-chave, se sobrar qualquer outra palavra a conversa
+# vai para o modelo: em "qual o horário? fui muito mal atendido", "horário" não basta.
+PALAVRAS_VAZIAS = frozenset("""
+    a as o os um uma uns umas de da das do dos no na nos nas em ao aos para pra pro por pelo pela com e ou que
+    qual quais quando como onde se me te eu voces voce vcs vc tem ter ha ja agora hoje amanha
+    oi ola ei opa bom boa dia tarde noite tudo bem obrigado obrigada obg vlw valeu por favor pf pfv
+    gostaria queria quero saber sobre informacao informacoes info duvida pode poderia fazer
+""".split())
+_PALAVRA = re.compile(r"\w+")
+
+
+class ClassificadorRegras:
+    """Classifica localmente as conversas curtas e óbvias, sem passar pelo modelo.
+
+    `regras` vem do config.py do cliente: {assunto: [palavras-chave, ...]}. Todas as
+    palavras-chave viram uma única regex compilada sobre o texto sem acentos, então
+    cada conversa é percorrida uma vez só, seja qual for o número de regras. Só é
+    resolvida localmente a conversa curta em que, tirando as palavras-chave, sobram
+    apenas PALAVRAS_VAZIAS e números.
+    """
+
+    def __init__(self, regras, max_palavras=MAX_PALAVRAS_PADRAO):
+        self.max_palavras = max_palavras
+        self.assunto_da_palavra = {}
+        for assunto, palavras in regras.items():
+            for palavra in palavras:
+                self.assunto_da_palavra[dobrar_acentos(palavra)] = assunto
+        # As mais longas primeiro, para "horario de funcionamento" ganhar de "horario"
+        alternativas = sorted(self.assunto_da_palavra, key=len, reverse=True)
+        self.regex = re.compile(r"\b(?:" + "|".join(map(re.escape, alternativas)) + r")\b")
+
+        self.lock = threading.Lock()
+        self.avaliadas = 0
+        self.classificadas = 0
+        self.acertos = Counter()       # assunto -> conversas classificadas localmente
+        self.enviadas = Counter()      # assunto -> conversas com a palavra, mas enviadas ao modelo
+
+    def classificar(self, mensagens):
+        """Retorna o texto "Assunto1, Assunto2" se a conversa for resolvida localmente, senão None."""
+        texto = dobrar_acentos(mensagens)
+        assuntos = list(dict.fromkeys(self.assunto_da_palavra[m] for m in self.regex.findall(texto)))
+        obvia = assuntos and len(texto.split()) <= self.max_palavras and self._so_palavras_chave(texto)
+
+        with self.lock:
+            self.avaliadas += 1
+            if obvia:
+                self.classificadas += 1
+                self.acertos.update(assuntos)
+                return ", ".join(assuntos)
+            self.enviadas.update(assuntos)
+        return None
+
+    def _so_palavras_chave(self, texto):
+        """True se o texto, sem as palavras-chave, não tem mais nenhuma palavra com conteúdo."""
+        return all(p in PALAVRAS_VAZIAS or p.isdigit() for p in _PALAVRA.findall(self.regex.sub(" ", texto)))
+
+    def relatar(self):
+        if not self.avaliadas:
+            return
+        print(f"⚡ Regras locais: {self.classificadas} de {self.avaliadas} conversas classificadas sem o modelo "
+              f"({self.classificadas / self.avaliadas * 100:.1f}%)")
+        for assunto in sorted(set(self.acertos) | set(self.enviadas), key=lambda a: -self.acertos[a]):
+            print(f"   - {assunto}: {self.acertos[assunto]} locais | {self.enviadas[assunto]} enviadas ao modelo")
+
+
+def montar_classificador(regras, max_palavras=MAX_PALAVRAS_PADRAO):
+    """ClassificadorRegras do cliente, ou None se ele não tiver regras configuradas."""
+    if not regras:
+        return None
+    return ClassificadorRegras(regras, max_palavras)
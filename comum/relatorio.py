@@ -0,0 +1,87 @@
+import xlsxwriter
+
+# Limites do Excel: linhas por aba (com o cabeçalho) e caracteres por célula
+MAX_LINHAS_ABA = 1_048_576
+MAX_CARACTERES_CELULA = 32_767
+ABA_MENSAGENS = "Mensagens Classificadas"
+MARCA_CORTE = "…"
+
+
+class EscritorRelatorio:
+    """Grava o Excel do relatório linha a linha, sem montar o DataFrame detalhado.
+
+    Usa o xlsxwriter em modo constant_memory: cada linha vai para o disco assim que
+    a seguinte começa, então a memória não depende do número de conversas. Quando a
+    aba "Mensagens Classificadas" chega ao limite de linhas do Excel, as seguintes vão
+    para "Mensagens Classificadas (2)", "(3)"... com o mesmo cabeçalho. Textos maiores
+    que `max_caracteres` (no máximo o limite de uma célula) são cortados.
+    """
+
+    def __init__(self, arquivo_excel, colunas, max_caracteres=MAX_CARACTERES_CELULA, linhas_por_aba=MAX_LINHAS_ABA):
+        self.arquivo_excel = arquivo_excel
+        self.colunas = list(colunas)
+        self.max_caracteres = min(max_caracteres or MAX_CARACTERES_CELULA, MAX_CARACTERES_CELULA)
+        self.linhas_por_aba = linhas_por_aba
+        self.livro = xlsxwriter.Workbook(arquivo_excel, {"constant_memory": True, "strings_to_numbers": False,
+                                                         "strings_to_formulas": False, "strings_to_urls": False})
+        self.abas = 0
+        self.aba = None
+        self.linha = 0
+        self.total = 0
+        self.cortadas = 0
+
+    def _nova_aba(self):
+        self.abas += 1
+        nome = ABA_MENSAGENS if self.abas == 1 else f"{ABA_MENSAGENS} ({self.abas})"
+        self.aba = self.livro.add_worksheet(nome)
+        self.aba.write_row(0, 0, self.colunas)
+        self.linha = 1
+
+    def _cortar(self, valor):
+        if isinstance(valor, str) and len(valor) > self.max_caracteres:
+            self.cortadas += 1
+            return valor[:self.max_caracteres - len(MARCA_CORTE)] + MARCA_CORTE
+        return valor
+
+    def escrever(self, linha_dados):
+        """Acrescenta uma linha (dict com as `colunas`) à aba de mensagens atual."""
+        if self.aba is None or self.linha >= self.linhas_por_aba:
+            self._nova_aba()
+        self.aba.write_row(self.linha, 0, [self._cortar(linha_dados.get(c, "")) for c in self.colunas])
+        self.linha += 1
+        self.total += 1
+
+    def escrever_tabela(self, nome, df):
+        """Aba com um DataFrame pequeno (estatísticas), depois das abas de mensagens."""
+        if self.aba is None:
+            self._nova_aba()
+        aba = self.livro.add_worksheet(nome)
+        aba.write_row(0, 0, [str(c) for c in df.columns])
+        for i, valores in enumerate(df.itertuples(index=False), start=1):
+            aba.write_row(i, 0, [self._cortar(_celula(v)) for v in valores])
+
+    def fechar(self):
+        if self.aba is None:
+            self._nova_aba()
+        self.livro.close()
+        if self.abas > 1:
+            print(f"📑 {self.total} linhas divididas em {self.abas} abas de mensagens")
+        if self.cortadas:
+            print(f"✂️ {self.cortadas} textos cortados em {self.max_caracteres} caracteres")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+def _celula(valor):
+    """Valor aceito pelo xlsxwriter: números e textos como estão, o resto (dicts, listas) como texto."""
+    if hasattr(valor, "item"):
+        valor = valor.item()
+    if isinstance(valor, float) and valor != valor:
+        return None
+    if valor is None or isinstance(valor, (str, bool, int, float)):
+        return valor
+    return str(valor)
@@ -0,0 +1,387 @@
+import os
+import gzip
+import json
+import hashlib
+from json.encoder import encode_basestring
+
+from comum.texto import normalizar_conversa, estimar_tokens
+
+MODELO = "gpt-4o-mini"
+URL_CHAT = "/v1/chat/completions"
+
+# Buffer de escrita do batch_input (1 MB): menos chamadas de sistema por linha
+BUFFER_ESCRITA = 1024 * 1024
+
+# Modo empacotado: várias conversas por requisição, com resposta em JSON
+TOKENS_POR_PACOTE_PADRAO = 3000
+PREFIXO_PACOTE = "pacote-"
+INSTRUCOES_PACOTE = """
+# Várias conversas por mensagem
+A mensagem do usuário traz várias conversas, cada uma começando por uma linha "### <id>".
+Ignore o formato de resposta pedido acima e responda só com um objeto JSON que tenha,
+para cada id, "assunto" (os assuntos daquela conversa, separados por vírgula) e
+"unidade" (a unidade citada, ou "" se nenhuma for citada).
+"""
+
+
+# -----------------------------
+# MONTAGEM DAS REQUISIÇÕES DO BATCH
+# -----------------------------
+def montar_requisicao(lead_id, mensagens, system_prompt, modelo=MODELO):
+    """Monta a requisição do Batch API para a conversa de um lead."""
+    user_prompt = f"Mensagem do cliente:\n{mensagens}"
+    return {
+        "custom_id": f"id-{lead_id}",
+        "method": "POST",
+        "url": URL_CHAT,
+        "body": {
+            "model": modelo,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            "temperature": 0.0,
+        },
+    }
+
+
+def linha_requisicao(lead_id, mensagens, system_prompt, modelo=MODELO):
+    """Mesma requisição de montar_requisicao, já serializada como linha JSONL."""
+    entrada = montar_requisicao(lead_id, mensagens, system_prompt, modelo)
+    return json.dumps(entrada, ensure_ascii=False) + "\n"
+
+
+class SerializadorRequisicoes:
+    """Gera as mesmas linhas de linha_requisicao sem reserializar o envelope a cada lead.
+
+    O JSON da requisição (SYSTEM_PROMPT, modelo, URL...) é montado uma vez com
+    marcadores no lugar do lead e da conversa e quebrado em três pedaços; cada
+    linha só escapa o lead_id e a conversa e junta tudo.
+    """
+
+    _LEAD = "\ue000lead\ue000"
+    _MENSAGENS = "\ue000mensagens\ue000"
+
+    def __init__(self, system_prompt, modelo=MODELO):
+        gabarito = linha_requisicao(self._LEAD, self._MENSAGENS, system_prompt, modelo)
+        antes, resto = gabarito.split(self._LEAD)
+        meio, depois = resto.split(self._MENSAGENS)
+        self.partes = (antes, meio, depois)
+
+    def linha(self, lead_id, mensagens):
+        antes, meio, depois = self.partes
+        # encode_basestring é o escape do json.dumps(ensure_ascii=False), já com as aspas
+        return "".join((antes, encode_basestring(str(lead_id))[1:-1],
+                        meio, encode_basestring(mensagens)[1:-1], depois))
+
+
+def montar_requisicao_pacote(pacote_id, conversas, system_prompt, modelo=MODELO):
+    """Uma requisição para várias conversas [(custom_id, mensagens)], respondida em JSON por custom_id."""
+    user_prompt = "\n\n".join(f"### {custom_id}\nMensagem do cliente:\n{mensagens}" for custom_id, mensagens in conversas)
+    ids = [custom_id for custom_id, _ in conversas]
+    schema = {
+        "type": "object",
+        "properties": {custom_id: {"$ref": "#/$defs/classificacao"} for custom_id in ids},
+        "required": ids,
+        "additionalProperties": False,
+        "$defs": {
+            "classificacao": {
+                "type": "object",
+                "properties": {"assunto": {"type": "string"}, "unidade": {"type": "string"}},
+                "required": ["assunto", "unidade"],
+                "additionalProperties": False,
+            },
+        },
+    }
+    return {
+        "custom_id": pacote_id,
+        "method": "POST",
+        "url": URL_CHAT,
+        "body": {
+            "model": modelo,
+            "messages": [
+                {"role": "system", "content": system_prompt + "\n" + INSTRUCOES_PACOTE},
+                {"role": "user", "content": user_prompt},
+            ],
+            "temperature": 0.0,
+            "response_format": {
+                "type": "json_schema",
+                "json_schema": {"name": "classificacoes", "strict": True, "schema": schema},
+            },
+        },
+    }
+
+
+# -----------------------------
+# ARQUIVOS AO LADO DO BATCH_INPUT
+# -----------------------------
+# Leads que não viram requisição (conversa repetida, já no cache ou resolvida
+# pelas regras locais) e as chaves das requisições enviadas ficam em arquivos com
+# o mesmo prefixo do batch_input.
+SUFIXO_DUPLICATAS = "duplicatas.tsv"
+SUFIXO_CACHEADOS = "cache.jsonl"
+SUFIXO_REGRAS = "regras.jsonl"
+SUFIXO_CHAVES = "chaves.tsv"
+SUFIXO_PACOTES = "pacotes.jsonl"
+# custom_id -> posição (offset e tamanho em bytes) da linha no batch_input, para o
+# processamento ler só as linhas de que precisa em vez de carregar o arquivo todo
+SUFIXO_INDICE = "indice.tsv"
+SUFIXOS = (SUFIXO_DUPLICATAS, SUFIXO_CACHEADOS, SUFIXO_REGRAS, SUFIXO_CHAVES, SUFIXO_PACOTES, SUFIXO_INDICE)
+# Resolvidos sem o modelo: entram no relatório com o resultado já pronto
+SUFIXOS_LOCAIS = (SUFIXO_CACHEADOS, SUFIXO_REGRAS)
+
+
+def caminho_sidecar(arquivo_input, sufixo):
+    """batch_input_20250101.jsonl -> batch_input_20250101.<sufixo>"""
+    base, _ = os.path.splitext(arquivo_input)
+    return f"{base}.{sufixo}"
+
+
+def abrir_resultado(caminho, modo="r", comprimido=None):
+    """open() do arquivo de resultado, com gzip quando o nome termina em .gz (ou com `comprimido=True`)."""
+    if comprimido is None:
+        comprimido = caminho.endswith(".gz")
+    encoding = None if "b" in modo else "utf-8"
+    if comprimido:
+        return gzip.open(caminho, modo if encoding is None else modo + "t", encoding=encoding)
+    return open(caminho, modo, encoding=encoding)
+
+
+def ler_duplicatas(arquivo_input):
+    """Mapa custom_id enviado -> custom_ids que reaproveitam a mesma resposta."""
+    duplicatas = {}
+    caminho = caminho_sidecar(arquivo_input, SUFIXO_DUPLICATAS)
+    if not os.path.exists(caminho):
+        return duplicatas
+    with open(caminho, "r", encoding="utf-8") as f:
+        for linha in f:
+            copia, original = linha.rstrip("\n").split("\t")
+            duplicatas.setdefault(original, []).append(copia)
+    return duplicatas
+
+
+def ler_chaves(arquivo_input):
+    """Mapa custom_id enviado -> chave da conversa (para gravar a resposta no cache)."""
+    chaves = {}
+    caminho = caminho_sidecar(arquivo_input, SUFIXO_CHAVES)
+    if not os.path.exists(caminho):
+        return chaves
+    with open(caminho, "r", encoding="utf-8") as f:
+        for linha in f:
+            custom_id, chave = linha.rstrip("\n").split("\t")
+            chaves[custom_id] = bytes.fromhex(chave)
+    return chaves
+
+
+def ler_indice(arquivo_input):
+    """Mapa custom_id -> (offset, tamanho) da linha no batch_input, ou None se o índice não existir."""
+    caminho = caminho_sidecar(arquivo_input, SUFIXO_INDICE)
+    if not os.path.exists(caminho):
+        return None
+    indice = {}
+    with open(caminho, "r", encoding="utf-8") as f:
+        for linha in f:
+            custom_id, offset, tamanho = linha.rstrip("\n").split("\t")
+            indice[custom_id] = (int(offset), int(tamanho))
+    return indice
+
+
+def ler_resolvidos(arquivo_input, sufixo):
+    """Leads resolvidos sem o modelo (cache ou regras): dicts com custom_id, mensagem, assunto e unidade."""
+    caminho = caminho_sidecar(arquivo_input, sufixo)
+    if not os.path.exists(caminho):
+        return
+    with open(caminho, "r", encoding="utf-8") as f:
+        for linha in f:
+            yield json.loads(linha)
+
+
+def ler_pacotes(arquivo_input):
+    """Mapa custom_id do pacote -> [custom_ids dos leads] na ordem em que foram empacotados.
+
+    O texto dos leads fica no arquivo; quem precisa dele lê sob demanda
+    (comum.processamento.MensagensOriginais).
+    """
+    pacotes = {}
+    caminho = caminho_sidecar(arquivo_input, SUFIXO_PACOTES)
+    if not os.path.exists(caminho):
+        return pacotes
+    with open(caminho, "r", encoding="utf-8") as f:
+        for linha in f:
+            item = json.loads(linha)
+            pacotes.setdefault(item["pacote"], []).append(item["custom_id"])
+    return pacotes
+
+
+class EscritorRequisicoes:
+    """Grava o batch_input de um cliente, uma requisição por lead.
+
+    Com `deduplicar=True`, conversas idênticas (mesmo modelo, SYSTEM_PROMPT e
+    conversa normalizada) viram uma única requisição; os demais leads ficam no
+    arquivo .duplicatas.tsv ao lado, para o processamento replicar a resposta.
+    `vistos` pode ser compartilhado entre escritores (ex.: shards da extração
+    paralela) para deduplicar entre eles também.
+
+    Com um `cache` (CacheClassificacoes), conversas já classificadas em execuções
+    anteriores não são enviadas: vão para o .cache.jsonl com o resultado guardado.
+    Com `regras` (ClassificadorRegras), as conversas curtas e óbvias são
+    classificadas na hora e vão para o .regras.jsonl.
+
+    Com `leads_por_pacote` > 1, até essa quantidade de conversas (limitada também
+    por `tokens_por_pacote`, estimado) vai numa requisição só, com o SYSTEM_PROMPT
+    uma vez e resposta em JSON por custom_id; quem está em cada pacote fica no
+    .pacotes.jsonl. `requisicoes` conta as conversas enviadas ao modelo e `linhas`
+    as linhas do batch_input.
+
+    A posição de cada linha gravada vai para o .indice.tsv (custom_id, offset e
+    tamanho em bytes).
+    """
+
+    def __init__(self, arquivo, system_prompt, modelo=MODELO, deduplicar=False, vistos=None, cache=None,
+                 regras=None, leads_por_pacote=1, tokens_por_pacote=TOKENS_POR_PACOTE_PADRAO):
+        self.arquivo = arquivo
+        self.system_prompt = system_prompt
+        self.modelo = modelo
+        self.deduplicar = deduplicar
+        self.vistos = {} if vistos is None else vistos
+        self.cache = cache
+        self.regras = regras
+        self.leads_por_pacote = leads_por_pacote
+        self.tokens_por_pacote = tokens_por_pacote
+        self.pendentes = []
+        self.tokens_pendentes = 0
+        # Tokens de prompt que cada conversa extra num pacote deixa de repetir
+        self.tokens_system = estimar_tokens(system_prompt)
+        self.tokens_economizados = 0
+        self.leads = 0
+        self.requisicoes = 0
+        self.linhas = 0
+        # Bytes já gravados no batch_input (offset da próxima linha)
+        self.posicao = 0
+        self.serializador = SerializadorRequisicoes(system_prompt, modelo)
+        # newline="\n": sem tradução para \r\n, os offsets do índice batem com os bytes do arquivo
+        self.saida = open(arquivo, "w", encoding="utf-8", newline="\n", buffering=BUFFER_ESCRITA)
+        self.sidecars = {}
+        # Modelo e prompt são os mesmos em todas as linhas: entram no hash uma vez só
+        self.hash_base = hashlib.blake2b(digest_size=16)
+        self.hash_base.update(f"{modelo}\0{system_prompt}\0".encode("utf-8"))
+
+    def chave(self, mensagens):
+        h = self.hash_base.copy()
+        h.update(normalizar_conversa(mensagens).encode("utf-8"))
+        return h.digest()
+
+    def escrever(self, lead_id, mensagens):
+        self.leads += 1
+        custom_id = f"id-{lead_id}"
+
+        if self.regras is not None:
+            assunto = self.regras.classificar(mensagens)
+            if assunto is not None:
+                self._resolver_localmente(SUFIXO_REGRAS, custom_id, mensagens, assunto, "")
+                return
+
+        chave = self.chave(mensagens) if (self.deduplicar or self.cache is not None) else None
+        if self.cache is not None:
+            em_cache = self.cache.buscar(chave)
+            if em_cache is not None:
+                assunto, unidade, _ = em_cache
+                self._resolver_localmente(SUFIXO_CACHEADOS, custom_id, mensagens, assunto, unidade)
+                return
+
+        if self.deduplicar:
+            original = self.vistos.setdefault(chave, custom_id)
+            if original != custom_id:
+                self._anexar(SUFIXO_DUPLICATAS, f"{custom_id}\t{original}\n")
+                return
+
+        self.requisicoes += 1
+        if self.cache is not None:
+            self._anexar(SUFIXO_CHAVES, f"{custom_id}\t{chave.hex()}\n")
+        if self.leads_por_pacote > 1:
+            self._empacotar(custom_id, mensagens)
+        else:
+            self._gravar_linha(custom_id, self.serializador.linha(lead_id, mensagens))
+
+    def _gravar_linha(self, custom_id, linha):
+        tamanho = len(linha.encode("utf-8"))
+        self.saida.write(linha)
+        self._anexar(SUFIXO_INDICE, f"{custom_id}\t{self.posicao}\t{tamanho}\n")
+        self.posicao += tamanho
+        self.linhas += 1
+
+    def _empacotar(self, custom_id, mensagens):
+        tokens = estimar_tokens(mensagens)
+        if self.pendentes and (len(self.pendentes) >= self.leads_por_pacote
+                               or self.tokens_pendentes + tokens > self.tokens_por_pacote):
+            self._fechar_pacote()
+        self.pendentes.append((custom_id, mensagens))
+        self.tokens_pendentes += tokens
+
+    def _fechar_pacote(self):
+        pacote_id = PREFIXO_PACOTE + self.pendentes[0][0]
+        entrada = montar_requisicao_pacote(pacote_id, self.pendentes, self.system_prompt, self.modelo)
+        self._gravar_linha(pacote_id, json.dumps(entrada, ensure_ascii=False) + "\n")
+        for custom_id, mensagens in self.pendentes:
+            self._anexar(SUFIXO_PACOTES, json.dumps({
+                "custom_id": custom_id,
+                "pacote": pacote_id,
+                "mensagem": f"Mensagem do cliente:\n{mensagens}",
+            }, ensure_ascii=False) + "\n")
+        # Separadas, as conversas repetiriam o SYSTEM_PROMPT; juntas, pagam as instruções do pacote
+        # e o cabeçalho de cada conversa
+        self.tokens_economizados += ((len(self.pendentes) - 1) * self.tokens_system
+                                     - estimar_tokens(INSTRUCOES_PACOTE)
+                                     - len(self.pendentes) * estimar_tokens(f"### {pacote_id}\n"))
+        self.pendentes = []
+        self.tokens_pendentes = 0
+
+    def _resolver_localmente(self, sufixo, custom_id, mensagens, assunto, unidade):
+        self._anexar(sufixo, json.dumps({
+            "custom_id": custom_id,
+            "mensagem": f"Mensagem do cliente:\n{mensagens}",
+            "assunto": assunto,
+            "unidade": unidade,
+        }, ensure_ascii=False) + "\n")
+
+    def _anexar(self, sufixo, texto):
+        if sufixo not in self.sidecars:
+            self.sidecars[sufixo] = open(caminho_sidecar(self.arquivo, sufixo), "w", encoding="utf-8")
+        self.sidecars[sufixo].write(texto)
+
+    def descarregar(self):
+        """Grava o pacote em formação, se houver (antes de ler as contagens finais)."""
+        if self.pendentes:
+            self._fechar_pacote()
+
+    def fechar(self):
+        self.descarregar()
+        self.saida.close()
+        for f in self.sidecars.values():
+            f.close()
+        for sufixo in SUFIXOS:
+            caminho = caminho_sidecar(self.arquivo, sufixo)
+            if sufixo not in self.sidecars and os.path.exists(caminho):
+                # Sobra de uma execução anterior com o mesmo nome de arquivo
+                os.remove(caminho)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+def relatar_empacotamento(requisicoes, linhas, tokens_economizados):
+    if not requisicoes or linhas >= requisicoes:
+        return
+    print(f"📦 Empacotamento: {requisicoes} conversas em {linhas} requisições; "
+          f"~{tokens_economizados / requisicoes:.0f} tokens de prompt a menos por lead "
+          f"(~{tokens_economizados} no total, estimado)")
+
+
+def relatar_deduplicacao(leads, requisicoes):
+    if not leads or leads == requisicoes:
+        return
+    economia = (1 - requisicoes / leads) * 100
+    print(f"🧬 Deduplicação: {leads} leads -> {requisicoes} requisições únicas ({economia:.1f}% a menos)")
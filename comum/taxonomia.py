@@ -0,0 +1,183 @@
+import re
+import difflib
+
+from comum.texto import dobrar_acentos
+
+# Lista de assuntos de cada cliente (a do SYSTEM_PROMPT) com um código inteiro por
+# assunto. As respostas do modelo são lidas uma vez e cada assunto é levado ao nome
+# oficial: sem depender de caixa e acentos ("valores" = "Valores"), pelos apelidos
+# entre parênteses da lista e, por último, por semelhança (difflib). Assuntos fora
+# da lista ganham um código novo, com a primeira grafia vista.
+CORTE_SEMELHANCA_PADRAO = 0.85
+SEM_UNIDADE = "Não Informada"
+
+# "- Unidades: Lagoa, Abelardo" lista unidades, não assuntos
+PREFIXO_UNIDADES = "unidades:"
+
+# Uma passada só pelas linhas da resposta: "Assunto(s): ..." no começo da linha e
+# "Unidade: ..." em qualquer ponto dela
+_LINHA_RESPOSTA = re.compile(r"^(?:\W*assuntos?\s*:(?P<assunto>.*)|.*?unidade\s*:(?P<unidade>.*))$",
+                             re.IGNORECASE | re.MULTILINE)
+
+
+def interpretar_resposta(resposta):
+    """(assunto, unidade) em texto livre, das últimas linhas "Assunto(s):" e "Unidade:" da resposta."""
+    assunto = unidade = ""
+    for encontrado in _LINHA_RESPOSTA.finditer(resposta):
+        if encontrado.group("assunto") is not None:
+            assunto = encontrado.group("assunto").strip()
+        else:
+            unidade = encontrado.group("unidade").strip()
+    return assunto, unidade
+
+
+def _limpar(item):
+    """Tira espaços, colchetes, aspas e ponto final em volta de um item da resposta."""
+    return item.strip().strip("[]\"'*.").strip()
+
+
+def _chave(texto):
+    return " ".join(dobrar_acentos(texto).split())
+
+
+def ler_taxonomia(system_prompt):
+    """(assuntos, unidades, apelidos) da lista "- ..." logo após "Os assuntos possíveis são:".
+
+    "Assuntos Gerais (caso ...)" vira "Assuntos Gerais"; uma lista entre parênteses,
+    como em "associação e planos (valores, dependentes)", vira apelidos do assunto.
+    """
+    assuntos, unidades, apelidos = [], [], {}
+    dentro = False
+    for linha in system_prompt.splitlines():
+        linha = linha.strip()
+        if "assuntos possíveis" in linha.lower():
+            dentro = True
+            continue
+        if not dentro:
+            continue
+        if not linha.startswith("- "):
+            if assuntos or unidades:
+                break
+            continue
+        item = linha[2:].strip()
+        if item.lower().startswith(PREFIXO_UNIDADES):
+            unidades += [u.strip() for u in item.split(":", 1)[1].split(",") if u.strip()]
+            continue
+        nome, _, detalhe = item.partition("(")
+        nome = nome.rstrip(" :") or item
+        assuntos.append(nome)
+        detalhe = detalhe.rsplit(")", 1)[0]
+        if "," in detalhe:
+            for apelido in detalhe.split(","):
+                if apelido.strip():
+                    apelidos[apelido.strip()] = nome
+    return assuntos or ["Assuntos Gerais"], unidades, apelidos
+
+
+class _Vocabulario:
+    """Nome -> código, com os nomes oficiais primeiro e os desconhecidos acrescentados conforme aparecem."""
+
+    def __init__(self, nomes, apelidos=None, corte=CORTE_SEMELHANCA_PADRAO, por_palavra=False):
+        self.nomes = []
+        self.codigos = {}
+        for nome in nomes:
+            self.codigos.setdefault(_chave(nome), len(self.nomes))
+            self.nomes.append(nome)
+        for apelido, nome in (apelidos or {}).items():
+            self.codigos.setdefault(_chave(apelido), self.codigos[_chave(nome)])
+        self.oficiais = list(self.codigos)
+        self.corte = corte
+        self.por_palavra = por_palavra
+        # Texto cru -> código: cada grafia distinta é resolvida uma vez só
+        self.memo = {}
+
+    def codigo(self, texto):
+        codigo = self.memo.get(texto)
+        if codigo is None:
+            codigo = self.memo[texto] = self._resolver(texto)
+        return codigo
+
+    def _resolver(self, texto):
+        limpo = _limpar(texto)
+        chave = _chave(limpo)
+        if chave in self.codigos:
+            return self.codigos[chave]
+        if self.por_palavra:
+            # "Unidade Lagoa" -> "Lagoa": o nome oficial mais longo citado no texto
+            citados = [o for o in self.oficiais if re.search(rf"\b{re.escape(o)}\b", chave)]
+            if citados:
+                return self.codigos[max(citados, key=len)]
+        parecidos = difflib.get_close_matches(chave, self.oficiais, n=1, cutoff=self.corte)
+        if parecidos:
+            codigo = self.codigos[parecidos[0]]
+        else:
+            codigo = len(self.nomes)
+            self.nomes.append(limpo)
+        self.codigos[chave] = codigo
+        return codigo
+
+
+class Taxonomia:
+    """Assuntos e unidades de um cliente, com códigos inteiros e leitura das respostas do modelo.
+
+    Cada conversa fica com a tupla dos códigos dos seus assuntos e o código da unidade;
+    os nomes só voltam no Excel (rotulo, nome_unidade). Cada combinação distinta de
+    assuntos também ganha um código (combinacao), para contar e agrupar em arrays de inteiros.
+    """
+
+    def __init__(self, assuntos, unidades=(), apelidos=None, corte=CORTE_SEMELHANCA_PADRAO):
+        self.assuntos = _Vocabulario(assuntos, apelidos, corte)
+        self.unidades = _Vocabulario(unidades, corte=corte, por_palavra=True)
+        # Texto da resposta -> tupla de códigos; a mesma combinação é sempre o mesmo objeto
+        self.lidos = {}
+        # Código da combinação -> tupla de códigos dos assuntos, e o caminho inverso
+        self.combinacoes = []
+        self.indices = {}
+        # Tupla de códigos -> texto do relatório
+        self.rotulos = {}
+
+    @classmethod
+    def do_prompt(cls, system_prompt, apelidos=False, corte=CORTE_SEMELHANCA_PADRAO):
+        """Taxonomia da lista do SYSTEM_PROMPT.
+
+        Com `apelidos`, os itens entre parênteses de um assunto contam como ele
+        ("piscina social" -> "locais do clube"); sem, cada um fica com o próprio nome.
+        """
+        assuntos, unidades, lista_apelidos = ler_taxonomia(system_prompt)
+        return cls(assuntos, unidades, lista_apelidos if apelidos else None, corte)
+
+    def codigos_assuntos(self, assunto):
+        """Códigos dos assuntos de um texto separado por vírgulas, sem repetir e na ordem citada."""
+        lido = self.lidos.get(assunto)
+        if lido is None:
+            codigos = []
+            for item in assunto.split(","):
+                if _limpar(item):
+                    codigo = self.assuntos.codigo(item)
+                    if codigo not in codigos:
+                        codigos.append(codigo)
+            lido = self.lidos[assunto] = self._interna(tuple(codigos))
+        return lido
+
+    def _interna(self, codigos):
+        if codigos not in self.indices:
+            self.indices[codigos] = len(self.combinacoes)
+            self.combinacoes.append(codigos)
+        return self.combinacoes[self.indices[codigos]]
+
+    def combinacao(self, codigos):
+        """Código inteiro de uma tupla de códigos de assuntos (vinda de codigos_assuntos)."""
+        return self.indices[codigos]
+
+    def codigo_unidade(self, unidade):
+        """Código da unidade, ou None se a resposta não citou nenhuma."""
+        return self.unidades.codigo(unidade) if _limpar(unidade) else None
+
+    def rotulo(self, codigos):
+        rotulo = self.rotulos.get(codigos)
+        if rotulo is None:
+            rotulo = self.rotulos[codigos] = ", ".join(self.assuntos.nomes[c] for c in codigos)
+        return rotulo
+
+    def nome_unidade(self, codigo):
+        return SEM_UNIDADE if codigo is None else self.unidades.nomes[codigo]
@@ -0,0 +1,148 @@
+import json
+import time
+import asyncio
+
+from openai import AsyncOpenAI, RateLimitError, APITimeoutError, APIConnectionError, InternalServerError
+
+from comum.batches import com_jitter
+from comum.texto import estimar_tokens
+from comum.requisicoes import abrir_resultado
+
+# Modo tempo real: as mesmas requisições do batch_input enviadas direto ao chat
+# completions, para amostras e verificações pequenas que não podem esperar o Batch API.
+# A saída sai no formato do arquivo de resultado do batch, então o processamento é o mesmo.
+MAX_LEADS_TEMPO_REAL_PADRAO = 200
+CONCORRENCIA_PADRAO = 16
+RPM_PADRAO = 500
+TPM_PADRAO = 200_000
+TENTATIVAS_PADRAO = 5
+
+ERROS_TEMPORARIOS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
+
+# -----------------------------
+# LIMITE DE TAXA (TOKEN BUCKET)
+# -----------------------------
+class _Balde:
+    def __init__(self, por_minuto):
+        self.capacidade = por_minuto
+        self.taxa = por_minuto / 60
+        self.disponivel = por_minuto
+        self.atualizado = time.monotonic()
+
+    def reabastecer(self):
+        agora = time.monotonic()
+        self.disponivel = min(self.capacidade, self.disponivel + (agora - self.atualizado) * self.taxa)
+        self.atualizado = agora
+
+    def falta(self, quantidade):
+        """Segundos até haver `quantidade` no balde (um pedido maior que o balde espera ele encher)."""
+        return max(0.0, min(quantidade, self.capacidade) - self.disponivel) / self.taxa
+
+    def consumir(self, quantidade):
+        self.disponivel -= min(quantidade, self.capacidade)
+
+
+class LimitadorTaxa:
+    """Limita requisições/min e tokens/min com dois baldes; pode ser compartilhado entre clientes do mesmo loop."""
+
+    def __init__(self, rpm=RPM_PADRAO, tpm=TPM_PADRAO):
+        self.requisicoes = _Balde(rpm)
+        self.tokens = _Balde(tpm)
+        self.lock = asyncio.Lock()
+
+    async def adquirir(self, tokens):
+        # Quem chega primeiro espera primeiro: o lock fica com quem está aguardando o balde encher
+        async with self.lock:
+            while True:
+                self.requisicoes.reabastecer()
+                self.tokens.reabastecer()
+                espera = max(self.requisicoes.falta(1), self.tokens.falta(tokens))
+                if espera == 0:
+                    self.requisicoes.consumir(1)
+                    self.tokens.consumir(tokens)
+                    return
+                await asyncio.sleep(espera)
+
+    def corrigir(self, estimado, real):
+        """Desconta (ou devolve) a diferença entre os tokens estimados e os cobrados de fato."""
+        self.tokens.disponivel -= real - estimado
+
+
+# -----------------------------
+# EXECUÇÃO
+# -----------------------------
+def _linha_saida(custom_id, resposta=None, erro=None):
+    """Linha no formato do arquivo de saída (ou de erros) do Batch API."""
+    if resposta is not None:
+        return {"id": f"tempo_real-{custom_id}", "custom_id": custom_id,
+                "response": {"status_code": 200, "request_id": resposta.id, "body": resposta.model_dump()},
+                "error": None}
+    return {"id": f"tempo_real-{custom_id}", "custom_id": custom_id, "response": None,
+            "error": {"code": type(erro).__name__, "message": str(erro)}}
+
+
+async def _enviar(cliente_openai, limitador, requisicao, tentativas):
+    body = requisicao["body"]
+    estimado = estimar_tokens(json.dumps(body["messages"], ensure_ascii=False))
+    intervalo = 1
+    for tentativa in range(1, tentativas + 1):
+        await limitador.adquirir(estimado)
+        try:
+            resposta = await cliente_openai.chat.completions.create(**body)
+        except ERROS_TEMPORARIOS as e:
+            limitador.corrigir(estimado, 0)
+            if tentativa == tentativas:
+                return _linha_saida(requisicao["custom_id"], erro=e), False
+            await asyncio.sleep(com_jitter(intervalo))
+            intervalo *= 2
+            continue
+        except Exception as e:
+            # Erros que não melhoram tentando de novo (requisição inválida, autenticação...)
+            return _linha_saida(requisicao["custom_id"], erro=e), False
+        if resposta.usage is not None:
+            limitador.corrigir(estimado, resposta.usage.total_tokens)
+        return _linha_saida(requisicao["custom_id"], resposta), True
+
+
+async def executar_tempo_real(arquivo_input, arquivo_saida, cliente_openai=None, limitador=None,
+                              concorrencia=CONCORRENCIA_PADRAO, tentativas=TENTATIVAS_PADRAO):
+    """Envia cada linha do batch_input como chat completion, com até `concorrencia` ao mesmo tempo.
+
+    As respostas vão para `arquivo_saida` no formato da saída do batch (as que
+    falharam depois de `tentativas` entram com "error"). Retorna (arquivo_saida,
+    True se todas deram certo), como baixar_resultados.
+    """
+    cliente_openai = cliente_openai or AsyncOpenAI()
+    limitador = limitador or LimitadorTaxa()
+    # Fila limitada: o input é lido conforme as requisições andam, sem carregar tudo
+    fila = asyncio.Queue(maxsize=concorrencia * 2)
+    contagem = {"ok": 0, "falhas": 0}
+    inicio = time.perf_counter()
+
+    with abrir_resultado(arquivo_saida, "w") as saida:
+        async def trabalhador():
+            while True:
+                requisicao = await fila.get()
+                if requisicao is None:
+                    return
+                linha, ok = await _enviar(cliente_openai, limitador, requisicao, tentativas)
+                saida.write(json.dumps(linha, ensure_ascii=False) + "\n")
+                contagem["ok" if ok else "falhas"] += 1
+
+        trabalhadores = [asyncio.create_task(trabalhador()) for _ in range(concorrencia)]
+        try:
+            with open(arquivo_input, "r", encoding="utf-8") as f:
+                for linha in f:
+                    if linha.strip():
+                        await fila.put(json.loads(linha))
+            for _ in trabalhadores:
+                await fila.put(None)
+            await asyncio.gather(*trabalhadores)
+        finally:
+            for t in trabalhadores:
+                t.cancel()
+
+    duracao = time.perf_counter() - inicio
+    print(f"⚡ Tempo real: {contagem['ok']} respostas e {contagem['falhas']} falhas em {duracao:.1f}s")
+    return arquivo_saida, contagem["falhas"] == 0
@@ -0,0 +1,48 @@
+import re
+import unicodedata
+
+
+# -----------------------------
+# NORMALIZAÇÃO DE TEXTO
+# -----------------------------
+def normalizar_conversa(texto):
+    """Forma canônica da conversa para comparar conversas iguais: sem caixa e com espaços colapsados."""
+    return " ".join(texto.casefold().split())
+
+
+# Fora do ASCII, só os diacríticos combinantes comuns (U+0300-U+036F, menos o U+034F, que não combina)
+_SO_ACENTOS_LATINOS = re.compile("[^\x00-\x7f\u0300-\u034e\u0350-\u036f]")
+
+
+def _sem_acentos(texto):
+    """Caminho geral do dobrar_acentos: decompõe (NFKD) e tira os diacríticos combinantes."""
+    decomposto = unicodedata.normalize("NFKD", texto.casefold())
+    if decomposto.isascii():
+        return decomposto
+    # Português decomposto é ASCII + acentos combinantes: o encode descarta os acentos de uma vez
+    if _SO_ACENTOS_LATINOS.search(decomposto) is None:
+        return decomposto.encode("ascii", "ignore").decode("ascii")
+    return "".join(c for c in decomposto if not unicodedata.combining(c))
+
+
+# Byte do Latin-1 -> a letra ASCII em que _sem_acentos o transforma ("ç" -> "c"); os que
+# não viram um único caractere ASCII ficam como estão e mandam o texto para o caminho geral
+_DOBRA_LATIN1 = bytes(ord(d) if b >= 0x80 and len(d := _sem_acentos(chr(b))) == 1 and d.isascii() else b
+                      for b in range(256))
+
+
+def dobrar_acentos(texto):
+    """Minúsculas e sem acentos ("Endereço" -> "endereco"), para comparar sem depender da grafia."""
+    minusculo = texto.casefold()
+    if minusculo.isascii():
+        return minusculo
+    try:
+        # Texto em Latin-1 (o português cabe nele): uma tradução byte a byte, sem normalizar
+        return minusculo.encode("latin-1").translate(_DOBRA_LATIN1).decode("ascii")
+    except UnicodeError:
+        return _sem_acentos(minusculo)
+
+
+def estimar_tokens(texto):
+    """Estimativa grosseira de tokens (~4 caracteres por token), suficiente para orçamentos de lote."""
+    return len(texto) // 4 + 1
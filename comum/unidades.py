@@ -0,0 +1,124 @@
+import re
+
+import pandas as pd
+
+from comum.texto import dobrar_acentos
+
+
+# Até quantas primeiras palavras de apelido a busca vai por str.find em vez da regex
+MAX_PALAVRAS_BUSCA_DIRETA = 8
+
+
+def _caractere_de_palavra(c):
+    """Mesmo critério do \\w das regex de str."""
+    return c.isalnum() or c == "_"
+
+
+class LocalizadorUnidades:
+    """Acha as unidades citadas no texto das conversas.
+
+    `unidades` vem do config.py do cliente: {unidade: [apelidos, ...]}. O nome da
+    unidade e todos os apelidos, sem acentos, viram uma única regex compilada; o texto
+    é dobrado uma vez (dobrar_acentos) e percorrido uma vez só, seja qual for o número
+    de unidades, e pode citar várias delas.
+
+    Com poucos apelidos, percorrer o texto com a regex custa mais que procurar cada
+    um: até MAX_PALAVRAS_BUSCA_DIRETA primeiras palavras, cada uma é achada com
+    str.find e a regex do apelido só confere o resto dele naquela posição. O resultado
+    é o mesmo da regex única.
+    """
+
+    def __init__(self, unidades):
+        self.nomes = list(unidades)
+        self.unidade_do_apelido = {}
+        for unidade, apelidos in unidades.items():
+            for apelido in [unidade, *apelidos]:
+                self.unidade_do_apelido[" ".join(dobrar_acentos(apelido).split())] = unidade
+        # Os mais longos primeiro, para "abelardo bueno" ganhar de "abelardo"; o lookahead
+        # com as iniciais descarta rápido as posições em que nenhum apelido pode começar
+        alternativas = sorted(self.unidade_do_apelido, key=len, reverse=True)
+        padroes = {a: r"\s+".join(map(re.escape, a.split())) for a in alternativas}
+        iniciais = re.escape("".join(sorted({a[0] for a in alternativas})))
+        self.regex = re.compile(rf"(?=[{iniciais}])\b(?:" + "|".join(padroes.values()) + r")\b")
+        # Primeira palavra -> [(regex do apelido a partir dela, unidade)], os mais longos primeiro
+        self.por_primeira_palavra = {}
+        for apelido in alternativas:
+            self.por_primeira_palavra.setdefault(apelido.split()[0], []).append(
+                (re.compile(padroes[apelido] + r"\b"), self.unidade_do_apelido[apelido]))
+        self.busca_direta = len(self.por_primeira_palavra) <= MAX_PALAVRAS_BUSCA_DIRETA
+
+    def citadas(self, texto):
+        """Unidades citadas no texto, sem repetir e na ordem em que aparecem."""
+        dobrado = dobrar_acentos(texto)
+        if self.busca_direta:
+            return list(dict.fromkeys(self._buscar(dobrado)))
+        achados = self.regex.findall(dobrado)
+        return list(dict.fromkeys(self.unidade_do_apelido[" ".join(a.split())] for a in achados))
+
+    def _buscar(self, dobrado):
+        """Unidades dos apelidos no texto dobrado, na ordem e com as mesmas escolhas da regex única."""
+        achados = []
+        for palavra, apelidos in self.por_primeira_palavra.items():
+            inicio = dobrado.find(palavra)
+            while inicio >= 0:
+                if inicio == 0 or not _caractere_de_palavra(dobrado[inicio - 1]):
+                    for regex, unidade in apelidos:
+                        encontrado = regex.match(dobrado, inicio)
+                        if encontrado is not None:
+                            achados.append((inicio, -encontrado.end(), unidade))
+                            break
+                inicio = dobrado.find(palavra, inicio + 1)
+        # Como a regex: da esquerda para a direita, o mais longo em cada posição, sem sobrepor
+        achados.sort()
+        fim = 0
+        for inicio, menos_fim, unidade in achados:
+            if inicio >= fim:
+                fim = -menos_fim
+                yield unidade
+
+
+def montar_localizador(unidades):
+    """LocalizadorUnidades do cliente, ou None se ele não tiver unidades configuradas."""
+    if not unidades:
+        return None
+    return LocalizadorUnidades(unidades)
+
+
+def estatisticas_por_unidade(df_detalhado, localizador, taxonomia=None):
+    """Aba "Estatísticas por unidade": assuntos das conversas que citam cada unidade.
+
+    Cada conversa é lida uma vez; a que cita duas unidades conta para as duas.
+    Unidades não citadas aparecem com total zero. Se `df_detalhado` já trouxer a
+    coluna "Unidades Citadas" (listas de localizador.citadas), o texto nem é lido.
+    Com `taxonomia`, a coluna Assunto traz as tuplas de códigos dela (como em
+    comum.processamento.iterar_resultados) em vez do texto separado por vírgulas.
+    """
+    vazio = pd.Series(dtype=str)
+    if "Unidades Citadas" in df_detalhado:
+        unidades = df_detalhado["Unidades Citadas"]
+    else:
+        unidades = df_detalhado.get("Mensagem Original", vazio).map(localizador.citadas)
+    # Só as conversas que citam alguma unidade são desdobradas em pares (unidade, assunto)
+    com_unidade = unidades.str.len() > 0
+    assuntos = df_detalhado.get("Assunto", vazio)[com_unidade]
+    if taxonomia is None:
+        assuntos = assuntos.astype(str).str.split(",")
+    else:
+        assuntos = assuntos.map(lambda codigos: [taxonomia.assuntos.nomes[c] for c in codigos])
+    pares = pd.DataFrame({"Unidade": unidades[com_unidade], "Assunto": assuntos}).explode("Unidade").explode("Assunto")
+    pares["Assunto"] = pares["Assunto"].str.strip()
+    pares = pares[pares["Assunto"].notna() & (pares["Assunto"] != "")]
+    # sort=False mantém a ordem de aparição, como o Counter fazia
+    contagem = pares.groupby(["Unidade", "Assunto"], sort=False).size()
+
+    citadas = set(contagem.index.get_level_values("Unidade"))
+    linhas = []
+    for unidade in localizador.nomes:
+        detalhes = contagem[unidade] if unidade in citadas else pd.Series(dtype=int)
+        linhas.append({
+            "Unidade": unidade,
+            "Total de Assuntos": int(detalhes.sum()),
+            "Assunto Mais Buscado": detalhes.idxmax() if len(detalhes) else "N/A",
+            "Detalhes": {a: int(q) for a, q in detalhes.items()},
+        })
+    return pd.DataFrame(linhas, columns=["Unidade", "Total de Assuntos", "Assunto Mais Buscado", "Detalhes"])
@@ -0,0 +1,57 @@
+import os
+import argparse
+from datetime import date
+from dotenv import load_dotenv
+
+from comum.historico import abrir_historico, tendencia, comparar, PASTA_HISTORICO_PADRAO, DIAS_TENDENCIA_PADRAO
+
+# -----------------------------
+# CONFIGURAÇÕES
+# -----------------------------
+load_dotenv()
+
+PASTA_HISTORICO = os.getenv("PASTA_HISTORICO", PASTA_HISTORICO_PADRAO)
+
+
+def periodo(texto):
+    """Converte "2026-09-01:2026-09-30" em (date, date); sem o ":", o período é um dia só."""
+    inicio, _, fim = texto.partition(":")
+    return date.fromisoformat(inicio), date.fromisoformat(fim or inicio)
+
+
+# -----------------------------
+# MAIN
+# -----------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Consulta o histórico de classificações de todos os clientes.")
+    parser.add_argument("--pasta", default=PASTA_HISTORICO, help="pasta do histórico (padrão: PASTA_HISTORICO)")
+    consultas = parser.add_subparsers(dest="consulta", required=True)
+
+    p = consultas.add_parser("tendencia", help="evolução diária de um assunto")
+    p.add_argument("assunto")
+    p.add_argument("--cliente")
+    p.add_argument("--unidade")
+    p.add_argument("--dias", type=int, default=DIAS_TENDENCIA_PADRAO)
+
+    p = consultas.add_parser("comparar", help="assuntos de dois períodos lado a lado")
+    p.add_argument("periodo_a", type=periodo, help="AAAA-MM-DD:AAAA-MM-DD")
+    p.add_argument("periodo_b", type=periodo, help="AAAA-MM-DD:AAAA-MM-DD")
+    p.add_argument("--cliente")
+    p.add_argument("--unidade")
+
+    p = consultas.add_parser("sql", help="SQL livre sobre as views execucoes, resultados e assuntos")
+    p.add_argument("consulta_sql")
+
+    args = parser.parse_args()
+    try:
+        conexao = abrir_historico(args.pasta)
+    except FileNotFoundError as erro:
+        print(f"❌ {erro}")
+        exit(1)
+    if args.consulta == "tendencia":
+        resultado = tendencia(conexao, args.assunto, args.cliente, args.unidade, args.dias)
+    elif args.consulta == "comparar":
+        resultado = comparar(conexao, args.periodo_a, args.periodo_b, args.cliente, args.unidade)
+    else:
+        resultado = conexao.execute(args.consulta_sql).df()
+    print(resultado.to_string(index=False) if not resultado.empty else "Nenhum resultado.")
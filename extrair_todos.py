@@ -0,0 +1,95 @@
+import os
+import argparse
+import psycopg2
+from dotenv import load_dotenv
+from datetime import datetime
+
+from comum.clientes import carregar_clientes, arquivo_input
+from comum.extracao import extrair_multiclientes, ITERSIZE_PADRAO
+from comum.requisicoes import TOKENS_POR_PACOTE_PADRAO
+from comum.cache import abrir_cache
+from comum.regras import montar_classificador
+from comum.checkpoint import ultima_mensagem_processada, descartar_pendente, registrar_pendente
+
+# -----------------------------
+# CONFIGURAÇÕES
+# -----------------------------
+load_dotenv()
+
+DATA_INICIO = os.getenv("DATA_INICIO")
+
+DB_HOST = os.getenv("DB_HOST")
+DB_USER = os.getenv("DB_USER")
+DB_PASSWORD = os.getenv("DB_PASSWORD")
+DB_NAME = os.getenv("DB_NAME")
+
+ITERSIZE = int(os.getenv("ITERSIZE", ITERSIZE_PADRAO))
+MODO_INCREMENTAL = os.getenv("MODO_INCREMENTAL", "1") == "1"
+DEDUPLICAR = os.getenv("DEDUPLICAR", "1") == "1"
+USAR_CACHE = os.getenv("USAR_CACHE", "1") == "1"
+USAR_REGRAS = os.getenv("USAR_REGRAS", "0") == "1"
+EMPACOTAR_LEADS = int(os.getenv("EMPACOTAR_LEADS", "1"))
+EMPACOTAR_TOKENS = int(os.getenv("EMPACOTAR_TOKENS", TOKENS_POR_PACOTE_PADRAO))
+
+DATA_HOJE = datetime.now().strftime("%Y%m%d")
+
+
+# -----------------------------
+# EXTRAÇÃO DE TODOS OS CLIENTES NUMA VARREDURA SÓ
+# -----------------------------
+def extrair_todos(nomes=None):
+    """Gera o batch_input de hoje de cada cliente com uma única conexão e uma única consulta.
+
+    Depois basta rodar `python main.py --pular-extracao` na pasta de cada cliente.
+    O LIMITE de amostra dos config.py não se aplica aqui: todos os leads são extraídos.
+    """
+    clientes = carregar_clientes(nomes)
+    if not clientes:
+        print("⛔ Nenhum cliente configurado.")
+        return {}
+
+    print(f"📝 Gerando arquivos de entrada para {', '.join(c['nome'] for c in clientes)}...")
+    arquivos, desde, caches, regras = {}, {}, {}, {}
+    for cliente in clientes:
+        os.makedirs(cliente["data_dir"], exist_ok=True)
+        arquivos[cliente["client_id"]] = arquivo_input(cliente, DATA_HOJE)
+        descartar_pendente(cliente["data_dir"])
+        if MODO_INCREMENTAL:
+            desde[cliente["client_id"]] = ultima_mensagem_processada(cliente["data_dir"], cliente["client_id"])
+        if USAR_CACHE:
+            caches[cliente["client_id"]] = abrir_cache(cliente["data_dir"])
+        if USAR_REGRAS:
+            classificador = montar_classificador(cliente["regras"], cliente["regras_max_palavras"])
+            if classificador is not None:
+                regras[cliente["client_id"]] = classificador
+
+    conn = psycopg2.connect(host=DB_HOST, user=DB_USER, password=DB_PASSWORD, dbname=DB_NAME)
+    try:
+        resumos = extrair_multiclientes(conn, clientes, DATA_INICIO, arquivos, desde=desde,
+                                        itersize=ITERSIZE, caches=caches, regras=regras, deduplicar=DEDUPLICAR,
+                                        leads_por_pacote=EMPACOTAR_LEADS, tokens_por_pacote=EMPACOTAR_TOKENS)
+    finally:
+        conn.close()
+        for cache in caches.values():
+            cache.fechar()
+
+    for cliente in clientes:
+        resumo = resumos[cliente["client_id"]]
+        print(f"✅ {cliente['nome']}: {resumo['leads']} leads ({resumo['requisicoes']} requisições) "
+              f"em '{arquivos[cliente['client_id']]}'")
+        if cliente["client_id"] in regras:
+            regras[cliente["client_id"]].relatar()
+        if MODO_INCREMENTAL:
+            registrar_pendente(cliente["data_dir"], cliente["client_id"], resumo["ultima_mensagem"], resumo["leads"],
+                               arquivos[cliente["client_id"]])
+    return resumos
+
+
+# -----------------------------
+# MAIN
+# -----------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extrai as conversas de todos os clientes numa única consulta.")
+    parser.add_argument("clientes", nargs="*", help="restringe a extração a estes clientes (padrão: todos)")
+    args = parser.parse_args()
+    extrair_todos(args.clientes or None)
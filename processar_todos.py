@@ -0,0 +1,294 @@
+import os
+import queue
+import asyncio
+import argparse
+from dotenv import load_dotenv
+from datetime import datetime
+from openai import AsyncOpenAI
+
+from comum.clientes import carregar_clientes, arquivo_input, arquivos_do_input
+from comum.extracao import contar_leads
+from comum.requisicoes import caminho_sidecar, SUFIXOS_LOCAIS
+from comum.batches import (criar_jobs_async, aguardar_batch_async, baixar_linhas_async, tem_saida, concluidos,
+                           finalizados, MAX_REQUISICOES_LOTE_PADRAO, MAX_MB_LOTE_PADRAO)
+from comum.jobs import RegistroJobs
+from comum.falhas import preparar_retentativa, juntar_retentativa, relatar_falhas
+from comum.tempo_real import (executar_tempo_real, LimitadorTaxa, MAX_LEADS_TEMPO_REAL_PADRAO, CONCORRENCIA_PADRAO,
+                              RPM_PADRAO, TPM_PADRAO)
+from comum.processamento import processar_resultados
+from comum.taxonomia import Taxonomia
+from comum.unidades import montar_localizador
+from comum.relatorio import MAX_CARACTERES_CELULA
+from comum.historico import PASTA_HISTORICO_PADRAO
+from comum.openai_falso import AsyncOpenAIFalso, servidor_do_ambiente
+from comum.cache import abrir_cache
+from comum.checkpoint import confirmar_checkpoint
+
+# -----------------------------
+# CONFIGURAÇÕES
+# -----------------------------
+load_dotenv()
+
+USAR_CACHE = os.getenv("USAR_CACHE", "1") == "1"
+MAX_REQUISICOES_LOTE = int(os.getenv("MAX_REQUISICOES_LOTE", MAX_REQUISICOES_LOTE_PADRAO))
+MAX_MB_LOTE = float(os.getenv("MAX_MB_LOTE", MAX_MB_LOTE_PADRAO))
+TEMPO_REAL_MAX_LEADS = int(os.getenv("TEMPO_REAL_MAX_LEADS", MAX_LEADS_TEMPO_REAL_PADRAO))
+TEMPO_REAL_CONCORRENCIA = int(os.getenv("TEMPO_REAL_CONCORRENCIA", CONCORRENCIA_PADRAO))
+TEMPO_REAL_RPM = int(os.getenv("TEMPO_REAL_RPM", RPM_PADRAO))
+TEMPO_REAL_TPM = int(os.getenv("TEMPO_REAL_TPM", TPM_PADRAO))
+RETENTATIVAS_FALHAS = int(os.getenv("RETENTATIVAS_FALHAS", "1"))
+COMPRIMIR_RESULTADO = os.getenv("COMPRIMIR_RESULTADO", "0") == "1"
+OPENAI_FALSO = os.getenv("OPENAI_FALSO", "0") == "1"
+MAX_CARACTERES_MENSAGEM = int(os.getenv("MAX_CARACTERES_MENSAGEM", MAX_CARACTERES_CELULA))
+GRAVAR_PARQUET = os.getenv("GRAVAR_PARQUET", "1") == "1"
+GRAVAR_HISTORICO = os.getenv("GRAVAR_HISTORICO", "1") == "1"
+PASTA_HISTORICO = os.getenv("PASTA_HISTORICO", PASTA_HISTORICO_PADRAO)
+
+DATA_HOJE = datetime.now().strftime("%Y%m%d")
+
+# Blocos baixados à espera do relatório (cada um com as linhas de até 1 MB da saída)
+MAX_BLOCOS_NA_FILA = 8
+
+
+# -----------------------------
+# RELATÓRIO DE UM CLIENTE
+# -----------------------------
+def gerar_relatorio(cliente, arquivos, arquivo_saida):
+    cache = abrir_cache(cliente["data_dir"]) if USAR_CACHE else None
+    try:
+        processar_resultados(arquivos["input"], arquivo_saida, arquivos["excel"],
+                             com_unidade=cliente["extrair_unidade"], cache=cache,
+                             taxonomia=Taxonomia.do_prompt(cliente["system_prompt"], cliente["agrupar_apelidos"]),
+                             max_caracteres=MAX_CARACTERES_MENSAGEM,
+                             arquivo_parquet=arquivos["parquet"] if GRAVAR_PARQUET else None,
+                             cliente=cliente["nome"], data=arquivos["data"],
+                             pasta_historico=PASTA_HISTORICO if GRAVAR_HISTORICO else None,
+                             localizador=montar_localizador(cliente["unidades"]))
+    finally:
+        if cache is not None:
+            cache.fechar()
+
+
+# -----------------------------
+# FLUXO COMPLETO DE UM CLIENTE
+# -----------------------------
+async def processar_cliente(cliente_openai, cliente, limitador, modo=None):
+    """Envia o batch_input de hoje do cliente, espera os jobs e gera o relatório assim que terminarem.
+
+    Jobs de hoje já registrados e não processados são retomados em vez de reenviados.
+    Inputs pequenos (ou `modo="tempo_real"`) vão direto ao chat completions, com o
+    `limitador` de taxa compartilhado entre os clientes. Retorna True se o
+    relatório saiu completo (e o checkpoint foi confirmado).
+    """
+    registro = RegistroJobs(cliente["data_dir"], cliente["nome"])
+    try:
+        return await _processar_cliente(cliente_openai, cliente, registro, limitador, modo)
+    finally:
+        registro.fechar()
+
+
+async def _processar_cliente(cliente_openai, cliente, registro, limitador, modo):
+    nome = cliente["nome"]
+    entrada = arquivo_input(cliente, DATA_HOJE)
+    arquivos = arquivos_do_input(cliente, entrada, DATA_HOJE, comprimido=COMPRIMIR_RESULTADO)
+    abertos = registro.em_aberto(entrada)
+    if abertos:
+        print(f"🔁 {nome}: retomando {len(abertos)} job(s) já enviados")
+        originais = [r["batch_id"] for r in abertos if not r["rodada"]]
+        if originais:
+            return await _acompanhar(cliente_openai, cliente, arquivos, registro, originais, limitador)
+        return await _retomar_retentativa(cliente_openai, cliente, arquivos, registro, abertos, limitador)
+
+    if not os.path.exists(entrada):
+        print(f"⛔ {nome}: {os.path.basename(entrada)} não encontrado; rode a extração antes.")
+        return False
+
+    locais = sum(contar_leads(caminho_sidecar(entrada, s)) for s in SUFIXOS_LOCAIS)
+    if not contar_leads(entrada):
+        if not locais:
+            print(f"✅ {nome}: nenhuma mensagem nova para classificar.")
+            return True
+        print(f"🗃️ {nome}: tudo resolvido pelo cache ou pelas regras. Nada a enviar.")
+        await asyncio.to_thread(gerar_relatorio, cliente, arquivos, None)
+        confirmar_checkpoint(cliente["data_dir"], entrada)
+        return True
+
+    modo = modo or ("tempo_real" if contar_leads(entrada) <= TEMPO_REAL_MAX_LEADS else "batch")
+    if modo == "tempo_real":
+        print(f"⚡ {nome}: modo tempo real ({contar_leads(entrada)} requisições)")
+        arquivo_saida, _ = await executar_tempo_real(entrada, arquivos["saida"], cliente_openai, limitador,
+                                                     concorrencia=TEMPO_REAL_CONCORRENCIA)
+        restantes, _ = await _recuperar_falhas(cliente_openai, cliente, arquivos, registro, limitador, arquivo_saida)
+        completo = not restantes
+        await asyncio.to_thread(gerar_relatorio, cliente, arquivos, arquivo_saida)
+        if completo:
+            confirmar_checkpoint(cliente["data_dir"], entrada)
+        return completo
+
+    job_ids = await criar_jobs_async(cliente_openai, entrada, MAX_REQUISICOES_LOTE, MAX_MB_LOTE, registro=registro)
+    print(f"🚀 {nome}: {len(job_ids)} job(s) criados")
+    return await _acompanhar(cliente_openai, cliente, arquivos, registro, job_ids, limitador)
+
+
+async def _aguardar(cliente_openai, cliente, registro, job_ids):
+    estados = await asyncio.gather(*(aguardar_batch_async(cliente_openai, j, rotulo=f"[{cliente['nome']}] ",
+                                                          registro=registro)
+                                     for j in job_ids))
+    return dict(zip(job_ids, estados))
+
+
+async def _consumir_baixando(cliente_openai, batches, arquivo_saida, funcao, *args):
+    """Roda `funcao(*args, linhas)` numa thread enquanto as saídas são baixadas no event loop.
+
+    As linhas passam por uma fila limitada, bloco a bloco: o download não espera o
+    arquivo inteiro para começar a ser lido e não corre muito na frente da leitura.
+    """
+    fila = queue.Queue(MAX_BLOCOS_NA_FILA)
+    fim = object()
+
+    def linhas():
+        while (bloco := fila.get()) is not fim:
+            if isinstance(bloco, BaseException):
+                raise bloco
+            yield from bloco
+
+    tarefa = asyncio.ensure_future(asyncio.to_thread(funcao, *args, linhas()))
+
+    async def entregar(bloco):
+        while not tarefa.done():
+            try:
+                fila.put_nowait(bloco)
+                return
+            except queue.Full:
+                await asyncio.sleep(0.05)
+
+    try:
+        async for bloco in baixar_linhas_async(cliente_openai, batches, arquivo_saida):
+            await entregar(bloco)
+    except BaseException as erro:
+        await entregar(erro)
+        raise
+    finally:
+        await entregar(fim)
+        resultado = await tarefa
+    return resultado
+
+
+async def _acompanhar(cliente_openai, cliente, arquivos, registro, job_ids, limitador):
+    nome = cliente["nome"]
+    batches = await _aguardar(cliente_openai, cliente, registro, job_ids)
+    if not tem_saida(batches):
+        registro.marcar_processados(finalizados(batches))
+        print(f"⛔ {nome}: nenhum resultado disponível.")
+        return False
+
+    # pandas/xlsxwriter bloqueiam: o relatório roda numa thread, lendo as respostas conforme são baixadas,
+    # para não parar os outros clientes
+    arquivo_saida = arquivos["saida"]
+    await _consumir_baixando(cliente_openai, batches, arquivo_saida, gerar_relatorio, cliente, arquivos)
+    registro.marcar_processados(finalizados(batches))
+    restantes, recuperadas = await _recuperar_falhas(cliente_openai, cliente, arquivos, registro, limitador,
+                                                     arquivo_saida)
+    if recuperadas:
+        # As respostas recuperadas entraram no arquivo: o relatório é refeito com elas
+        await asyncio.to_thread(gerar_relatorio, cliente, arquivos, arquivo_saida)
+    completo = concluidos(batches) and not restantes
+    if completo:
+        confirmar_checkpoint(cliente["data_dir"], arquivos["input"])
+    else:
+        print(f"⚠️ {nome}: relatório parcial, nem todas as requisições foram concluídas.")
+    return completo
+
+
+async def _retomar_retentativa(cliente_openai, cliente, arquivos, registro, abertos, limitador):
+    """Lotes de uma retentativa interrompida: as respostas entram na saída já baixada e as rodadas seguem."""
+    nome = cliente["nome"]
+    arquivo_saida = arquivos["saida"]
+    if not os.path.exists(arquivo_saida):
+        print(f"⛔ {nome}: {os.path.basename(arquivo_saida)} não encontrado; não há onde juntar a retentativa.")
+        return False
+    rodada = max(r["rodada"] for r in abertos)
+    batches = await _aguardar(cliente_openai, cliente, registro, [r["batch_id"] for r in abertos])
+    registro.marcar_processados(finalizados(batches))
+    if tem_saida(batches):
+        await _consumir_baixando(cliente_openai, batches, arquivos["retentativa"].format(rodada=rodada),
+                                 juntar_retentativa, arquivos["input"], arquivo_saida)
+    restantes, _ = await _recuperar_falhas(cliente_openai, cliente, arquivos, registro, limitador, arquivo_saida,
+                                           feitas=rodada)
+    await asyncio.to_thread(gerar_relatorio, cliente, arquivos, arquivo_saida)
+    if restantes:
+        print(f"⚠️ {nome}: relatório parcial, nem todas as requisições foram concluídas.")
+        return False
+    confirmar_checkpoint(cliente["data_dir"], arquivos["input"])
+    return True
+
+
+async def _recuperar_falhas(cliente_openai, cliente, arquivos, registro, limitador, arquivo_saida, feitas=0):
+    """Reenvia só as requisições sem resposta válida e junta as respostas.
+
+    Os lotes ficam no registro sob o input original, com a rodada; `feitas` é o
+    número de rodadas já concluídas (retomada no meio das retentativas).
+    Retorna (custom_ids que sobraram sem resposta, quantas foram recuperadas).
+    """
+    entrada = arquivos["input"]
+    recuperadas = 0
+    for rodada in range(feitas + 1, RETENTATIVAS_FALHAS + 1):
+        retentativa = await asyncio.to_thread(preparar_retentativa, entrada, arquivo_saida, rodada)
+        if retentativa is None:
+            return [], recuperadas
+        saida_retentativa = arquivos["retentativa"].format(rodada=rodada)
+        if contar_leads(retentativa) <= TEMPO_REAL_MAX_LEADS:
+            await executar_tempo_real(retentativa, saida_retentativa, cliente_openai, limitador,
+                                      concorrencia=TEMPO_REAL_CONCORRENCIA)
+            recuperadas += await asyncio.to_thread(juntar_retentativa, entrada, arquivo_saida, saida_retentativa)
+            continue
+        job_ids = await criar_jobs_async(cliente_openai, retentativa, MAX_REQUISICOES_LOTE, MAX_MB_LOTE,
+                                         registro=registro, arquivo_input=entrada, rodada=rodada)
+        batches = await _aguardar(cliente_openai, cliente, registro, job_ids)
+        registro.marcar_processados(finalizados(batches))
+        if tem_saida(batches):
+            recuperadas += await _consumir_baixando(cliente_openai, batches, saida_retentativa, juntar_retentativa,
+                                                    entrada, arquivo_saida)
+    return await asyncio.to_thread(relatar_falhas, entrada, arquivo_saida), recuperadas
+
+
+async def processar_todos(nomes=None, modo=None):
+    """Roda processar_cliente para todos os clientes ao mesmo tempo num único event loop."""
+    clientes = carregar_clientes(nomes)
+    if not clientes:
+        print("⛔ Nenhum cliente configurado.")
+        return {}
+
+    if OPENAI_FALSO:
+        cliente_openai = AsyncOpenAIFalso(servidor_do_ambiente())
+    else:
+        cliente_openai = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    # Os limites de taxa são da chave da API, então o balde é um só para todos os clientes
+    limitador = LimitadorTaxa(TEMPO_REAL_RPM, TEMPO_REAL_TPM)
+    resultados = await asyncio.gather(*(processar_cliente(cliente_openai, c, limitador, modo) for c in clientes),
+                                      return_exceptions=True)
+    for cliente, resultado in zip(clientes, resultados):
+        if isinstance(resultado, Exception):
+            print(f"❌ {cliente['nome']}: {resultado!r}")
+    return {c["nome"]: r is True for c, r in zip(clientes, resultados)}
+
+
+# -----------------------------
+# MAIN
+# -----------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Envia e acompanha os batches de todos os clientes em paralelo.")
+    parser.add_argument("clientes", nargs="*", help="restringe o processamento a estes clientes (padrão: todos)")
+    parser.add_argument("--extrair", action="store_true",
+                        help="roda o extrair_todos.py antes (senão usa os batch_input de hoje já gerados)")
+    modo = parser.add_mutually_exclusive_group()
+    modo.add_argument("--tempo-real", dest="modo", action="store_const", const="tempo_real",
+                      help="envia direto ao chat completions, sem o Batch API")
+    modo.add_argument("--batch", dest="modo", action="store_const", const="batch",
+                      help="usa o Batch API mesmo para inputs pequenos")
+    args = parser.parse_args()
+
+    if args.extrair:
+        from extrair_todos import extrair_todos
+        extrair_todos(args.clientes or None)
+    asyncio.run(processar_todos(args.clientes or None, args.modo))
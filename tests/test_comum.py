@@ -0,0 +1,208 @@
+import os
+import sys
+import json
+import importlib.util
+
+import pytest
+import pyarrow.parquet as pq
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+from comum.requisicoes import SerializadorRequisicoes, EscritorRequisicoes, montar_requisicao, caminho_sidecar
+from comum.extracao import _LeitorCopy
+from comum.taxonomia import Taxonomia, interpretar_resposta, SEM_UNIDADE
+from comum.falhas import coletar_falhas, juntar_retentativa
+from comum.checkpoint import (execucao, registrar_pendente, confirmar_checkpoint, ultima_mensagem_processada,
+                              ARQUIVO_PENDENTE)
+from comum.clientes import arquivos_do_input
+from comum.jobs import RegistroJobs
+
+SYSTEM_PROMPT = """Classifique a conversa.
+Os assuntos possíveis são:
+- Endereço
+- Reserva
+- Valores
+- Unidades: Lagoa, Downtown
+"""
+
+
+def _ler_jsonl(caminho):
+    with open(caminho, "r", encoding="utf-8") as f:
+        return [json.loads(linha) for linha in f if linha.strip()]
+
+
+def _resposta(custom_id, conteudo, status=200):
+    return {"custom_id": custom_id, "response": {"status_code": status, "body": {
+        "choices": [{"message": {"content": conteudo}}], "usage": {"total_tokens": 10}}}}
+
+
+def _gravar_jsonl(caminho, itens):
+    with open(caminho, "w", encoding="utf-8") as f:
+        for item in itens:
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+
+# -----------------------------
+# SERIALIZAÇÃO DAS REQUISIÇÕES
+# -----------------------------
+@pytest.mark.parametrize("lead_id, mensagens", [
+    (1, "oi, qual o endereço?"),
+    ("abc-123", 'aspas " e barra \\ || quebra\nde linha\ttab'),
+    (42, "controle \x00\x1f, emoji 😀, separador   e acentos çãé"),
+    (7, ""),
+])
+def test_serializador_gera_a_mesma_linha_de_montar_requisicao(lead_id, mensagens):
+    linha = SerializadorRequisicoes(SYSTEM_PROMPT).linha(lead_id, mensagens)
+    assert linha.endswith("\n")
+    assert json.loads(linha) == montar_requisicao(lead_id, mensagens, SYSTEM_PROMPT)
+    assert linha == json.dumps(montar_requisicao(lead_id, mensagens, SYSTEM_PROMPT), ensure_ascii=False) + "\n"
+
+
+# -----------------------------
+# EXTRAÇÃO VIA COPY
+# -----------------------------
+def test_leitor_copy_desescapa_campos_partidos_entre_pedacos(tmp_path):
+    copy = ("1\tola\\tmundo\\nsegunda linha\t2025-02-09 10:00:00\n"
+            "2\tbarra \\\\ fica\t\\N\n"
+            "3\túltimo\t2025-02-10 08:30:00")
+    arquivo = str(tmp_path / "batch_input.jsonl")
+    with EscritorRequisicoes(arquivo, SYSTEM_PROMPT) as saida:
+        leitor = _LeitorCopy(saida)
+        # Pedaços que cortam registros e escapes no meio, como o copy_expert pode entregar
+        for inicio in range(0, len(copy), 7):
+            leitor.write(copy[inicio:inicio + 7].encode("utf-8"))
+        resumo = leitor.finalizar()
+
+    mensagens = {item["custom_id"]: item["body"]["messages"][1]["content"] for item in _ler_jsonl(arquivo)}
+    assert mensagens == {
+        "id-1": "Mensagem do cliente:\nola\tmundo\nsegunda linha",
+        "id-2": "Mensagem do cliente:\nbarra \\ fica",
+        "id-3": "Mensagem do cliente:\núltimo",
+    }
+    assert resumo["leads"] == 3
+    assert resumo["ultima_mensagem"] == "2025-02-10T08:30:00"
+
+
+# -----------------------------
+# LEITURA DAS RESPOSTAS
+# -----------------------------
+def test_interpretar_resposta_usa_as_ultimas_linhas():
+    resposta = "Análise...\nAssuntos: Reserva\n- Assunto: Valores, Endereço\nA unidade: Lagoa\n"
+    assert interpretar_resposta(resposta) == ("Valores, Endereço", "Lagoa")
+    # Os asteriscos do markdown ficam para a Taxonomia limpar
+    assert interpretar_resposta("**Assunto:** Reserva")[0] == "** Reserva"
+    assert interpretar_resposta("sem formato nenhum") == ("", "")
+
+
+def test_taxonomia_leva_as_grafias_aos_nomes_oficiais():
+    taxonomia = Taxonomia.do_prompt(SYSTEM_PROMPT)
+    codigos = taxonomia.codigos_assuntos("reserva, ENDERECO., Reserva, *valore*")
+    assert taxonomia.rotulo(codigos) == "Reserva, Endereço, Valores"
+    # A mesma combinação é sempre o mesmo código
+    mesma = taxonomia.codigos_assuntos("Reserva, Endereço, Valores")
+    assert taxonomia.combinacao(codigos) == taxonomia.combinacao(mesma)
+
+    desconhecido = taxonomia.codigos_assuntos("Cardápio")
+    assert taxonomia.rotulo(desconhecido) == "Cardápio"
+    assert desconhecido[0] == len(taxonomia.assuntos.nomes) - 1
+
+    assert taxonomia.nome_unidade(taxonomia.codigo_unidade("Unidade Lagoa")) == "Lagoa"
+    assert taxonomia.codigo_unidade("  ") is None
+    assert taxonomia.nome_unidade(None) == SEM_UNIDADE
+
+
+# -----------------------------
+# RETENTATIVAS
+# -----------------------------
+def test_juntar_retentativa_troca_so_as_recuperadas(tmp_path):
+    arquivo_input = str(tmp_path / "batch_input_20250101.jsonl")
+    _gravar_jsonl(arquivo_input, [montar_requisicao(i, f"conversa {i}", SYSTEM_PROMPT) for i in (1, 2, 3)])
+    arquivo_saida = str(tmp_path / "resultado_batch_20250101.jsonl")
+    _gravar_jsonl(arquivo_saida, [
+        _resposta("id-1", "Assunto: Reserva"),
+        _resposta("id-2", "", status=500),
+        _resposta("id-3", "não entendi"),
+    ])
+    assert coletar_falhas(arquivo_input, arquivo_saida) == ["id-2", "id-3"]
+
+    saida_retentativa = str(tmp_path / "resultado_retentativa1_20250101.jsonl")
+    _gravar_jsonl(saida_retentativa, [_resposta("id-2", "Assunto: Valores"), _resposta("id-3", "de novo nada")])
+    assert juntar_retentativa(arquivo_input, arquivo_saida, saida_retentativa) == 1
+
+    itens = {item["custom_id"]: item for item in _ler_jsonl(arquivo_saida)}
+    assert sorted(itens) == ["id-1", "id-2", "id-3"]
+    assert itens["id-2"]["response"]["body"]["choices"][0]["message"]["content"] == "Assunto: Valores"
+    assert coletar_falhas(arquivo_input, arquivo_saida) == ["id-3"]
+
+
+# -----------------------------
+# CHECKPOINT
+# -----------------------------
+def test_checkpoint_so_avanca_com_o_input_da_extracao(tmp_path):
+    data_dir = str(tmp_path)
+    arquivo_input = str(tmp_path / "batch_input_20250101.jsonl")
+    assert execucao(arquivo_input) is None
+    _gravar_jsonl(arquivo_input, [montar_requisicao(1, "oi", SYSTEM_PROMPT)])
+
+    registrar_pendente(data_dir, "cliente", "2025-01-01T10:00:00", 1, arquivo_input)
+    # Input regravado (ex.: amostra com LIMITE) depois da extração: não é a mesma execução
+    _gravar_jsonl(arquivo_input, [montar_requisicao(i, "oi", SYSTEM_PROMPT) for i in (1, 2)])
+    confirmar_checkpoint(data_dir, arquivo_input)
+    assert ultima_mensagem_processada(data_dir, "cliente") is None
+    assert os.path.exists(os.path.join(data_dir, ARQUIVO_PENDENTE))
+
+    registrar_pendente(data_dir, "cliente", "2025-01-02T10:00:00", 2, arquivo_input)
+    confirmar_checkpoint(data_dir, arquivo_input)
+    assert ultima_mensagem_processada(data_dir, "cliente") == "2025-01-02T10:00:00"
+    assert ultima_mensagem_processada(data_dir, "outro cliente") is None
+    assert not os.path.exists(os.path.join(data_dir, ARQUIVO_PENDENTE))
+
+
+# -----------------------------
+# DE PONTA A PONTA (API FALSA)
+# -----------------------------
+@pytest.fixture
+def main_vamo(tmp_path, monkeypatch):
+    """Vamo/main.py importado com a API falsa (comum.openai_falso) numa pasta temporária."""
+    monkeypatch.setenv("OPENAI_FALSO", "1")
+    monkeypatch.setenv("OPENAI_FALSO_PASTA", str(tmp_path / "api_falsa"))
+    monkeypatch.setenv("OPENAI_FALSO_DURACAO", "0")
+    monkeypatch.setenv("OPENAI_FALSO_TAXA_FALHA", "0.2")
+    monkeypatch.setenv("TEMPO_REAL_MAX_LEADS", "1000")
+    monkeypatch.setenv("USAR_CACHE", "0")
+    monkeypatch.setenv("PASTA_HISTORICO", str(tmp_path / "historico"))
+    pasta = os.path.join(RAIZ, "Vamo")
+    monkeypatch.syspath_prepend(pasta)
+    # config.py é um por cliente: o do Vamo, não o de outro importado antes
+    monkeypatch.delitem(sys.modules, "config", raising=False)
+    spec = importlib.util.spec_from_file_location("main_vamo", os.path.join(pasta, "main.py"))
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    yield modulo
+    sys.modules.pop("config", None)
+
+
+def test_aguardar_e_processar_batch_com_a_api_falsa(tmp_path, main_vamo, capsys):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    arquivo_input = str(data_dir / "batch_input_20250101.jsonl")
+    conversas = {lead: f"quero reservar para {lead % 40} pessoas" for lead in range(80)}
+    with EscritorRequisicoes(arquivo_input, main_vamo.SYSTEM_PROMPT, deduplicar=True) as saida:
+        for lead, mensagens in conversas.items():
+            saida.escrever(lead, mensagens)
+    arquivos = arquivos_do_input({"nome": "Vamo", "data_dir": str(data_dir)}, arquivo_input, "20250101")
+
+    with RegistroJobs(str(data_dir), "Vamo") as registro:
+        job_ids = main_vamo.criar_jobs(arquivo_input, registro=registro, cliente_openai=main_vamo.CLIENTE_OPENAI)
+        # Com 20% de falhas sintéticas, só dá certo se as retentativas recuperarem o que falhou
+        assert main_vamo.aguardar_e_processar_batch(job_ids, registro, arquivos)
+        assert registro.em_aberto() == []
+
+    assert coletar_falhas(arquivo_input, arquivos["saida"]) == []
+    recuperadas = [linha for linha in capsys.readouterr().out.splitlines() if "requisições recuperadas" in linha]
+    assert recuperadas and not recuperadas[0].startswith("🩹 0 ")
+    assert os.path.exists(caminho_sidecar(arquivo_input, "duplicatas.tsv"))
+    tabela = pq.read_table(arquivos["parquet"]).to_pandas()
+    assert sorted(tabela["id"]) == sorted(f"id-{lead}" for lead in conversas)
+    assert (tabela["assunto"].astype(str) != "").all()
+    assert os.path.exists(arquivos["excel"])